@@ -0,0 +1,284 @@
+"""Headless detection API for kiosks and partner apps, with the same model, presets and filters as the app.
+
+    python api.py --port 8502 --max-batch 8 --max-wait-ms 10
+
+    curl -s --data-binary @photo.jpg "http://localhost:8502/detect?preset=Recommended"
+    curl -s --data-binary @photo.jpg "http://localhost:8502/detect?conf=0.3&cap_min=0.6&imgsz=960"
+
+POST /detect takes the encoded image as the request body. Query parameters mirror "Advanced settings":
+preset, conf, iou, imgsz (or imgsz=auto with budget_ms), bottle_min, can_min, cap_min, min_area_pct, tta. Requests that arrive within
+max-wait-ms of each other (same imgsz / iou / tta) share one batched predict call.
+GET /healthz reports warm-up, pool and batcher state; GET /presets lists the presets.
+GET /metrics exports per-stage latency histograms in Prometheus text format (/metrics.json: p50/p95 per stage).
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cascade import AUTO_BUDGET_MS, AUTO_SIZES, cascade_predict
+from detection import filter_raw
+from image_io import decode_bgr, image_size
+from infer_cache import InferenceCache, cached_predict_many
+from model_pool import PoolBusy
+from model_store import (DEFAULT_IMGSZ, INFER_BACKEND, INFER_INT8, REPLICAS, cache_key_for, ensure_model_path,
+                         get_pool, pool_stats, start_warmup)
+from presets import CLASS_NAMES, DEFAULT_PRESET, MIN_CONF, PRESETS, per_class_thresholds
+from timing import STATS, record, span
+
+API_HOST        = os.getenv("API_HOST", "0.0.0.0")
+API_PORT        = int(os.getenv("API_PORT", "8502"))
+API_MAX_BATCH   = int(os.getenv("API_MAX_BATCH", "8"))
+API_MAX_WAIT_MS = float(os.getenv("API_MAX_WAIT_MS", "10"))
+API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", "64"))
+API_MAX_BODY_MB = int(os.getenv("API_MAX_BODY_MB", "20"))
+API_TIMEOUT     = float(os.getenv("API_TIMEOUT", "60"))
+API_CACHE_ITEMS = int(os.getenv("API_CACHE_ITEMS", "0"))   # kiosk photos rarely repeat; 0 = no prediction cache
+
+_FLOAT_PARAMS = ("conf", "iou", "bottle_min", "can_min", "cap_min", "min_area_pct")
+
+
+def parse_params(query: str) -> dict:
+    """Preset values overridden by any explicit query parameter; raises ValueError on bad input."""
+    q = {k: v[-1] for k, v in parse_qs(query).items()}
+    preset = q.get("preset", DEFAULT_PRESET)
+    if preset not in PRESETS:
+        raise ValueError(f"unknown preset {preset!r}, expected one of {list(PRESETS)}")
+    p = dict(PRESETS[preset], preset=preset, imgsz=DEFAULT_IMGSZ)
+    for k in _FLOAT_PARAMS:
+        if k in q:
+            p[k] = float(q[k])
+    if "tta" in q:
+        p["tta"] = q["tta"].lower() in ("1", "true", "yes", "on")
+    if "imgsz" in q:
+        p["imgsz"] = "auto" if q["imgsz"].lower() == "auto" else int(q["imgsz"])
+    if p["imgsz"] == "auto":
+        p["budget_ms"] = float(q.get("budget_ms", AUTO_BUDGET_MS))
+    # Same bounds as the sliders; predictions are made at MIN_CONF and re-filtered, like live tuning
+    if not MIN_CONF <= p["conf"] <= 1:
+        raise ValueError(f"conf must be in [{MIN_CONF}, 1]")
+    if not 0 < p["iou"] < 1:
+        raise ValueError("iou must be in (0, 1)")
+    if p["imgsz"] != "auto" and not (32 <= p["imgsz"] <= 2048 and p["imgsz"] % 32 == 0):
+        raise ValueError("imgsz must be 'auto' or a multiple of 32 in [32, 2048]")
+    return p
+
+
+class MicroBatcher:
+    """Hold each request up to max_wait_ms (or until max_batch match) and run the group as one predict."""
+
+    def __init__(self, model_for, model_key: str, max_batch: int = API_MAX_BATCH, max_wait_ms: float = API_MAX_WAIT_MS,
+                 max_pending: int = API_MAX_PENDING, workers: int = 1, cache: InferenceCache | None = None):
+        self._model_for, self.model_key, self.cache = model_for, model_key, cache
+        self.max_batch, self.max_wait, self.max_pending = max(1, max_batch), max_wait_ms / 1e3, max_pending
+        self._q = deque()   # (group, bgr, future, t_submit)
+        self._cond = threading.Condition()
+        self.batches = self.items = self.rejected = 0
+        self.sizes = deque(maxlen=1024)
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, name=f"batcher-{i}", daemon=True).start()
+
+    def submit(self, bgr, group: tuple) -> Future:
+        fut = Future()
+        with self._cond:
+            if len(self._q) >= self.max_pending:
+                self.rejected += 1
+                raise PoolBusy(f"{len(self._q)} requests pending")
+            self._q.append((group, bgr, fut, time.monotonic()))
+            self._cond.notify_all()
+        return fut
+
+    def _next_batch(self) -> tuple[tuple, list]:
+        with self._cond:
+            while True:
+                while not self._q:
+                    self._cond.wait()
+                # Recomputed on every wake-up: another worker may have taken the head group meanwhile
+                group, t_first = self._q[0][0], self._q[0][3]
+                n = sum(1 for it in self._q if it[0] == group)
+                remaining = t_first + self.max_wait - time.monotonic()
+                if n >= self.max_batch or remaining <= 0:
+                    batch, rest = [], deque()
+                    for it in self._q:
+                        (batch if it[0] == group and len(batch) < self.max_batch else rest).append(it)
+                    self._q = rest
+                    return group, batch
+                self._cond.wait(remaining)
+
+    def _worker(self):
+        while True:
+            (imgsz, iou, tta), batch = self._next_batch()
+            try:
+                raws = cached_predict_many(self.cache, self._model_for(imgsz), self.model_key, [it[1] for it in batch],
+                                           conf=MIN_CONF, iou=iou, imgsz=imgsz, augment=tta)
+            except Exception as e:
+                for it in batch:
+                    it[2].set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.sizes.append(len(batch))
+            for it, raw in zip(batch, raws):
+                it[2].set_result((raw, len(batch)))
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._q)
+        return {"pending": pending, "batches": self.batches, "items": self.items, "rejected": self.rejected,
+                "mean_batch": round(sum(self.sizes) / len(self.sizes), 2) if self.sizes else 0.0,
+                "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1e3}
+
+
+class DetectionService:
+    """Model pools (one per imgsz for exported backends) behind a MicroBatcher."""
+
+    def __init__(self, backend: str = INFER_BACKEND, int8: bool = INFER_INT8, **batcher_kwargs):
+        self.path = ensure_model_path()
+        self.key = cache_key_for(self.path)
+        self.backend, self.int8 = backend, int8
+        self.warmup = start_warmup(DEFAULT_IMGSZ)
+        self.batcher = MicroBatcher(self._model_for, f"{self.key}:{backend}{':int8' if int8 else ''}",
+                                    workers=REPLICAS, cache=InferenceCache(max_items=API_CACHE_ITEMS) if API_CACHE_ITEMS else None,
+                                    **batcher_kwargs)
+
+    def _model_for(self, imgsz: int):
+        self.warmup.wait()
+        if self.backend == "pytorch":
+            return get_pool(self.path, self.key).client()
+        try:
+            return get_pool(self.path, self.key, self.backend, imgsz, self.int8).client()
+        except Exception:
+            return get_pool(self.path, self.key).client()
+
+    def detect(self, data: bytes, params: dict) -> dict:
+        t0 = time.perf_counter()
+        try:
+            bgr = decode_bgr(data, max(AUTO_SIZES) if params["imgsz"] == "auto" else params["imgsz"])
+        except Exception as e:
+            raise ValueError(f"could not decode image ({e})") from e
+        t1 = time.perf_counter()
+        predict = lambda s: self.batcher.submit(bgr, (s, params["iou"], params["tta"])).result(API_TIMEOUT)
+        cascade = None
+        if params["imgsz"] == "auto":
+            sizes = {}
+            res = cascade_predict(lambda s: sizes.setdefault(s, predict(s))[0], params["conf"], params["min_area_pct"],
+                                  budget_ms=params["budget_ms"])
+            raw, batch_size = sizes[res.imgsz]
+            cascade = {"imgsz": res.imgsz, "stages": res.stages}
+        else:
+            raw, batch_size = predict(params["imgsz"])
+        t2 = time.perf_counter()
+        record("decode", (t1 - t0) * 1e3, t0)
+        record("queue_infer", (t2 - t1) * 1e3, t1)
+        with span("filter"):
+            dets = filter_raw(raw, per_class_thresholds(params["bottle_min"], params["can_min"], params["cap_min"]),
+                              params["conf"], params["min_area_pct"], fallback=CLASS_NAMES)
+        # JPEGs may have been decoded at 1/2..1/8 scale; report boxes in the uploaded image's pixels
+        h, w = bgr.shape[:2]
+        scale = max(image_size(data)) / max(h, w)
+        if scale != 1:
+            dets = replace(dets, xyxy=dets.xyxy * scale)
+        record("request", (time.perf_counter() - t0) * 1e3, t0)
+        return {"preset": params["preset"], "params": params, "width": round(w * scale), "height": round(h * scale),
+                "counts": dets.counts, "detections": dets.to_records(), "batch_size": batch_size, "cascade": cascade,
+                "timing_ms": {"decode": round((t1 - t0) * 1e3, 2), "queue_infer": round((t2 - t1) * 1e3, 2),
+                              "total": round((time.perf_counter() - t0) * 1e3, 2)}}
+
+    def health(self) -> dict:
+        return {"ready": self.warmup.ready, "state": self.warmup.state, "error": self.warmup.error,
+                "pools": pool_stats(), "batcher": self.batcher.stats()}
+
+
+class Handler(BaseHTTPRequestHandler):
+    service: DetectionService = None
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, code: int, payload, headers: dict | None = None, content_type: str = "application/json"):
+        body = payload.encode() if isinstance(payload, str) else json.dumps(payload, separators=(",", ":")).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reject(self, code: int, error: str):
+        """Reply without reading the body; its unread bytes would be parsed as the next request, so close."""
+        self.close_connection = True
+        self._send(code, {"error": error}, {"Connection": "close"})
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/healthz":
+            h = self.service.health()
+            self._send(200 if h["ready"] else 503, h)
+        elif path == "/presets":
+            self._send(200, PRESETS)
+        elif path == "/metrics":
+            self._send(200, STATS.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/metrics.json":
+            self._send(200, STATS.snapshot())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/detect":
+            return self._reject(404, "not found")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            return self._reject(400, "invalid Content-Length")
+        if not 0 < length <= API_MAX_BODY_MB << 20:
+            return self._reject(413 if length > 0 else 400, f"send the image as the body (max {API_MAX_BODY_MB} MB)")
+        data = self.rfile.read(length)
+        try:
+            params = parse_params(url.query)
+            self._send(200, self.service.detect(data, params))
+        except PoolBusy as e:
+            self._send(503, {"error": f"busy: {e}"}, {"Retry-After": "1"})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except TimeoutError:
+            self._send(504, {"error": "timed out"})
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+
+    def log_message(self, fmt, *args):
+        if os.getenv("API_ACCESS_LOG", "0") == "1":
+            super().log_message(fmt, *args)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default listen backlog of 5 resets connections under bursts
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default=API_HOST)
+    ap.add_argument("--port", type=int, default=API_PORT)
+    ap.add_argument("--max-batch", type=int, default=API_MAX_BATCH)
+    ap.add_argument("--max-wait-ms", type=float, default=API_MAX_WAIT_MS)
+    ap.add_argument("--max-pending", type=int, default=API_MAX_PENDING)
+    args = ap.parse_args(argv)
+    Handler.service = DetectionService(max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                                       max_pending=args.max_pending)
+    server = _Server((args.host, args.port), Handler)
+    print(f"Serving on http://{args.host}:{args.port} (max batch {args.max_batch}, max wait {args.max_wait_ms:g} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
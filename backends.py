@@ -0,0 +1,178 @@
+"""CPU inference backends: export the .pt checkpoint once per imgsz and reload the cached artifact.
+
+Run as a script for a side-by-side latency / agreement report:
+
+    python backends.py --images samples/ --imgsz 640 --backends pytorch onnx openvino torchscript --int8
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+BACKENDS = ["pytorch", "onnx", "openvino", "torchscript"]
+EXPORT_FORMATS = {"onnx": "onnx", "openvino": "openvino", "torchscript": "torchscript"}
+INT8_BACKENDS = {"onnx"}  # dynamic (weight-only) quantization via onnxruntime
+
+_export_lock = threading.Lock()
+
+
+def artifact_path(export_dir: str, model_key: str, backend: str, imgsz: int, int8: bool = False) -> str:
+    tag = hashlib.sha1(model_key.encode()).hexdigest()[:12]
+    stem = f"best-{tag}-{imgsz}{'-int8' if int8 else ''}"
+    return os.path.join(export_dir, {
+        "onnx": f"{stem}.onnx",
+        "openvino": f"{stem}_openvino_model",
+        "torchscript": f"{stem}.torchscript",
+    }[backend])
+
+def _quantize_onnx(src: str, dest: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(src, dest, weight_type=QuantType.QUInt8)
+
+def _fp32_path(int8_dest: str) -> str:
+    root, ext = os.path.splitext(int8_dest)
+    return root.removesuffix("-int8") + ext
+
+def _export(pt_path: str, dest: str, backend: str, imgsz: int) -> str:
+    if os.path.exists(dest):
+        return dest
+    from ultralytics import YOLO
+    # ultralytics writes next to the .pt under a fixed name, so move it aside straight away
+    out = YOLO(pt_path).export(format=EXPORT_FORMATS[backend], imgsz=imgsz, dynamic=False, verbose=False)
+    tmp = f"{dest}.tmp"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    shutil.move(str(out), tmp)
+    os.replace(tmp, dest)
+    return dest
+
+def export_model(pt_path: str, dest: str, backend: str, imgsz: int, int8: bool = False) -> str:
+    """Export pt_path to dest unless it already exists; returns dest."""
+    if backend not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+    if int8 and backend not in INT8_BACKENDS:
+        raise ValueError(f"INT8 is only available for: {', '.join(sorted(INT8_BACKENDS))}")
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with _export_lock:
+        if os.path.exists(dest):
+            return dest
+        if not int8:
+            return _export(pt_path, dest, backend, imgsz)
+        fp32 = _export(pt_path, _fp32_path(dest), backend, imgsz)
+        tmp = f"{dest}.tmp"
+        _quantize_onnx(fp32, tmp)
+        os.replace(tmp, dest)
+        return dest
+
+def load_backend(pt_path: str, model_key: str, backend: str = "pytorch", imgsz: int = 640,
+                 int8: bool = False, export_dir: str = "/tmp/models/exports"):
+    from ultralytics import YOLO
+    if backend == "pytorch":
+        return YOLO(pt_path)
+    dest = artifact_path(export_dir, model_key, backend, imgsz, int8)
+    return YOLO(export_model(pt_path, dest, backend, imgsz, int8), task="detect")
+
+
+# ======================= Report =======================
+def _agreement(ref, raw, iou_thresh: float = 0.5) -> tuple[int, int, int]:
+    """(matched, n_ref, n_other): class-aware IoU matches against the reference backend."""
+    from detection import iou_matrix
+    from tracking import greedy_match
+    iou = iou_matrix(ref.boxes, raw.boxes)
+    if iou.size:
+        iou[ref.class_ids[:, None] != raw.class_ids[None, :]] = 0.0
+    r, _ = greedy_match(iou, iou_thresh)
+    return len(r), len(ref), len(raw)
+
+def compare_backends(pt_path: str, model_key: str, images: list[np.ndarray], imgsz: int = 640,
+                     backends: list[str] = BACKENDS, int8: bool = False, runs: int = 3, conf: float = 0.25,
+                     export_dir: str = "/tmp/models/exports") -> list[dict]:
+    """Latency and detection agreement of each backend against PyTorch eager on the same images."""
+    from detection import raw_prediction
+    variants = [(b, False) for b in backends]
+    if int8:
+        variants += [(b, True) for b in backends if b in INT8_BACKENDS]
+    if ("pytorch", False) not in variants:
+        variants.insert(0, ("pytorch", False))
+
+    rows, reference = [], None
+    for backend, q in variants:
+        t0 = time.perf_counter()
+        try:
+            model = load_backend(pt_path, model_key, backend, imgsz, q, export_dir)
+        except Exception as e:
+            rows.append({"backend": backend, "int8": q, "error": str(e)})
+            continue
+        load_s = time.perf_counter() - t0
+        model.predict(images[0], imgsz=imgsz, conf=conf, verbose=False)  # warm-up
+        times, raws = [], []
+        for _ in range(runs):
+            raws = []
+            for img in images:
+                t = time.perf_counter()
+                pred = model.predict(img, imgsz=imgsz, conf=conf, verbose=False)[0]
+                times.append((time.perf_counter() - t) * 1000)
+                raws.append(raw_prediction(pred, model, img.shape))
+        row = {"backend": backend, "int8": q, "load_s": round(load_s, 2),
+               "mean_ms": round(float(np.mean(times)), 2),
+               "p50_ms": round(float(np.percentile(times, 50)), 2),
+               "p95_ms": round(float(np.percentile(times, 95)), 2)}
+        if reference is None:
+            reference = raws
+        m = n_ref = n_other = 0
+        for ref, raw in zip(reference, raws):
+            a, b, c = _agreement(ref, raw)
+            m += a; n_ref += b; n_other += c
+        row["recall_vs_pytorch"] = round(m / n_ref, 4) if n_ref else 1.0
+        row["precision_vs_pytorch"] = round(m / n_other, 4) if n_other else 1.0
+        rows.append(row)
+    base = next((r["mean_ms"] for r in rows if r["backend"] == "pytorch" and "mean_ms" in r), None)
+    for r in rows:
+        if base and "mean_ms" in r:
+            r["speedup"] = round(base / r["mean_ms"], 2)
+    return rows
+
+def _read_images(folder: str, limit: int) -> list[np.ndarray]:
+    import cv2
+    paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+    imgs = [cv2.imread(p) for p in paths[:limit]]
+    return [im for im in imgs if im is not None]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare CPU inference backends on a folder of images.")
+    ap.add_argument("--model", default=None, help="Path to .pt (default: app's LOCAL_MODEL / cached download)")
+    ap.add_argument("--images", required=True)
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    ap.add_argument("--int8", action="store_true", help="Also benchmark INT8 variants where supported")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--json", default=None, help="Write rows to this JSON file")
+    args = ap.parse_args(argv)
+
+    pt = args.model or os.getenv("LOCAL_MODEL", "best.pt")
+    if not os.path.exists(pt) and os.path.exists("/tmp/models/best.pt"):
+        pt = "/tmp/models/best.pt"
+    key = f"{pt}:{os.path.getmtime(pt)}:{os.path.getsize(pt)}"
+    images = _read_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    rows = compare_backends(pt, key, images, args.imgsz, args.backends, args.int8, args.runs)
+    cols = ["backend", "int8", "load_s", "mean_ms", "p50_ms", "p95_ms", "speedup",
+            "recall_vs_pytorch", "precision_vs_pytorch", "error"]
+    print("  ".join(f"{c:>20}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r.get(c, '')):>20}" for c in cols))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
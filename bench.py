@@ -0,0 +1,200 @@
+"""Per-stage latency benchmark for the detection pipeline, with a baseline check for CI.
+
+    python bench.py --tiny --out bench.json                              # offline, random-weight yolov8n
+    python bench.py --model best.pt --images samples/ --baseline bench_base.json --threshold 0.15
+    python bench.py --tiny --save-baseline bench_base.json
+
+Stages: decode (PIL + pil_to_bgr, cv2, reduced cv2), model.predict at every IMGSZ_OPTIONS size with TTA off
+and on, letterbox preprocessing and predict through preprocess.LetterboxEngine vs ultralytics at the reference
+size, the post-filter, draw_boxes and guidance-card compile/render. With --baseline the run fails (exit 1)
+when a stage's median is more than --threshold slower and at least --min-delta-ms slower than the baseline.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from detection import draw_boxes, filter_raw, raw_prediction
+from guidance import compile_card, render_card
+from cities import city_guide, load_index
+from image_io import decode_bgr, encode_jpeg, pil_to_bgr
+from preprocess import engine_for, predict_raw
+from presets import CLASS_NAMES, IMGSZ_OPTIONS, PRESETS, per_class_thresholds
+
+
+def load_images(folder: str | None, limit: int) -> list[bytes]:
+    if folder:
+        paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+        if not paths:
+            sys.exit(f"no jpg/png images in {folder}")
+        out = []
+        for p in paths[:limit]:
+            with open(p, "rb") as f:
+                out.append(f.read())
+        return out
+    # Smooth random scenes compress like photos, unlike pure noise
+    rng = np.random.default_rng(0)
+    imgs = []
+    for _ in range(limit):
+        small = rng.integers(0, 255, (24, 32, 3), dtype=np.uint8)
+        big = np.asarray(Image.fromarray(small).resize((1600, 1200), Image.BICUBIC))
+        imgs.append(encode_jpeg(np.ascontiguousarray(big), 90))
+    return imgs
+
+def load_model(path: str | None, tiny: bool):
+    from ultralytics import YOLO
+    if tiny or not path:
+        return YOLO("yolov8n.yaml"), "yolov8n.yaml (random weights)"
+    return YOLO(path), os.path.basename(path)
+
+def _timed(fn, repeat: int, warmup: int = 1) -> list[float]:
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t) * 1e3)
+    return out
+
+def _summary(ms: list[float]) -> dict:
+    s = sorted(ms)
+    return {"n": len(s), "mean_ms": round(statistics.fmean(s), 3), "p50_ms": round(statistics.median(s), 3),
+            "p90_ms": round(s[min(len(s) - 1, int(len(s) * .9))], 3), "min_ms": round(s[0], 3)}
+
+def run(images: list[bytes], model, sizes: list[int], repeat: int, tta: bool = True, log=print) -> dict:
+    stages: dict[str, list[float]] = {}
+    add = lambda name, ms: stages.setdefault(name, []).extend(ms)
+
+    bgrs = []
+    for data in images:
+        add("decode/pil", _timed(lambda: pil_to_bgr(Image.open(io.BytesIO(data))), repeat))
+        add("decode/cv2", _timed(lambda: decode_bgr(data), repeat))
+        add("decode/cv2@640", _timed(lambda: decode_bgr(data, 640), repeat))
+        bgrs.append(decode_bgr(data))
+    log("decode done")
+
+    raws = []
+    for sz in sizes:
+        for aug in ((False, True) if tta else (False,)):
+            name = f"predict/{sz}" + ("+tta" if aug else "")
+            for bgr in bgrs:
+                add(name, _timed(lambda: model.predict(bgr, imgsz=sz, conf=0.05, augment=aug, verbose=False), repeat))
+            log(f"{name}: {statistics.median(stages[name]):.1f} ms")
+    ref = 640 if 640 in sizes else sizes[len(sizes) // 2]
+    for bgr in bgrs:
+        raws.append(raw_prediction(model.predict(bgr, imgsz=ref, conf=0.05, verbose=False)[0], model, bgr.shape))
+
+    eng, predictor = engine_for(model, ref), model.predictor
+    predictor.imgsz = (ref, ref)
+    for bgr in bgrs:
+        add(f"preprocess/ultralytics@{ref}", _timed(lambda: predictor.preprocess([bgr]), repeat))
+        add(f"preprocess/engine@{ref}", _timed(lambda: eng.prepare([bgr], ref), repeat))
+        add(f"predict/{ref}/engine", _timed(lambda: predict_raw(model, [bgr], imgsz=ref, conf=0.05), repeat))
+    log(f"preprocess@{ref}: ultralytics {statistics.median(stages[f'preprocess/ultralytics@{ref}']):.2f} ms, "
+        f"engine {statistics.median(stages[f'preprocess/engine@{ref}']):.2f} ms")
+
+    p = PRESETS["Recommended"]
+    thresholds = per_class_thresholds(p["bottle_min"], p["can_min"], p["cap_min"])
+    for bgr, raw in zip(bgrs, raws):
+        add("filter", _timed(lambda: filter_raw(raw, thresholds, 0.05, p["min_area_pct"], fallback=CLASS_NAMES),
+                             repeat * 10))
+        dets = filter_raw(raw, thresholds, 0.05, 0.0, fallback=CLASS_NAMES)
+        add("draw_boxes", _timed(lambda: draw_boxes(bgr, dets), repeat))
+
+    entries = [info for c in load_index() for info in city_guide(c).values()]
+    compiled = [compile_card(info) for info in entries]
+    add("cards/compile", _timed(lambda: [compile_card(info) for info in entries], repeat * 10))
+    add("cards/render", _timed(lambda: [render_card(c, 3) for c in compiled], repeat * 10))
+
+    return {name: _summary(ms) for name, ms in stages.items()}
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta_ms: float) -> tuple[list[dict], list[str]]:
+    rows, regressions = [], []
+    for name, cur in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            rows.append({"stage": name, "p50_ms": cur["p50_ms"], "base_ms": None, "ratio": None, "status": "new"})
+            continue
+        ratio = cur["p50_ms"] / max(base["p50_ms"], 1e-9)
+        slower = ratio > 1 + threshold and cur["p50_ms"] - base["p50_ms"] > min_delta_ms
+        faster = ratio < 1 - threshold and base["p50_ms"] - cur["p50_ms"] > min_delta_ms
+        status = "REGRESSION" if slower else "faster" if faster else "ok"
+        rows.append({"stage": name, "p50_ms": cur["p50_ms"], "base_ms": base["p50_ms"], "ratio": round(ratio, 3),
+                     "status": status})
+        if slower:
+            regressions.append(name)
+    return rows, regressions
+
+def _meta(model_desc: str, images: list[bytes], args) -> dict:
+    try:
+        import torch
+        torch_info = {"torch": torch.__version__, "threads": torch.get_num_threads()}
+    except ImportError:
+        torch_info = {}
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "machine": platform.machine(), "processor": platform.processor(), "cpus": os.cpu_count(),
+            "model": model_desc, "images": len(images), "source": args.images or "synthetic", "repeat": args.repeat,
+            **torch_info}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--images", help="Folder of sample jpg/png images (default: synthetic 1600x1200 JPEGs)")
+    ap.add_argument("--limit", type=int, default=4)
+    ap.add_argument("--model", help="Checkpoint to benchmark")
+    ap.add_argument("--tiny", action="store_true", help="Random-weight yolov8n; no checkpoint or network needed")
+    ap.add_argument("--sizes", type=int, nargs="+", default=IMGSZ_OPTIONS)
+    ap.add_argument("--no-tta", action="store_true")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="Write results JSON here (default: stdout)")
+    ap.add_argument("--baseline", help="Compare against this results JSON")
+    ap.add_argument("--save-baseline", help="Also write the results as a new baseline")
+    ap.add_argument("--threshold", type=float, default=0.15, help="Allowed median slowdown, as a fraction")
+    ap.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this")
+    args = ap.parse_args(argv)
+
+    images = load_images(args.images, args.limit)
+    model, desc = load_model(args.model, args.tiny)
+    log = lambda msg: print(msg, file=sys.stderr)
+    result = {"meta": _meta(desc, images, args),
+              "stages": run(images, model, sorted(args.sizes), args.repeat, tta=not args.no_tta, log=log)}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("model") != desc:
+            log(f"warning: baseline model {baseline.get('meta', {}).get('model')!r} differs from {desc!r}")
+        rows, regressions = compare(result, baseline, args.threshold, args.min_delta_ms)
+        result["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "rows": rows,
+                                "regressions": regressions}
+        log(f"{'stage':22s} {'p50 ms':>10s} {'base ms':>10s} {'ratio':>7s}  status")
+        for r in rows:
+            base = f"{r['base_ms']:10.2f}" if r["base_ms"] is not None else f"{'-':>10s}"
+            ratio = f"{r['ratio']:7.2f}" if r["ratio"] is not None else f"{'-':>7s}"
+            log(f"{r['stage']:22s} {r['p50_ms']:10.2f} {base} {ratio}  {r['status']}")
+        if regressions:
+            log(f"{len(regressions)} stage(s) regressed more than {args.threshold:.0%}: {', '.join(regressions)}")
+            status = 1
+
+    text = json.dumps(result, indent=1)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({k: result[k] for k in ("meta", "stages")}, f, indent=1)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Cold-start benchmark: time-to-first-paint and time-to-first-detection, each run in a fresh interpreter.
+
+    python bench_startup.py --model best.pt --image samples/a.jpg --runs 3 --think 0 3
+
+Every run executes streamlit_app.py once through Streamlit's AppTest (the script run a new browser
+session triggers) and then detects on --image the way "Run detection" does, after --think seconds
+of simulated user time. Modes:
+
+    eager  ultralytics imported before the UI and the model loaded on first use (the old startup)
+    lazy   UI first, import + load + warm-up on the background thread (current)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "streamlit_app.py")
+MODES = ["eager", "lazy"]
+
+
+def _child(mode: str, image: str | None, think: float, imgsz: int):
+    t0 = time.perf_counter()
+    if mode == "eager":
+        import ultralytics  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=600)
+    at.run()
+    import model_store  # the instance the script run imported
+    from image_io import decode_bgr
+    paint = model_store.STARTUP.get("first_paint", time.perf_counter()) - t0
+    time.sleep(think)
+
+    t_click = time.perf_counter()
+    model_store.start_warmup().wait()
+    path = model_store.ensure_model_path()
+    model = model_store.get_model(path, model_store.cache_key_for(path))
+    if image:
+        with open(image, "rb") as f:
+            bgr = decode_bgr(f.read(), imgsz)
+    else:
+        import numpy as np
+        bgr = np.random.default_rng(0).integers(0, 255, (960, 1280, 3), dtype=np.uint8)
+    model.predict(bgr, imgsz=imgsz, verbose=False)
+    t_done = time.perf_counter()
+    print(json.dumps({"mode": mode, "think_s": think, "exception": [str(e.value) for e in at.exception],
+                      "first_paint_s": round(paint, 3), "first_detection_s": round(t_done - t0, 3),
+                      "click_to_result_s": round(t_done - t_click, 3)}))
+
+def _run_once(mode: str, args) -> dict:
+    env = dict(os.environ, MODEL_URL="", LOCAL_MODEL=os.path.abspath(args.model), IMGSZ=str(args.imgsz),
+               WARMUP="0" if mode == "eager" else "1")
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, "--think", str(args.think[0]),
+           "--imgsz", str(args.imgsz)] + (["--image", os.path.abspath(args.image)] if args.image else [])
+    out = subprocess.run(cmd, cwd=HERE, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--model", default=os.getenv("LOCAL_MODEL", "best.pt"))
+    ap.add_argument("--image", help="Image for the first detection (default: random 1280x960)")
+    ap.add_argument("--imgsz", type=int, default=int(os.getenv("IMGSZ", "640")))
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--think", type=float, nargs="+", default=[0.0],
+                    help="Seconds between first paint and the detection click")
+    ap.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    ap.add_argument("--json", help="Also write the per-run results here")
+    ap.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.child:
+        return _child(args.child, args.image, args.think[0], args.imgsz)
+
+    rows = []
+    for think in args.think:
+        for mode in args.modes:
+            runs = [_run_once(mode, argparse.Namespace(**{**vars(args), "think": [think]})) for _ in range(args.runs)]
+            for r in runs:
+                if r["exception"]:
+                    print(f"{mode}: app raised {r['exception']}", file=sys.stderr)
+            rows.append(runs)
+            med = {k: statistics.median(r[k] for r in runs)
+                   for k in ("first_paint_s", "first_detection_s", "click_to_result_s")}
+            print(f"{mode:6s} think={think:4.1f}s  first paint {med['first_paint_s']:6.2f}s  "
+                  f"first detection {med['first_detection_s']:6.2f}s  click->result {med['click_to_result_s']:6.2f}s"
+                  f"  (median of {len(runs)})")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([r for runs in rows for r in runs], f, indent=1)
+
+if __name__ == "__main__":
+    main()
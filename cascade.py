@@ -0,0 +1,69 @@
+"""Auto inference size: predict at a small imgsz first and move up the ladder only when the result looks unsure.
+
+Boxes at or above max(conf, AUTO_FLOOR) are the candidates. A pass is accepted when there is at least one,
+all of them are confident and none is tiny; otherwise the next size runs if its estimated cost (previous
+stage time scaled by pixel count) still fits the latency budget.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from detection import RawPrediction
+
+AUTO_SIZES     = tuple(int(s) for s in os.getenv("AUTO_SIZES", "320,640,960").split(","))
+AUTO_BUDGET_MS = float(os.getenv("AUTO_BUDGET_MS", "1500"))
+AUTO_FLOOR     = float(os.getenv("AUTO_FLOOR", "0.25"))      # below this a box is noise, not an unsure detection
+AUTO_CONFIDENT = float(os.getenv("AUTO_CONFIDENT", "0.5"))   # candidates below this trigger the next size
+AUTO_SMALL_PCT = float(os.getenv("AUTO_SMALL_PCT", "0.5"))   # boxes under this % of the image (or 2x min_area_pct)
+
+
+@dataclass
+class CascadeResult:
+    raw: RawPrediction
+    imgsz: int
+    stages: list = field(default_factory=list)   # [{"imgsz", "ms", "kept", "reason"}], reason=None when accepted
+
+    @property
+    def total_ms(self) -> float:
+        return sum(s["ms"] for s in self.stages)
+
+    def summary(self) -> str:
+        return " → ".join(f'{s["imgsz"]}: {s["ms"]:.0f} ms' + (f' ({s["reason"]})' if s["reason"] else "")
+                          for s in self.stages)
+
+
+def escalation_reason(raw: RawPrediction, conf: float, min_area_pct: float,
+                      confident: float = AUTO_CONFIDENT, small_pct: float = AUTO_SMALL_PCT) -> str | None:
+    """Why a larger imgsz might find more, or None when this pass is good enough."""
+    kept = raw.scores >= max(conf, AUTO_FLOOR)
+    if not kept.any():
+        return "nothing found"
+    if (raw.scores[kept] < confident).any():
+        return "low confidence"
+    b = raw.boxes[kept]
+    area_pct = 100.0 * (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) / float(raw.shape[0] * raw.shape[1])
+    if (area_pct < max(small_pct, 2 * min_area_pct)).any():
+        return "small boxes"
+    return None
+
+def cascade_predict(predict, conf: float, min_area_pct: float, sizes=AUTO_SIZES, budget_ms: float = AUTO_BUDGET_MS,
+                    confident: float = AUTO_CONFIDENT, small_pct: float = AUTO_SMALL_PCT) -> CascadeResult:
+    """predict(imgsz) -> RawPrediction, called for ascending sizes until a pass is accepted or the budget runs out."""
+    sizes = sorted(set(int(s) for s in sizes))
+    t_start, stages, raw = time.perf_counter(), [], None
+    for i, s in enumerate(sizes):
+        t = time.perf_counter()
+        raw = predict(s)
+        ms = (time.perf_counter() - t) * 1e3
+        reason = escalation_reason(raw, conf, min_area_pct, confident, small_pct)
+        stages.append({"imgsz": s, "ms": round(ms, 1), "kept": int(np.count_nonzero(raw.scores >= conf)),
+                       "reason": reason})
+        if reason is None or i + 1 == len(sizes):
+            break
+        spent = (time.perf_counter() - t_start) * 1e3
+        if spent + ms * (sizes[i + 1] / s) ** 2 > budget_ms:
+            stages[-1]["reason"] = f"{reason}; next size over budget"
+            break
+    return CascadeResult(raw, stages[-1]["imgsz"], stages)
@@ -0,0 +1,115 @@
+"""City guidance registry: one JSON file per city under cities/, plus a prebuilt index.
+
+cities/index.json holds only id, display name and supported classes, which is all the City / Ward
+selectbox needs, so startup reads one small file however many cities exist. A city's full guidance
+(cities/<id>.json: {"id", "name", "guide": {class name: card entry}}) is parsed and validated on first
+use and kept in an LRU of CITY_CACHE_SIZE cities.
+
+    python cities.py build    # rewrite cities/index.json after adding or editing a city file
+    python cities.py check    # validate every city file and the index against them (CI)
+"""
+import argparse
+import json
+import os
+import sys
+from functools import lru_cache
+
+CITY_DIR        = os.getenv("CITY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cities"))
+CITY_INDEX      = os.path.join(CITY_DIR, "index.json")
+CITY_CACHE_SIZE = int(os.getenv("CITY_CACHE_SIZE", "32"))
+DEFAULT_CITY    = os.getenv("DEFAULT_CITY", "shibuya")
+
+_REQUIRED = ("title", "link")
+_LISTS    = ("why_separate", "steps", "recycles_to", "facts", "images", "icons")
+
+
+class CityError(ValueError):
+    pass
+
+
+def validate_entry(city_id: str, label: str, info) -> None:
+    """Raise CityError when a card entry would fail in guidance.compile_card."""
+    where = f"{city_id}/{label}"
+    if not isinstance(info, dict):
+        raise CityError(f"{where}: entry must be an object")
+    for k in _REQUIRED:
+        if not isinstance(info.get(k), str) or not info[k]:
+            raise CityError(f"{where}: missing {k!r}")
+    for k in _LISTS:
+        if k in info and not isinstance(info[k], list):
+            raise CityError(f"{where}: {k!r} must be a list")
+    for f in info.get("facts", []):
+        if not isinstance(f, dict) or not f.get("text") or not f.get("url"):
+            raise CityError(f"{where}: each fact needs 'text' and 'url'")
+
+def _read_city(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    city_id = os.path.splitext(os.path.basename(path))[0]
+    if doc.get("id", city_id) != city_id:
+        raise CityError(f"{path}: id {doc['id']!r} must match the file name")
+    if not doc.get("name") or not isinstance(doc.get("guide"), dict):
+        raise CityError(f"{path}: needs 'name' and a 'guide' object")
+    for label, info in doc["guide"].items():
+        validate_entry(city_id, label, info)
+    return {**doc, "id": city_id}
+
+def _city_files() -> list[str]:
+    return sorted(os.path.join(CITY_DIR, n) for n in os.listdir(CITY_DIR)
+                  if n.endswith(".json") and n != os.path.basename(CITY_INDEX))
+
+def build_index() -> list[dict]:
+    return [{"id": c["id"], "name": c["name"], "classes": sorted(c["guide"])} for c in map(_read_city, _city_files())]
+
+@lru_cache(maxsize=1)
+def load_index() -> dict[str, dict]:
+    """{city id: {"id", "name", "classes"}} in display order."""
+    try:
+        with open(CITY_INDEX, encoding="utf-8") as f:
+            entries = json.load(f)
+    except FileNotFoundError:  # no prebuilt index (e.g. a fresh checkout of a data-only change): derive it once
+        entries = build_index()
+    return {e["id"]: e for e in entries}
+
+@lru_cache(maxsize=CITY_CACHE_SIZE)
+def city_guide(city_id: str) -> dict:
+    """{class name: card entry} for one city, read and validated on first use. Treat as read-only."""
+    if city_id not in load_index():
+        raise KeyError(f"unknown city {city_id!r}")
+    return _read_city(os.path.join(CITY_DIR, f"{city_id}.json"))["guide"]
+
+def class_mismatch(city_id: str, class_names) -> tuple[list[str], list[str]]:
+    """(guide labels the model never predicts, model classes the city has no guidance for)."""
+    have, known = set(load_index()[city_id]["classes"]), set(class_names)
+    return sorted(have - known), sorted(known - have)
+
+def cache_info():
+    return city_guide.cache_info()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("command", choices=["build", "check"])
+    args = ap.parse_args(argv)
+    try:
+        index = build_index()
+    except ValueError as e:  # CityError or malformed JSON
+        sys.exit(f"invalid city file: {e}")
+    if args.command == "build":
+        with open(f"{CITY_INDEX}.tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        os.replace(f"{CITY_INDEX}.tmp", CITY_INDEX)
+        print(f"{CITY_INDEX}: {len(index)} cities")
+        return
+    with open(CITY_INDEX, encoding="utf-8") as f:
+        if json.load(f) != index:
+            sys.exit(f"{CITY_INDEX} is stale; run `python cities.py build`")
+    from presets import CLASS_NAMES
+    for e in index:
+        unknown, missing = set(e["classes"]) - set(CLASS_NAMES), set(CLASS_NAMES) - set(e["classes"])
+        if unknown or missing:
+            print(f"{e['id']}: unknown labels {sorted(unknown)}, no guidance for {sorted(missing)}")
+    print(f"{len(index)} cities OK")
+
+if __name__ == "__main__":
+    main()
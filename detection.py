@@ -0,0 +1,158 @@
+"""Columnar detection results and vectorized post-filtering shared by the app and headless tools."""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Detections:
+    xyxy: np.ndarray        # (N, 4) float32, original image pixels
+    scores: np.ndarray      # (N,) float32
+    class_ids: np.ndarray   # (N,) int64
+    names: tuple            # class id -> display name
+    class_counts: np.ndarray  # (len(names),) int64, from np.bincount
+
+    def __len__(self) -> int:
+        return int(self.scores.shape[0])
+
+    @property
+    def class_names(self) -> list[str]:
+        return [self.names[c] for c in self.class_ids.tolist()]
+
+    @property
+    def counts(self) -> dict:
+        return {self.names[i]: int(n) for i, n in enumerate(self.class_counts.tolist()) if n}
+
+    def to_columns(self) -> dict:
+        # Ready for pd.DataFrame / JSON without building a dict per box
+        return {
+            "x1": self.xyxy[:, 0], "y1": self.xyxy[:, 1], "x2": self.xyxy[:, 2], "y2": self.xyxy[:, 3],
+            "class_id": self.class_ids, "class_name": self.class_names, "score": self.scores,
+        }
+
+    def to_records(self) -> list[dict]:
+        names = self.class_names
+        return [
+            {"xyxy": b, "class_id": c, "class_name": n, "score": s}
+            for b, c, n, s in zip(self.xyxy.tolist(), self.class_ids.tolist(), names, self.scores.tolist())
+        ]
+
+
+@dataclass(frozen=True)
+class RawPrediction:
+    """Unfiltered model output for one image; cheap to cache and re-filter."""
+    boxes: np.ndarray       # (N, 4) float32
+    scores: np.ndarray      # (N,) float32
+    class_ids: np.ndarray   # (N,) int64
+    names_map: dict | None
+    shape: tuple            # (H, W) of the image the boxes refer to
+
+    def __len__(self) -> int:
+        return int(self.scores.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return self.boxes.nbytes + self.scores.nbytes + self.class_ids.nbytes
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) xyxy boxes -> (N, M)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(np.clip(a[:, 2:] - a[:, :2], 0, None), axis=1)
+    area_b = np.prod(np.clip(b[:, 2:] - b[:, :2], 0, None), axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+def get_names_map(pred, model):
+    # Use checkpoint names if present, else fallback; replace with a forced map if needed later
+    names_map = None
+    if hasattr(pred, "names") and isinstance(pred.names, dict):
+        names_map = pred.names
+    elif hasattr(model, "names") and isinstance(model.names, dict):
+        names_map = model.names
+    elif hasattr(model, "names") and isinstance(model.names, list):
+        names_map = {i: n for i, n in enumerate(model.names)}
+    return names_map
+
+def names_list(names_map, fallback: list[str], n_classes: int = 0) -> tuple:
+    """Dense id -> name table; unknown ids map to str(id) like the old per-box lookup."""
+    if isinstance(names_map, dict):
+        n = max([n_classes] + [int(k) + 1 for k in names_map])
+        return tuple(str(names_map.get(i, i)) for i in range(n))
+    n = max(n_classes, len(fallback))
+    return tuple(fallback[i] if i < len(fallback) else str(i) for i in range(n))
+
+def raw_from_pred(pred):
+    """(boxes, scores, class_ids) as NumPy arrays from an ultralytics Results object."""
+    if pred.boxes is None or len(pred.boxes) == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+    b = pred.boxes
+    return (b.xyxy.cpu().numpy().astype(np.float32, copy=False),
+            b.conf.cpu().numpy().astype(np.float32, copy=False),
+            b.cls.cpu().numpy().astype(np.int64))
+
+def raw_prediction(pred, model, shape) -> RawPrediction:
+    boxes, scores, class_ids = raw_from_pred(pred)
+    names_map = get_names_map(pred, model)
+    return RawPrediction(boxes, scores, class_ids, dict(names_map) if names_map else None, tuple(shape[:2]))
+
+def threshold_vector(names: tuple, per_class_min: dict, conf: float) -> np.ndarray:
+    # Base conf is a floor: predictions made at a lower conf (live re-filtering) must match a direct run
+    thr = np.full(len(names), conf, dtype=np.float32)
+    for i, name in enumerate(names):
+        if name in per_class_min:
+            thr[i] = max(conf, per_class_min[name])
+    return thr
+
+def filter_detections(boxes, scores, class_ids, names_map, shape, per_class_min: dict, conf: float,
+                      min_area_pct: float, fallback: list[str] = ()) -> Detections:
+    """Apply per-class score minimums and the min-area rule to whole arrays at once."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+    n_classes = int(class_ids.max()) + 1 if class_ids.size else 0
+    names = names_list(names_map, list(fallback), n_classes)
+
+    H, W = shape[:2]
+    min_area = (min_area_pct / 100.0) * (H * W)
+    wh = np.clip(boxes[:, 2:4] - boxes[:, 0:2], 0.0, None)
+    area = wh[:, 0] * wh[:, 1]
+
+    thr = threshold_vector(names, per_class_min, conf)
+    keep = (scores >= thr[class_ids]) & (area >= min_area)
+
+    kept_cls = class_ids[keep]
+    return Detections(
+        xyxy=boxes[keep], scores=scores[keep], class_ids=kept_cls, names=names,
+        class_counts=np.bincount(kept_cls, minlength=len(names)),
+    )
+
+def filter_raw(raw: RawPrediction, per_class_min: dict, conf: float, min_area_pct: float,
+               fallback: list[str] = ()) -> Detections:
+    return filter_detections(raw.boxes, raw.scores, raw.class_ids, raw.names_map, raw.shape,
+                             per_class_min, conf, min_area_pct, fallback=fallback)
+
+def draw_boxes(bgr, dets: Detections, inplace: bool = False) -> np.ndarray:
+    """Annotated BGR array; inplace=True draws on bgr itself when the clean frame is no longer needed."""
+    import cv2
+    out = bgr if inplace else bgr.copy()
+    H, W = out.shape[:2]
+    color = (28,160,78)  # theme green (BGR)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    fs, thick = 0.5, 1
+    for (x1, y1, x2, y2), name, score in zip(dets.xyxy.astype(int).tolist(), dets.class_names, dets.scores.tolist()):
+        cv2.rectangle(out, (x1, y1), (x2, y2), color, 2)
+        label = f'{name} {score:.2f}'
+        (tw, th), _ = cv2.getTextSize(label, font, fs, thick)
+        y_text = y1 - 4
+        if y_text - th - 4 < 0:
+            y_text = min(y1 + th + 6, H - 2)
+        x_text = max(0, min(x1, W - tw - 6))
+        x_bg1, y_bg1 = x_text, max(0, y_text - th - 4)
+        x_bg2, y_bg2 = min(x_text + tw + 6, W - 1), min(y_text + 2, H - 1)
+        cv2.rectangle(out, (x_bg1, y_bg1), (x_bg2, y_bg2), color, -1)
+        cv2.putText(out, label, (x_text + 3, y_text - 2), font, fs, (255, 255, 255), 1, cv2.LINE_AA)
+    return out
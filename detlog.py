@@ -0,0 +1,233 @@
+"""Append-only detection log in SQLite (WAL) with rollups maintained at write time.
+
+record() only enqueues; a background thread writes batches, each in one transaction that appends the raw
+rows (scans, detections) and upserts the rollups (daily, daily_scans, city_totals). The dashboard reads
+only the rollups, whose size grows with days x cities x classes rather than with detections, so its
+queries stay fast at millions of logged items. Several app processes can share one file.
+
+    python detlog.py --summary [--city shibuya] [--days 30]
+    python detlog.py --bench 2000000     # fill a scratch DB (--bench-path) and time the dashboard queries
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DETLOG       = os.getenv("DETLOG", "1") == "1"
+DETLOG_PATH  = os.getenv("DETLOG_PATH", "/tmp/litter/detections.sqlite")
+DETLOG_QUEUE = int(os.getenv("DETLOG_QUEUE", "10000"))   # pending scans; beyond this new ones are dropped
+DETLOG_TZ    = os.getenv("DETLOG_TZ", "Asia/Tokyo")      # day boundaries for the rollups
+BATCH        = 256
+ALL          = "*"   # rollup rows summed over every city, so "all cities" reads as few rows as one city
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY, ts REAL NOT NULL, day TEXT NOT NULL, city TEXT NOT NULL, source TEXT NOT NULL,
+    items INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS detections (
+    scan_id INTEGER NOT NULL, ts REAL NOT NULL, city TEXT NOT NULL, class TEXT NOT NULL, score REAL);
+CREATE TABLE IF NOT EXISTS daily (
+    city TEXT NOT NULL, day TEXT NOT NULL, class TEXT NOT NULL, items INTEGER NOT NULL,
+    PRIMARY KEY (city, day, class)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_scans (
+    city TEXT NOT NULL, day TEXT NOT NULL, scans INTEGER NOT NULL, PRIMARY KEY (city, day)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS city_totals (
+    city TEXT NOT NULL, class TEXT NOT NULL, items INTEGER NOT NULL, first_ts REAL, last_ts REAL,
+    PRIMARY KEY (city, class)) WITHOUT ROWID;
+"""
+
+
+def _tz():
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(DETLOG_TZ)
+    except Exception:  # no tzdata: server local time
+        return None
+
+_TZ = _tz()
+
+def day_of(ts: float) -> str:
+    return datetime.fromtimestamp(ts, _TZ).strftime("%Y-%m-%d")
+
+def connect(path: str = DETLOG_PATH, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: durable across app crashes, not power loss
+    con.executescript(SCHEMA)
+    return con
+
+def write_batch(con: sqlite3.Connection, scans: list[tuple]):
+    """scans: (ts, city, source, [(class, score or None), ...]); one transaction for raw rows and rollups."""
+    daily, daily_scans, totals = {}, {}, {}
+    with con:
+        for ts, city, source, items in scans:
+            day = day_of(ts)
+            cur = con.execute("INSERT INTO scans (ts, day, city, source, items) VALUES (?, ?, ?, ?, ?)",
+                              (ts, day, city, source, len(items)))
+            con.executemany("INSERT INTO detections (scan_id, ts, city, class, score) VALUES (?, ?, ?, ?, ?)",
+                            [(cur.lastrowid, ts, city, cls, score) for cls, score in items])
+            for c in (city, ALL):
+                daily_scans[(c, day)] = daily_scans.get((c, day), 0) + 1
+                for cls, _ in items:
+                    daily[(c, day, cls)] = daily.get((c, day, cls), 0) + 1
+                    n, first, last = totals.get((c, cls), (0, ts, ts))
+                    totals[(c, cls)] = (n + 1, min(first, ts), max(last, ts))
+        con.executemany("INSERT INTO daily VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (city, day, class) DO UPDATE SET items = items + excluded.items",
+                        [(*k, n) for k, n in daily.items()])
+        con.executemany("INSERT INTO daily_scans VALUES (?, ?, ?) "
+                        "ON CONFLICT (city, day) DO UPDATE SET scans = scans + excluded.scans",
+                        [(*k, n) for k, n in daily_scans.items()])
+        con.executemany("INSERT INTO city_totals VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (city, class) DO UPDATE SET items = items + excluded.items, "
+                        "first_ts = min(first_ts, excluded.first_ts), last_ts = max(last_ts, excluded.last_ts)",
+                        [(*k, *v) for k, v in totals.items()])
+
+
+class DetectionLog:
+    """Non-blocking writer: record() enqueues, a daemon thread commits batches of up to BATCH scans."""
+
+    def __init__(self, path: str = DETLOG_PATH, max_pending: int = DETLOG_QUEUE):
+        self.path = path
+        self._q: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.written = self.dropped = 0
+        self.error = None
+        threading.Thread(target=self._run, name="detlog", daemon=True).start()
+
+    def record(self, city: str, source: str, classes, scores=None) -> bool:
+        """Log one scan (classes: one name per detected item); False when the queue is full and it was dropped."""
+        items = list(zip(classes, scores)) if scores is not None else [(c, None) for c in classes]
+        try:
+            self._q.put_nowait((time.time(), city, source, items))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def record_counts(self, city: str, source: str, counts: dict) -> bool:
+        return self.record(city, source, [c for c, n in sorted(counts.items()) for _ in range(int(n))])
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until everything enqueued so far is committed (tests / shutdown)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._q.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        con = None
+        while True:
+            batch = [self._q.get()]
+            while len(batch) < BATCH:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                con = con or connect(self.path)
+                write_batch(con, batch)
+                self.written += len(batch)
+                self.error = None
+            except sqlite3.Error as e:  # keep serving; the dashboard shows the error
+                self.error, con = str(e), None
+                self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+
+    def stats(self) -> dict:
+        return {"path": self.path, "pending": self._q.qsize(), "written": self.written, "dropped": self.dropped,
+                "error": self.error}
+
+
+_log = None
+_log_lock = threading.Lock()
+
+def get_log() -> DetectionLog | None:
+    """Process-wide writer, or None when DETLOG=0."""
+    global _log
+    if not DETLOG:
+        return None
+    with _log_lock:
+        if _log is None:
+            _log = DetectionLog()
+        return _log
+
+# ======================= Dashboard queries (rollups only) =======================
+def summary(city: str | None = None, days: int = 30, path: str = DETLOG_PATH) -> dict:
+    """Totals per class (all time), and per-day items / scans over the last `days` days; city=None for all."""
+    out = {"totals": {}, "daily": [], "daily_scans": [], "cities": [], "query_ms": 0.0}
+    if not os.path.exists(path):
+        return out
+    t0 = time.perf_counter()
+    since = day_of(time.time() - (days - 1) * 86400)
+    key = city or ALL
+    con = connect(path, readonly=True)
+    try:
+        out["totals"] = dict(con.execute(
+            "SELECT class, items FROM city_totals WHERE city = ? ORDER BY items DESC", (key,)).fetchall())
+        out["daily"] = con.execute(
+            "SELECT day, class, items FROM daily WHERE city = ? AND day >= ? ORDER BY day", (key, since)).fetchall()
+        out["daily_scans"] = con.execute(
+            "SELECT day, scans FROM daily_scans WHERE city = ? AND day >= ? ORDER BY day", (key, since)).fetchall()
+        if not city:
+            out["cities"] = con.execute(
+                "SELECT city, SUM(items), MAX(last_ts) FROM city_totals WHERE city != ? GROUP BY city ORDER BY 2 DESC",
+                (ALL,)).fetchall()
+    except sqlite3.OperationalError:  # created but no schema yet
+        pass
+    finally:
+        con.close()
+    out["query_ms"] = (time.perf_counter() - t0) * 1e3
+    return out
+
+def _bench(n_items: int, path: str, cities: int = 50, days: int = 365):
+    import random
+    from presets import CLASS_NAMES
+    if os.path.exists(path):
+        os.remove(path)
+    con = connect(path)
+    rng = random.Random(0)
+    now, done, t0 = time.time(), 0, time.perf_counter()
+    while done < n_items:
+        scans = []
+        for _ in range(BATCH):
+            k = rng.randint(1, 6)
+            scans.append((now - rng.random() * days * 86400, f"city{rng.randrange(cities)}", "bench",
+                          [(rng.choice(CLASS_NAMES), rng.random()) for _ in range(k)]))
+            done += k
+        write_batch(con, scans)
+    con.close()
+    print(f"wrote {done} detections in {time.perf_counter() - t0:.1f} s ({os.path.getsize(path) / 1e6:.0f} MB)")
+    for city, d in ((None, 30), ("city1", 30), (None, 365), ("city1", 365)):
+        ms = sorted(summary(city, d, path)["query_ms"] for _ in range(5))
+        print(f"summary(city={city}, days={d}): p50 {ms[2]:.1f} ms, max {ms[-1]:.1f} ms")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--path", default=DETLOG_PATH)
+    ap.add_argument("--summary", action="store_true")
+    ap.add_argument("--city")
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--bench", type=int, metavar="N", help="Write N synthetic detections and time the queries")
+    ap.add_argument("--bench-path", default="/tmp/detlog_bench.sqlite", help="Scratch DB for --bench (overwritten)")
+    args = ap.parse_args(argv)
+    if args.bench:
+        _bench(args.bench, args.bench_path)
+    if args.summary:
+        s = summary(args.city, args.days, args.path)
+        print(f"totals: {s['totals']}")
+        for day, scans in s["daily_scans"]:
+            print(f"{day}: {scans} scans")
+        print(f"({s['query_ms']:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
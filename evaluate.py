@@ -0,0 +1,462 @@
+"""Speed-versus-accuracy sweep of imgsz, TTA, NMS IoU, conf and per-class minimums on a labeled dataset.
+
+    python evaluate.py --data datasets/litter/data.yaml --split val --out eval/
+    python evaluate.py --data annotations/instances_val.json --images images/val --conf 0.05 0.15 0.25 0.35
+
+--data is a YOLO data.yaml, a folder of images with YOLO .txt labels (in a parallel labels/ tree or next to
+each image), or a COCO instances .json (images under --images). Dataset classes are matched to the model's
+by name; without names, YOLO class ids are taken to be the model's.
+
+The model runs once per (image, imgsz, tta). Its output before NMS, cut to candidates above the lowest
+--conf, is kept in memory and, with --cache-dir, on disk for later sweeps. NMS is redone per --iou from
+those candidates, which gives the same boxes as model.predict at that conf. COCO-style matching (greedy
+by score within a class) is computed once per NMS result and --min-area, because dropping lower-scoring
+detections never changes what the higher-scoring ones matched. Every --conf / --class-min combination is
+then only a prefix of each class's score-ordered list. Latency (preprocess + inference + NMS, ms per
+image) is measured on the first --timing-images images per (imgsz, tta, iou). --check re-scores the grid
+with the IoU values in reverse order and fails unless every metric comes out identical.
+
+Writes results.csv (one row per combination, per-class AP50 / AP50-95 / precision / recall) and pareto.csv
+(combinations no faster one beats on --objective) to --out, prints the front and where each preset lands.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from detection import iou_matrix, names_list, threshold_vector
+from image_io import decode_bgr
+from presets import CLASS_NAMES, IMGSZ_OPTIONS, PRESETS, per_class_thresholds
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_POINTS  = np.linspace(0, 1, 101)
+OBJECTIVES     = ("map50", "map", "f1", "precision", "recall")
+_MINS          = ("bottle_min", "can_min", "cap_min")
+
+
+def _uniq(vals) -> list:
+    return sorted(set(vals))
+
+# ======================= Datasets =======================
+def _label_path(img: str) -> str:
+    """Ultralytics layout: .../images/x.jpg -> .../labels/x.txt; else x.txt next to the image."""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    stem = os.path.splitext(img)[0]
+    if sa in img:
+        p = sb.join(stem.rsplit(sa, 1)) + ".txt"
+        if os.path.exists(p):
+            return p
+    return stem + ".txt"
+
+def _read_yolo_labels(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """(cls ids, normalized xyxy); polygon (segment) rows become their bounding box."""
+    cls, boxes = [], []
+    try:
+        with open(path, encoding="utf-8") as f:
+            rows = [r.split() for r in f if r.strip()]
+    except FileNotFoundError:  # image without objects
+        rows = []
+    for r in rows:
+        v = np.asarray(r[1:], np.float32)
+        if len(v) == 4:
+            cx, cy, w, h = v
+            boxes.append((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2))
+        else:
+            xy = v[: len(v) // 2 * 2].reshape(-1, 2)
+            boxes.append((*xy.min(0), *xy.max(0)))
+        cls.append(int(float(r[0])))
+    return np.asarray(cls, np.int64), np.asarray(boxes, np.float32).reshape(-1, 4)
+
+def _images_in(entry: str) -> list[str]:
+    from scan import IMAGE_EXTS, list_images
+    if os.path.isdir(entry):
+        return [os.path.join(entry, r) for r in list_images(entry)]
+    if entry.endswith(".txt"):  # ultralytics image list, paths relative to the list's folder
+        with open(entry, encoding="utf-8") as f:
+            return [os.path.join(os.path.dirname(entry), l.strip()) for l in f if l.strip()]
+    return [entry] if entry.lower().endswith(IMAGE_EXTS) else []
+
+def load_yolo(source: str, split: str) -> tuple[list[dict], list[str] | None]:
+    names, entries = None, [source]
+    if source.endswith((".yaml", ".yml")):
+        import yaml
+        with open(source, encoding="utf-8") as f:
+            doc = yaml.safe_load(f)
+        root = os.path.join(os.path.dirname(os.path.abspath(source)), doc.get("path") or "")
+        if split not in doc:
+            sys.exit(f"{source} has no {split!r} split")
+        entries = [os.path.join(root, e) for e in (doc[split] if isinstance(doc[split], list) else [doc[split]])]
+        names = doc.get("names")
+        names = [names[k] for k in sorted(names)] if isinstance(names, dict) else names
+    items = []
+    for img in itertools.chain.from_iterable(map(_images_in, entries)):
+        cls, boxes = _read_yolo_labels(_label_path(img))
+        items.append({"path": img, "cls": cls, "boxes": boxes, "normalized": True})
+    return items, names
+
+def load_coco(json_path: str, images_dir: str) -> tuple[list[dict], list[str]]:
+    """COCO boxes are pixels; crowd annotations are skipped. Category ids are renumbered densely."""
+    with open(json_path, encoding="utf-8") as f:
+        doc = json.load(f)
+    cats = sorted(doc["categories"], key=lambda c: c["id"])
+    dense = {c["id"]: i for i, c in enumerate(cats)}
+    anns: dict[int, list] = {}
+    for a in doc.get("annotations", []):
+        if not a.get("iscrowd"):
+            anns.setdefault(a["image_id"], []).append(a)
+    items = []
+    for im in doc["images"]:
+        rows = anns.get(im["id"], [])
+        xywh = np.asarray([a["bbox"] for a in rows], np.float32).reshape(-1, 4)
+        items.append({"path": os.path.join(images_dir, im["file_name"]),
+                      "cls": np.asarray([dense[a["category_id"]] for a in rows], np.int64),
+                      "boxes": np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], 1), "normalized": False})
+    return items, [c["name"] for c in cats]
+
+def load_dataset(source: str, split: str = "val", images_dir: str | None = None):
+    if source.endswith(".json"):
+        return load_coco(source, images_dir or os.path.dirname(os.path.abspath(source)))
+    return load_yolo(source, split)
+
+def class_map(data_names: list[str] | None, model_names: tuple) -> dict[int, int]:
+    """Dataset class id -> model class id, by case-insensitive name; identity when the dataset has no names."""
+    if data_names is None:
+        return {i: i for i in range(len(model_names))}
+    by_name = {n.lower(): i for i, n in enumerate(model_names)}
+    return {i: by_name[n.lower()] for i, n in enumerate(data_names) if n.lower() in by_name}
+
+# ======================= Predictions =======================
+class UltralyticsChanged(RuntimeError):
+    pass
+
+
+@contextmanager
+def _internals():
+    """preprocess.forward / to_raw use ultralytics internals; say so when they moved instead of a bare traceback."""
+    try:
+        yield
+    except (TypeError, AttributeError, ImportError) as e:
+        from preprocess import ULTRALYTICS_TESTED
+        raise UltralyticsChanged(f"the evaluator reads pre-NMS output through ultralytics internals written for "
+                                 f"ultralytics=={ULTRALYTICS_TESTED} (see requirements.txt); they failed here: {e!r}") from e
+
+def _candidates(preds, floor: float, end2end: bool) -> np.ndarray:
+    """Single-image backend output reduced to rows / anchors that can pass NMS at conf >= floor."""
+    p = (preds[0] if isinstance(preds, (list, tuple)) else preds)[0]
+    if end2end:  # (N, 6) boxes already suppressed
+        return p[p[:, 4] > floor].cpu().numpy()
+    return p[:, p[4:].amax(0) > floor].cpu().numpy()
+
+class PredictionCache:
+    """Pre-NMS candidates per (image, imgsz, tta), in memory and optionally as .npz under cache_dir."""
+
+    def __init__(self, model, model_key: str, floor: float, cache_dir: str | None = None):
+        self.model, self.model_key, self.floor, self.cache_dir = model, model_key, floor, cache_dir
+        self._mem: dict[tuple, tuple] = {}
+        self.runs = self.disk_hits = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, digest: str, imgsz: int, tta: bool) -> str:
+        key = f"{digest}|{self.model_key}|{imgsz}|{tta}|{self.floor}"
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".npz")
+
+    def get(self, digest: str, bgr_fn, imgsz: int, tta: bool):
+        """(candidates, letterbox meta, image (H, W)); bgr_fn() decodes the image only when the model has to run."""
+        from preprocess import forward
+        k = (digest, imgsz, tta)
+        if k in self._mem:
+            return self._mem[k]
+        path = self._path(digest, imgsz, tta) if self.cache_dir else None
+        if path and os.path.exists(path):
+            with np.load(path) as z:
+                h, w, top, left, H, W = z["meta"].tolist()
+                cand = z["cand"]
+            cand.setflags(write=False)  # shared by every NMS run; nms() copies
+            self._mem[k] = (cand, ((h, w), (top, left)), (H, W))
+            self.disk_hits += 1
+            return self._mem[k]
+        bgr = bgr_fn()
+        with _internals():
+            preds, metas = forward(self.model, [bgr], imgsz, tta)
+            cand = _candidates(preds, self.floor, getattr(self.model.predictor.model, "end2end", False))
+        cand.setflags(write=False)
+        self._mem[k] = (cand, metas[0], bgr.shape[:2])
+        self.runs += 1
+        if path:
+            (h, w), (top, left) = metas[0]
+            with open(f"{path}.tmp", "wb") as f:
+                np.savez(f, cand=cand, meta=np.array([h, w, top, left, *bgr.shape[:2]]))
+            os.replace(f"{path}.tmp", path)
+        return self._mem[k]
+
+@_internals()
+def nms(model, cand: np.ndarray, meta, shape, conf: float, iou: float):
+    """NMS on a copy: some ultralytics versions convert the boxes to xyxy inside the tensor they are given."""
+    import torch
+    from preprocess import to_raw
+    return to_raw(model, torch.from_numpy(cand.copy())[None], [meta], [shape], conf, iou)[0]
+
+# ======================= Matching and metrics =======================
+def match(boxes, scores, cls, gt_boxes, gt_cls) -> np.ndarray:
+    """(N, len(IOU_THRESHOLDS)) true-positive flags: per class, each detection in score order takes the
+    unmatched ground truth box it overlaps most, if that IoU reaches the threshold."""
+    tp = np.zeros((len(scores), len(IOU_THRESHOLDS)), bool)
+    for c in np.unique(cls):
+        g = np.flatnonzero(gt_cls == c)
+        if not len(g):
+            continue
+        d = np.flatnonzero(cls == c)
+        d = d[np.argsort(-scores[d], kind="stable")]
+        ious = iou_matrix(boxes[d], gt_boxes[g])
+        for ti, t in enumerate(IOU_THRESHOLDS):
+            used = np.zeros(len(g), bool)
+            for k in np.flatnonzero(ious.max(1) >= t):
+                row = np.where(used, -1.0, ious[k])
+                j = int(row.argmax())
+                if row[j] >= t:
+                    used[j] = True
+                    tp[d[k], ti] = True
+    return tp
+
+def _ap(tp: np.ndarray, n_gt: int) -> np.ndarray:
+    """COCO 101-point AP per IoU threshold for score-ordered true-positive flags (N, T)."""
+    if not len(tp):
+        return np.zeros(tp.shape[1])
+    ctp = np.cumsum(tp, 0)
+    rec = ctp / n_gt
+    prec = ctp / np.arange(1, len(tp) + 1)[:, None]
+    env = np.flip(np.maximum.accumulate(np.flip(prec, 0), 0), 0)
+    out = np.empty(tp.shape[1])
+    for t in range(tp.shape[1]):
+        idx = np.searchsorted(rec[:, t], RECALL_POINTS, side="left")
+        out[t] = np.where(idx < len(tp), env[np.minimum(idx, len(tp) - 1), t], 0.0).mean()
+    return out
+
+class Group:
+    """All detections for one (imgsz, tta, iou, min_area) over the dataset, sorted by score, with TP flags."""
+
+    def __init__(self, scores, cls, tp, n_gt: np.ndarray):
+        order = np.argsort(-scores, kind="stable")
+        self.scores, self.cls, self.tp, self.n_gt = scores[order], cls[order], tp[order], n_gt
+
+    def score(self, thr: np.ndarray) -> dict:
+        """{class id: ap50, ap (50-95), precision, recall} at per-class score floors thr, for classes with labels."""
+        keep = self.scores >= thr[self.cls]
+        out = {}
+        for c in np.flatnonzero(self.n_gt).tolist():
+            tp = self.tp[keep & (self.cls == c)]
+            n = len(tp)
+            hits = int(tp[:, 0].sum()) if n else 0
+            ap = _ap(tp, self.n_gt[c])
+            out[c] = {"ap50": float(ap[0]), "ap": float(ap.mean()),
+                      "precision": hits / n if n else 0.0,
+                      "recall": float(hits / self.n_gt[c])}
+        return out
+
+def _summary(per_class: dict) -> dict:
+    mean = lambda k: float(np.mean([m[k] for m in per_class.values()])) if per_class else float("nan")
+    p, r = mean("precision"), mean("recall")
+    return {"map50": mean("ap50"), "map": mean("ap"), "precision": p, "recall": r,
+            "f1": 2 * p * r / (p + r) if p + r > 0 else 0.0}
+
+def pareto_front(rows: list[dict], objective: str) -> list[dict]:
+    """Rows that no faster (or equally fast) row beats on the objective, fastest first."""
+    front, best = [], -np.inf
+    for r in sorted(rows, key=lambda r: (r["latency_ms"], -np.nan_to_num(r[objective], nan=-1))):
+        if np.nan_to_num(r[objective], nan=-1) > best:
+            front.append(r)
+            best = np.nan_to_num(r[objective], nan=-1)
+    return front
+
+# ======================= Sweep =======================
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _timed(fn) -> float:
+    t = time.perf_counter(); fn(); return (time.perf_counter() - t) * 1e3
+
+@_internals()
+def measure_latency(model, bgrs: list, sizes, ttas, ious, floor: float) -> dict[tuple, float]:
+    """{(imgsz, tta, iou): median ms per image} for preprocess + inference + NMS, after one warm-up."""
+    from preprocess import forward, to_raw
+    out = {}
+    for sz, tta in itertools.product(sizes, ttas):
+        forward(model, bgrs[:1], sz, tta)
+        fwd, post = [], {iou: [] for iou in ious}
+        for bgr in bgrs:
+            res = {}
+            fwd.append(_timed(lambda: res.update(out=forward(model, [bgr], sz, tta))))
+            preds, metas = res["out"]
+            for iou in ious:
+                post[iou].append(_timed(lambda: to_raw(model, preds, metas, [bgr.shape], floor, iou)))
+        for iou in ious:
+            out[(sz, tta, iou)] = statistics.median(fwd) + statistics.median(post[iou])
+    return out
+
+def sweep(model, model_key: str, items: list[dict], data_names, sizes, ttas, confs, ious, class_mins, min_areas,
+          timing_images: int = 8, cache_dir: str | None = None, log=print,
+          cache: "PredictionCache | None" = None) -> list[dict]:
+    names = names_list(model.names, CLASS_NAMES)
+    cmap = class_map(data_names, names)
+    floor = min(confs)
+    cache = cache or PredictionCache(model, model_key, floor, cache_dir)
+    t0 = time.perf_counter()
+
+    images = []  # (digest, shape, gt boxes in pixels, gt model class ids)
+    for n, it in enumerate(items, 1):
+        data = _read(it["path"])
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        decoded = {}
+        def bgr_fn():
+            if "bgr" not in decoded:
+                decoded["bgr"] = decode_bgr(data)
+            return decoded["bgr"]
+        for sz, tta in itertools.product(sizes, ttas):
+            shape = cache.get(digest, bgr_fn, sz, tta)[2]
+        keep = np.array([c in cmap for c in it["cls"].tolist()], bool)
+        gt = it["boxes"][keep] * (np.array([shape[1], shape[0]] * 2, np.float32) if it["normalized"] else 1)
+        images.append((digest, shape, gt, np.array([cmap[c] for c in it["cls"][keep].tolist()], np.int64)))
+        if n % 50 == 0 or n == len(items):
+            log(f"predicted {n}/{len(items)} images ({cache.runs} model runs, {cache.disk_hits} from disk, "
+                f"{time.perf_counter() - t0:.0f} s)")
+
+    timing = [decode_bgr(_read(it["path"])) for it in items[:timing_images]]
+    latency = measure_latency(model, timing, sizes, ttas, ious, floor) if timing else {}
+    n_gt = np.bincount(np.concatenate([g[3] for g in images]) if images else np.zeros(0, np.int64),
+                       minlength=len(names))[:len(names)]
+
+    rows = []
+    for sz, tta, iou in itertools.product(sizes, ttas, ious):
+        raws = [nms(model, *cache.get(d, None, sz, tta), floor, iou) for d, _, _, _ in images]
+        for area in min_areas:
+            scores, cls, tps = [], [], []
+            for raw, (_, shape, gt, gt_cls) in zip(raws, images):
+                wh = np.clip(raw.boxes[:, 2:] - raw.boxes[:, :2], 0, None)
+                sel = wh[:, 0] * wh[:, 1] >= area / 100 * shape[0] * shape[1]
+                b, s, c = raw.boxes[sel], raw.scores[sel], raw.class_ids[sel]
+                scores.append(s); cls.append(c); tps.append(match(b, s, c, gt, gt_cls))
+            group = Group(np.concatenate(scores), np.concatenate(cls), np.concatenate(tps), n_gt)
+            for conf, mins in itertools.product(confs, class_mins):
+                per_class = group.score(threshold_vector(names, per_class_thresholds(*mins), conf))
+                cfg = {"imgsz": sz, "tta": tta, "iou": iou, "conf": conf, **dict(zip(_MINS, mins)),
+                       "min_area_pct": area}
+                preset = next((k for k, p in PRESETS.items()
+                               if all(np.isclose(p[f], cfg[f]) for f in ("conf", "iou", *_MINS, "min_area_pct"))
+                               and p["tta"] == tta), "")
+                row = {**cfg, "preset": preset, "latency_ms": round(latency.get((sz, tta, iou), np.nan), 2),
+                       **_summary(per_class)}
+                for c, m in per_class.items():
+                    row.update({f"{names[c]} {k}": v for k, v in m.items()})
+                rows.append(row)
+        log(f"scored imgsz={sz} tta={tta} iou={iou}")
+    return rows
+
+def compare_rows(a: list[dict], b: list[dict]) -> list[str]:
+    """Combinations whose metrics differ between two sweeps of the same grid (latency ignored)."""
+    cfg = ("imgsz", "tta", "iou", "conf", *_MINS, "min_area_pct")
+    by_cfg = {tuple(r[k] for k in cfg): r for r in b}
+    out = []
+    for r in a:
+        other = by_cfg.get(tuple(r[k] for k in cfg))
+        same = other is not None and all(
+            k == "latency_ms" or v == other.get(k) or (isinstance(v, float) and np.isnan(v) and np.isnan(other.get(k)))
+            for k, v in r.items())
+        if not same:
+            out.append(", ".join(f"{k}={r[k]}" for k in cfg))
+    return out
+
+def _fmt(r: dict, objective: str) -> str:
+    mins = "/".join(f"{r[k]:g}" for k in _MINS)
+    return (f"{r['latency_ms']:8.1f} {r[objective]:8.3f} {r['map50']:7.3f} {r['precision']:6.3f} {r['recall']:6.3f}  "
+            f"imgsz={r['imgsz']} tta={'on' if r['tta'] else 'off'} conf={r['conf']:g} iou={r['iou']:g} "
+            f"mins={mins} area={r['min_area_pct']}" + (f"  [{r['preset']}]" if r["preset"] else ""))
+
+def main(argv=None):
+    import pandas as pd
+    from model_store import DEFAULT_IMGSZ, cache_key_for, ensure_model_path, get_model
+    from preprocess import ULTRALYTICS_TESTED, _tested_ultralytics
+    p = {k: _uniq(v[k] for v in PRESETS.values()) for k in ("conf", "iou", "min_area_pct")}
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--data", required=True, help="data.yaml, image folder with YOLO labels, or COCO .json")
+    ap.add_argument("--images", help="Image folder for a COCO .json (default: the .json's folder)")
+    ap.add_argument("--split", default="val", help="data.yaml split")
+    ap.add_argument("--limit", type=int, default=0, help="Evaluate only the first N images")
+    ap.add_argument("--model", help="Checkpoint (default: the app's MODEL_URL / LOCAL_MODEL)")
+    ap.add_argument("--imgsz", type=int, nargs="+", default=IMGSZ_OPTIONS)
+    ap.add_argument("--tta", choices=["off", "on", "both"], default="both")
+    ap.add_argument("--conf", type=float, nargs="+", default=p["conf"])
+    ap.add_argument("--iou", type=float, nargs="+", default=p["iou"])
+    ap.add_argument("--class-min", nargs="+", metavar="BOTTLE,CAN,CAP",
+                    help="Per-class minimum triples (default: each preset's)")
+    ap.add_argument("--min-area", type=float, nargs="+", default=p["min_area_pct"])
+    ap.add_argument("--objective", choices=OBJECTIVES, default="map50")
+    ap.add_argument("--timing-images", type=int, default=8)
+    ap.add_argument("--cache-dir", help="Keep pre-NMS predictions here across runs")
+    ap.add_argument("--check", action="store_true",
+                    help="Re-score with the IoU values in reverse order and fail unless every metric is identical")
+    ap.add_argument("--out", default="eval", help="Folder for results.csv and pareto.csv")
+    args = ap.parse_args(argv)
+
+    class_mins = ([tuple(float(v) for v in s.split(",")) for s in args.class_min] if args.class_min
+                  else _uniq(tuple(v[k] for k in _MINS) for v in PRESETS.values()))
+    if any(len(m) != len(_MINS) for m in class_mins):
+        sys.exit("--class-min takes BOTTLE,CAN,CAP triples")
+    items, data_names = load_dataset(args.data, args.split, args.images)
+    items = items[:args.limit] if args.limit else items
+    if not items:
+        sys.exit(f"no images found for {args.data}")
+    path = args.model or ensure_model_path()
+    model = get_model(path, cache_key_for(path))
+    ttas = {"off": [False], "on": [True], "both": [False, True]}[args.tta]
+    log = lambda msg: print(msg, file=sys.stderr)
+    n_cfg = len(args.imgsz) * len(ttas) * len(args.iou) * len(args.conf) * len(class_mins) * len(args.min_area)
+    log(f"{len(items)} images, {n_cfg} combinations")
+    if not _tested_ultralytics():
+        log(f"warning: ultralytics is not the tested {ULTRALYTICS_TESTED}; pre-NMS extraction may not match it")
+    cache = PredictionCache(model, cache_key_for(path), min(args.conf), args.cache_dir)
+    grid = (sorted(args.imgsz), ttas, _uniq(args.conf), _uniq(args.iou), class_mins, _uniq(args.min_area))
+    try:
+        rows = sweep(model, cache.model_key, items, data_names, *grid, args.timing_images, log=log, cache=cache)
+        again = None
+        if args.check:  # same predictions, IoU values scored in reverse order: must not change a single metric
+            sizes, ttas, confs, ious, mins, areas = grid
+            again = sweep(model, cache.model_key, items, data_names, sizes, ttas, confs, ious[::-1], mins, areas, 0,
+                          log=log, cache=cache)
+    except UltralyticsChanged as e:
+        sys.exit(f"evaluate.py: {e}")
+    if again is not None:
+        diffs = compare_rows(rows, again)
+        if diffs:
+            sys.exit(f"--check: {len(diffs)} combinations differ with the IoU order reversed, e.g. {diffs[0]}")
+        log(f"--check: {len(rows)} combinations identical with the IoU order reversed")
+
+    front = pareto_front(rows, args.objective)
+    os.makedirs(args.out, exist_ok=True)
+    pd.DataFrame(rows).to_csv(os.path.join(args.out, "results.csv"), index=False)
+    pd.DataFrame(front).to_csv(os.path.join(args.out, "pareto.csv"), index=False)
+    print(f"Pareto front ({args.objective} vs latency), {len(front)} of {len(rows)} combinations:")
+    print(f"{'ms/img':>8} {args.objective:>8} {'mAP50':>7} {'P':>6} {'R':>6}")
+    for r in front:
+        print(_fmt(r, args.objective))
+    preset_rows = [r for r in rows if r["preset"] and r["imgsz"] == DEFAULT_IMGSZ]
+    if preset_rows:
+        print(f"\nPresets at imgsz {DEFAULT_IMGSZ}:")
+    for r in preset_rows:
+        better = max((f for f in front if f["latency_ms"] <= r["latency_ms"]),
+                     key=lambda f: np.nan_to_num(f[args.objective], nan=-1), default=None)
+        print(_fmt(r, args.objective))
+        if better is not None and better is not r and better[args.objective] > r[args.objective]:
+            print("   beaten by " + _fmt(better, args.objective).lstrip())
+    print(f"\nwrote {args.out}/results.csv and {args.out}/pareto.csv")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compile a guidance entry (cities.city_guide(city)[label]) into one HTML fragment for a single st.markdown call."""
+from html import escape
+
+COUNT_SLOT = "__DETECTED_COUNT__"
+
+
+def _attr(v: str) -> str:
+    return escape(str(v), quote=True)
+
+def _text(v: str) -> str:
+    return escape(str(v), quote=False)
+
+def _link(url: str, label: str) -> str:
+    return f'<a class="eco-link" href="{_attr(url)}" target="_blank" rel="noopener">{_text(label)}</a>'
+
+def _list(items) -> str:
+    return '<ul class="eco-list">' + "".join(f"<li>{_text(i)}</li>" for i in items) + "</ul>"
+
+def _text_block(info: dict) -> str:
+    out = []
+    if info.get("materials"):
+        out.append(f'<div class="eco-meta"><strong>Material:</strong> {_text(info["materials"])}</div>')
+    if info.get("why_separate"):
+        out.append('<div class="eco-section-title">Why separate?</div>' + _list(info["why_separate"]))
+    out.append('<div class="eco-section-title">How to put out</div>' + _list(info.get("steps", [])))
+    if info.get("recycles_to"):
+        chips = "".join(f'<div class="chip">{_text(i)}</div>' for i in info["recycles_to"])
+        out.append(f'<div class="eco-section-title">Commonly recycled into</div><div class="chip-row">{chips}</div>')
+    facts = info.get("facts", [])
+    if facts:
+        out.append('<div class="eco-section-title">Did you know?</div>' + _list(f["text"] for f in facts))
+        out.append('<div class="eco-links">' + "".join(_link(f["url"], "Learn more") for f in facts) + "</div>")
+    return "".join(out)
+
+def _media_block(images: list) -> str:
+    cls = "eco-media grid" if len(images) > 3 else "eco-media"
+    return f'<div class="{cls}">' + "".join(f'<img src="{_attr(u)}" alt="" loading="lazy">' for u in images) + "</div>"
+
+def compile_card(info: dict) -> str:
+    """Whole card as one fragment; the detected count is left as COUNT_SLOT for render_card."""
+    head = (
+        '<div class="eco-head">'
+        f'<div class="eco-emoji">{_text(info.get("emoji", ""))}</div>'
+        f'<div class="eco-title">{_text(info["title"])}</div>'
+        f'<div class="eco-badge">Detected: {COUNT_SLOT}</div>'
+        "</div>"
+    )
+    icons = ""
+    if info.get("icons"):
+        icons = '<div class="eco-icons">' + "".join(
+            f'<img src="{_attr(u)}" alt="" width="48" height="48" loading="lazy">' for u in info["icons"]) + "</div>"
+    imgs = info.get("images") or []
+    body = (f'<div class="eco-body">{_media_block(imgs)}<div class="eco-text">{_text_block(info)}</div></div>'
+            if imgs else f'<div class="eco-text">{_text_block(info)}</div>')
+    links = '<div class="eco-links">'
+    if info.get("poster"):
+        links += _link(info["poster"], "Open local poster")
+    links += _link(info["link"], "Official local guidance (site)") + "</div>"
+    # No newlines or indentation: st.markdown would otherwise treat parts of the block as markdown
+    return f'<div class="eco-card">{head}{icons}{body}{links}</div>'
+
+def render_card(compiled: str, count: int) -> str:
+    return compiled.replace(COUNT_SLOT, str(int(count)), 1)
@@ -0,0 +1,72 @@
+"""Upload bytes -> contiguous BGR in one decode, with EXIF orientation and reduced-size JPEG decoding."""
+import io
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# cv2.IMREAD_REDUCED_COLOR_{2,4,8}: the JPEG decoder skips DCT detail instead of resizing afterwards
+_REDUCED_FLAGS = {1: 1, 2: 17, 4: 33, 8: 65}
+
+
+def _as_buffer(data) -> np.ndarray:
+    if hasattr(data, "getbuffer"):  # BytesIO / Streamlit UploadedFile: no copy
+        data = data.getbuffer()
+    return np.frombuffer(data, dtype=np.uint8)
+
+def image_size(data) -> tuple[int, int]:
+    """(W, H) from the header only, before EXIF rotation."""
+    with Image.open(io.BytesIO(_as_buffer(data))) as im:
+        return im.size
+
+def reduce_factor(long_side: int, target: int | None) -> int:
+    """Largest JPEG scale denominator that keeps the long side >= target."""
+    if not target:
+        return 1
+    f = 1
+    for cand in (2, 4, 8):
+        if long_side // cand >= target:
+            f = cand
+    return f
+
+def decode_bgr(data, target: int | None = None) -> np.ndarray:
+    """Decode an encoded image to a C-contiguous uint8 BGR array.
+
+    With target set, JPEGs are decoded at 1/2, 1/4 or 1/8 scale as long as the long side
+    stays >= target (the model letterboxes to imgsz anyway). EXIF orientation is applied.
+    """
+    buf = _as_buffer(data)
+    try:
+        import cv2
+        f = reduce_factor(max(image_size(buf)), target) if target else 1
+        bgr = cv2.imdecode(buf, _REDUCED_FLAGS[f])
+        if bgr is not None:
+            return bgr
+    except ImportError:
+        pass
+    return _decode_pil(buf, target)
+
+def _decode_pil(buf: np.ndarray, target: int | None) -> np.ndarray:
+    im = Image.open(io.BytesIO(buf))
+    if target and im.format == "JPEG":
+        im.draft("RGB", (target, target))
+    im = ImageOps.exif_transpose(im).convert("RGB")
+    arr = np.asarray(im)
+    out = np.empty_like(arr)
+    out[..., 0], out[..., 1], out[..., 2] = arr[..., 2], arr[..., 1], arr[..., 0]
+    return out
+
+def pil_to_bgr(pil_img: Image.Image) -> np.ndarray:
+    # Legacy PIL path (negative-stride view); kept for callers that already hold a PIL image
+    arr = np.array(pil_img.convert("RGB"))
+    return arr[:, :, ::-1]
+
+def encode_jpeg(bgr: np.ndarray, quality: int = 85, max_side: int | None = None) -> bytes:
+    import cv2
+    if max_side and max(bgr.shape[:2]) > max_side:
+        s = max_side / max(bgr.shape[:2])
+        bgr = cv2.resize(bgr, (max(1, round(bgr.shape[1] * s)), max(1, round(bgr.shape[0] * s))),
+                         interpolation=cv2.INTER_AREA)
+    ok, enc = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("JPEG encode failed")
+    return enc.tobytes()
@@ -0,0 +1,211 @@
+"""Content-addressed cache of raw predictions keyed by image hash, predict args and model fingerprint."""
+import hashlib
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from detection import RawPrediction, raw_prediction
+from preprocess import FAST_PREPROCESS, predict_raw
+from timing import record_speed
+
+_FAST_KWARGS = {"imgsz", "conf", "iou", "augment"}
+_fast_ok = FAST_PREPROCESS  # cleared after the first failure of the fast path
+
+
+def image_digest(bgr: np.ndarray) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((bgr.shape, str(bgr.dtype))).encode())
+    h.update(memoryview(np.ascontiguousarray(bgr)).cast("B"))
+    return h.hexdigest()
+
+def cache_key(digest: str, model_key: str, **predict_kwargs) -> str:
+    params = json.dumps(predict_kwargs, sort_keys=True, default=str)
+    return hashlib.sha256(f"{digest}|{model_key}|{params}".encode()).hexdigest()
+
+
+PRUNE_EVERY = 256   # disk writes between directory rescans (other processes share the directory)
+
+
+class InferenceCache:
+    """Thread-safe LRU bounded by entry count and bytes, with an optional .npz tier on disk."""
+
+    def __init__(self, max_items: int = 256, max_bytes: int = 64 << 20,
+                 disk_dir: str | None = None, disk_max_bytes: int = 512 << 20):
+        self.max_items, self.max_bytes = max_items, max_bytes
+        self.disk_dir, self.disk_max_bytes = disk_dir, disk_max_bytes
+        self._mem: OrderedDict[str, RawPrediction] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_bytes, self._disk_writes = None, 0   # running estimate; None until the first scan
+        self.hits = self.misses = self.disk_hits = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+    def get(self, key: str) -> RawPrediction | None:
+        with self._lock:
+            raw = self._mem.get(key)
+            if raw is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return raw
+        raw = self._disk_get(key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._mem_put(key, raw)
+        return raw
+
+    def put(self, key: str, raw: RawPrediction):
+        self._mem_put(key, raw)
+        self._disk_put(key, raw)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear(); self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"items": len(self._mem), "bytes": self._bytes, "hits": self.hits,
+                "disk_hits": self.disk_hits, "misses": self.misses}
+
+    # ---- memory tier ----
+    def _mem_put(self, key: str, raw: RawPrediction):
+        size = raw.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._mem[key] = raw
+            self._bytes += size
+            while self._mem and (len(self._mem) > self.max_items or self._bytes > self.max_bytes):
+                _, ev = self._mem.popitem(last=False)
+                self._bytes -= ev.nbytes
+
+    # ---- disk tier ----
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def _disk_get(self, key: str) -> RawPrediction | None:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                names = json.loads(str(z["names"]))
+                raw = RawPrediction(
+                    z["boxes"], z["scores"], z["class_ids"],
+                    {int(k): v for k, v in names.items()} if names is not None else None,
+                    tuple(int(v) for v in z["shape"]),
+                )
+            os.utime(path)  # keeps disk pruning LRU-ish
+            return raw
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, raw: RawPrediction):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, boxes=raw.boxes, scores=raw.scores, class_ids=raw.class_ids,
+                         names=np.array(json.dumps(raw.names_map)), shape=np.array(raw.shape))
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except OSError:
+            try: os.remove(tmp)
+            except OSError: pass
+            return
+        with self._lock:
+            self._disk_writes += 1
+            rescan = self._disk_bytes is None or self._disk_writes % PRUNE_EVERY == 0
+            if not rescan:
+                self._disk_bytes += size
+                rescan = self._disk_bytes > self.disk_max_bytes
+        if rescan:
+            self._disk_prune()
+
+    def _disk_prune(self):
+        """One directory scan: resync the byte total and, over the cap, drop the oldest files down to 90% of it."""
+        stats = []
+        try:
+            for e in os.scandir(self.disk_dir):
+                if e.name.endswith(".npz"):
+                    try:
+                        st = e.stat()
+                    except OSError:  # removed meanwhile by another process
+                        continue
+                    stats.append((st.st_mtime, st.st_size, e.path))
+        except OSError:
+            return
+        total = sum(s for _, s, _ in stats)
+        if total > self.disk_max_bytes:
+            for _, size, path in sorted(stats):
+                if total <= 0.9 * self.disk_max_bytes:
+                    break
+                try: os.remove(path)
+                except FileNotFoundError: pass
+                except OSError: continue
+                total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+
+def predict_raws(model, bgrs: list, **predict_kwargs) -> list[RawPrediction]:
+    """Uncached predictions; through preprocess.predict_raw when FAST_PREPROCESS and only plain args are given."""
+    global _fast_ok
+    if _fast_ok and set(predict_kwargs) <= _FAST_KWARGS and (hasattr(model, "predict_raw") or hasattr(model, "predictor")):
+        try:
+            if hasattr(model, "predict_raw"):  # PooledModel
+                return model.predict_raw(bgrs, **predict_kwargs)
+            return predict_raw(model, bgrs, **predict_kwargs)  # ultralytics YOLO
+        except (TypeError, AttributeError, ImportError) as e:  # ultralytics internals changed under us
+            _fast_ok = False
+            warnings.warn(f"FAST_PREPROCESS disabled, falling back to model.predict: {e!r}", RuntimeWarning)
+    out = []
+    for bgr, pred in zip(bgrs, model.predict(bgrs, verbose=False, **predict_kwargs)):
+        record_speed(getattr(pred, "speed", None))
+        out.append(raw_prediction(pred, model, bgr.shape))
+    return out
+
+def cached_compute(cache: InferenceCache | None, model_key: str, bgr: np.ndarray, compute,
+                   **params) -> RawPrediction:
+    """compute() -> RawPrediction, memoized under the image digest, model key and params."""
+    if cache is None:
+        return compute()
+    key = cache_key(image_digest(bgr), model_key, **params)
+    raw = cache.get(key)
+    if raw is None:
+        raw = compute()
+        cache.put(key, raw)
+    return raw
+
+def cached_predict(cache: InferenceCache | None, model, model_key: str, bgr: np.ndarray,
+                   **predict_kwargs) -> RawPrediction:
+    """Prediction for one image, served from cache when the same image and args were seen before."""
+    return cached_compute(cache, model_key, bgr, lambda: predict_raws(model, [bgr], **predict_kwargs)[0],
+                          **predict_kwargs)
+
+def cached_predict_many(cache: InferenceCache | None, model, model_key: str, bgrs: list,
+                        **predict_kwargs) -> list[RawPrediction]:
+    """Batched variant: only cache misses go through one predict_raws call."""
+    keys = [cache_key(image_digest(b), model_key, **predict_kwargs) for b in bgrs] if cache is not None else [None] * len(bgrs)
+    out = [cache.get(k) if cache is not None else None for k in keys]
+    miss = [i for i, r in enumerate(out) if r is None]
+    if miss:
+        for i, raw in zip(miss, predict_raws(model, [bgrs[i] for i in miss], **predict_kwargs)):
+            out[i] = raw
+            if cache is not None:
+                cache.put(keys[i], out[i])
+    return out
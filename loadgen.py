@@ -0,0 +1,105 @@
+"""Load generator for api.py: concurrent clients POST images and report throughput and latency percentiles.
+
+    python loadgen.py --url http://localhost:8502 --images samples/ --concurrency 16 --duration 30
+    python loadgen.py --concurrency 1 4 16 32 --duration 15 --json load.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+
+def _payloads(folder: str | None, limit: int) -> list[bytes]:
+    if folder:
+        paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(folder, f"*.{ext}")))[:limit]
+        if paths:
+            out = []
+            for p in paths:
+                with open(p, "rb") as f:
+                    out.append(f.read())
+            return out
+    # Random JPEGs stand in for real photos
+    import numpy as np
+    from image_io import encode_jpeg
+    rng = np.random.default_rng(0)
+    return [encode_jpeg(rng.integers(0, 255, (960, 1280, 3), dtype=np.uint8), 85) for _ in range(limit)]
+
+def _pct(sorted_vals: list[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * q))] if sorted_vals else 0.0
+
+def run(url: str, payloads: list[bytes], concurrency: int, duration: float, query: dict, timeout: float) -> dict:
+    endpoint = f"{url.rstrip('/')}/detect" + (f"?{urlencode(query)}" if query else "")
+    lat, codes, batch_sizes = [], {}, []
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def client(i: int):
+        n = i
+        while time.perf_counter() < stop:
+            body = payloads[n % len(payloads)]
+            n += concurrency
+            req = urllib.request.Request(endpoint, data=body, headers={"Content-Type": "application/octet-stream"})
+            t = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as resp:
+                    code, out = resp.status, json.loads(resp.read())
+            except urllib.error.HTTPError as e:
+                code, out = e.code, None
+                if code == 503:
+                    time.sleep(float(e.headers.get("Retry-After") or 1))
+            except (urllib.error.URLError, TimeoutError):
+                code, out = "error", None
+            dt = time.perf_counter() - t
+            with lock:
+                codes[code] = codes.get(code, 0) + 1
+                if code == 200:
+                    lat.append(dt)
+                    batch_sizes.append(out["batch_size"])
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    ms = lambda v: round(v * 1e3, 1)
+    return {"concurrency": concurrency, "requests": sum(codes.values()), "ok": len(lat),
+            "codes": {str(k): v for k, v in codes.items()}, "rps": round(len(lat) / elapsed, 2),
+            "p50_ms": ms(_pct(lat, .50)), "p90_ms": ms(_pct(lat, .90)), "p99_ms": ms(_pct(lat, .99)),
+            "max_ms": ms(lat[-1]) if lat else 0.0,
+            "mean_batch": round(statistics.mean(batch_sizes), 2) if batch_sizes else 0.0}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default="http://localhost:8502")
+    ap.add_argument("--images", help="Folder of jpg/png files (default: random 1280x960 JPEGs)")
+    ap.add_argument("--limit", type=int, default=32, help="Distinct images to cycle through")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[8])
+    ap.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    ap.add_argument("--preset")
+    ap.add_argument("--imgsz", type=int)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--json", help="Also write the results here")
+    args = ap.parse_args(argv)
+    query = {k: v for k, v in (("preset", args.preset), ("imgsz", args.imgsz)) if v}
+    payloads = _payloads(args.images, args.limit)
+    results = []
+    print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'batch':>6}  codes")
+    for c in args.concurrency:
+        r = run(args.url, payloads, c, args.duration, query, args.timeout)
+        results.append(r)
+        print(f"{c:5d} {r['rps']:8.2f} {r['p50_ms']:9.1f} {r['p90_ms']:9.1f} {r['p99_ms']:9.1f} {r['mean_batch']:6.2f}  {r['codes']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
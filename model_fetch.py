@@ -0,0 +1,212 @@
+"""Checkpoint download that is safe to run from several workers at once.
+
+The file is streamed in 1 MiB chunks to `<dest>.part` and resumed with an HTTP Range request after an
+interruption. The response's ETag (or Last-Modified) is kept in `<dest>.part.validator` and sent back as
+If-Range, so a file that changed on the server comes back whole (200) and the download restarts from zero;
+a part file without a validator is never resumed.
+
+An optional SHA-256 is verified before an atomic rename to `<dest>`. An exclusive lock on `<dest>.lock`
+lets exactly one process download while the others wait and then reuse the result. A `<dest>.ok` sidecar
+records the size and hash of the completed file, so a truncated file left by an older download is never
+trusted.
+
+    python model_fetch.py https://host/best.pt /tmp/models/best.pt --sha256 <hex>
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+CHUNK = 1 << 20
+RETRIES = 4
+
+
+class FetchError(RuntimeError):
+    pass
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock across processes (blocking); a no-op where fcntl is unavailable."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as f:
+        try:
+            import fcntl
+        except ImportError:  # Windows: single-process deployments only
+            yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def sha256_file(path: str, chunk: int = CHUNK) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(chunk):
+            h.update(block)
+    return h.hexdigest()
+
+def _sidecar(dest: str) -> str:
+    return f"{dest}.ok"
+
+def is_complete(dest: str, sha256: str | None = None) -> bool:
+    """dest exists, matches the size recorded when it was completed and, if given, the pinned hash."""
+    try:
+        with open(_sidecar(dest), encoding="utf-8") as f:
+            meta = json.load(f)
+        if os.path.getsize(dest) != meta["size"]:
+            return False
+    except (OSError, ValueError, KeyError):
+        return False
+    return not sha256 or meta.get("sha256") == sha256.lower()
+
+def _mark_complete(dest: str, digest: str):
+    tmp = f"{_sidecar(dest)}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"size": os.path.getsize(dest), "sha256": digest, "time": time.time()}, f)
+    os.replace(tmp, _sidecar(dest))
+
+def _validator(headers) -> str | None:
+    """Strong ETag, else Last-Modified: the values If-Range accepts."""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+def _read_validator(part: str) -> str | None:
+    try:
+        with open(f"{part}.validator", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _write_validator(part: str, validator: str | None):
+    path = f"{part}.validator"
+    if validator:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(validator)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _discard(part: str):
+    for path in (part, f"{part}.validator"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _open(url: str, start: int, timeout: float, validator: str | None = None):
+    """(status, total size or None, validator, chunk iterator, close) for a GET from byte `start`."""
+    # identity: byte offsets for Range must refer to the file, not a gzip stream
+    headers = {"Accept-Encoding": "identity"}
+    if start:  # If-Range: the server sends the whole file (200) instead if it changed since
+        headers.update({"Range": f"bytes={start}-", "If-Range": validator})
+    try:
+        import requests
+    except ImportError:
+        import urllib.error
+        import urllib.request
+        try:
+            resp = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 416:
+                return 416, None, None, iter(()), lambda: None
+            if e.code < 500:
+                raise FetchError(f"{url}: HTTP {e.code}") from e
+            raise
+        length = resp.headers.get("Content-Length")
+        return (resp.status, int(length) if length else None, _validator(resp.headers),
+                iter(lambda: resp.read(CHUNK), b""), resp.close)
+    r = requests.get(url, headers=headers, stream=True, timeout=timeout)
+    if r.status_code == 416:
+        r.close()
+        return 416, None, None, iter(()), lambda: None
+    if 400 <= r.status_code < 500:  # retrying won't help
+        r.close()
+        raise FetchError(f"{url}: HTTP {r.status_code}")
+    r.raise_for_status()
+    length = r.headers.get("Content-Length")
+    return (r.status_code, int(length) if length else None, _validator(r.headers),
+            r.iter_content(chunk_size=CHUNK), r.close)
+
+def _download(url: str, part: str, timeout: float) -> str:
+    """Fill `part` (resuming what is there) and return its SHA-256."""
+    h = hashlib.sha256()
+    validator = _read_validator(part)
+    start = os.path.getsize(part) if validator and os.path.exists(part) else 0
+    status, length, new_validator, chunks, close = _open(url, start, timeout, validator)
+    try:
+        if status == 416:  # nothing left to send: the part file is already whole
+            if not start:
+                raise FetchError(f"{url}: server answered 416 for a full download")
+            return sha256_file(part)
+        if status != 206:  # Range ignored, or If-Range failed because the file changed: start over
+            start = 0
+            _write_validator(part, new_validator)
+        expected = start + length if length is not None else None
+        with open(part, "r+b" if start else "wb") as f:
+            if start:
+                while block := f.read(CHUNK):
+                    h.update(block)
+                f.seek(start)
+                f.truncate()
+            for block in chunks:
+                if block:
+                    f.write(block)
+                    h.update(block)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+    finally:
+        close()
+    if expected is not None and size != expected:
+        raise ConnectionError(f"{url}: got {size} of {expected} bytes")  # retried, resuming from `size`
+    return h.hexdigest()
+
+def fetch(url: str, dest: str, sha256: str | None = None, timeout: float = 60, retries: int = RETRIES,
+          progress=None) -> str:
+    """Download url to dest once across processes; returns dest. Raises FetchError on failure or hash mismatch."""
+    sha256 = sha256.lower() if sha256 else None
+    if is_complete(dest, sha256):
+        return dest
+    part = f"{dest}.part"
+    with file_lock(f"{dest}.lock"):
+        if is_complete(dest, sha256):  # another worker finished while we waited
+            return dest
+        last = None
+        for attempt in range(retries):
+            try:
+                digest = _download(url, part, timeout)
+            except FetchError:
+                raise
+            except Exception as e:  # connection drops: keep the part file and resume
+                last = e
+                if attempt + 1 < retries:
+                    if progress:
+                        progress(f"retrying after {e}")
+                    time.sleep(min(8, 2 ** attempt))
+                continue
+            if sha256 and digest != sha256:
+                _discard(part)
+                raise FetchError(f"{url}: SHA-256 mismatch (expected {sha256}, got {digest})")
+            os.replace(part, dest)
+            _write_validator(part, None)
+            _mark_complete(dest, digest)
+            return dest
+        raise FetchError(f"{url}: download failed after {retries} attempts: {last}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("url")
+    ap.add_argument("dest")
+    ap.add_argument("--sha256")
+    ap.add_argument("--timeout", type=float, default=60)
+    args = ap.parse_args(argv)
+    t = time.perf_counter()
+    fetch(args.url, args.dest, args.sha256, args.timeout, progress=print)
+    print(f"{args.dest}: {os.path.getsize(args.dest) / 1e6:.1f} MB in {time.perf_counter() - t:.2f} s")
+
+if __name__ == "__main__":
+    main()
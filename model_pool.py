@@ -0,0 +1,174 @@
+"""Replica pool with FIFO admission control, so concurrent sessions never share one predictor.
+
+ultralytics predictors keep per-call state and are not safe to call from several threads at once; each
+replica here is its own model instance and serves one predict() at a time. Waiting requests queue in
+arrival order, see their position, and are turned away immediately once the queue is full.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolBusy(RuntimeError):
+    """Queue full or wait timed out; the caller should ask the user to retry shortly."""
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def plan(replicas: int = 0, cores: int | None = None) -> tuple[int, int]:
+    """(replicas, torch threads per replica) covering the host's cores; replicas=0 picks ~2 threads each, max 4."""
+    cores = cores or available_cores()
+    replicas = replicas or max(1, min(4, cores // 2))
+    return replicas, max(1, cores // replicas)
+
+def set_torch_threads(n: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.get_num_threads() != n:
+        torch.set_num_threads(n)
+    try:
+        torch.set_num_interop_threads(1)  # only allowed before the first parallel op; replicas give the parallelism
+    except RuntimeError:
+        pass
+
+
+class ModelPool:
+    def __init__(self, loader, replicas: int = 1, max_queue: int = 32, threads: int = 0, first=None,
+                 timeout: float | None = None, preload: bool = False):
+        """loader() builds one replica; `first` is an already loaded one. Further replicas load on a background
+        thread with preload, and otherwise (or if that fails) in the first request that finds none free."""
+        self._loader = loader
+        self.replicas, self.max_queue, self.threads, self.timeout = max(1, replicas), max_queue, threads, timeout
+        self._free = [first] if first is not None else []
+        self._loaded = len(self._free)
+        self.names = getattr(first, "names", None)
+        self._waiting = deque()
+        self._cond = threading.Condition()
+        self.served = self.rejected = 0
+        self._waits = deque(maxlen=1024)
+        if threads:
+            set_torch_threads(threads)  # process-wide, so once here rather than on every borrow
+        if preload and self._loaded < self.replicas:
+            threading.Thread(target=self._fill, name="model-pool-fill", daemon=True).start()
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                if self._loaded >= self.replicas:
+                    return
+                self._loaded += 1  # reserved, so a request waits for this replica instead of loading another
+            try:
+                model = self._loader()
+            except Exception:
+                with self._cond:
+                    self._loaded -= 1
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self.names = self.names or getattr(model, "names", None)
+                self._free.append(model)
+                self._cond.notify_all()
+
+    def _admit(self, ticket, deadline, on_wait):
+        shown = None
+        while True:
+            with self._cond:
+                if self._waiting[0] is ticket and (self._free or self._loaded < self.replicas):
+                    self._waiting.popleft()
+                    self._cond.notify_all()  # the next ticket may be servable too
+                    if self._free:
+                        return self._free.pop()
+                    self._loaded += 1
+                    return None
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.rejected += 1
+                    raise PoolBusy("Timed out waiting for a free model.")
+                pos = self._waiting.index(ticket) + 1
+                if pos == shown or on_wait is None:
+                    self._cond.wait(0.5 if deadline is None else max(0.0, min(0.5, deadline - time.monotonic())))
+                    continue
+            on_wait(pos)  # outside the lock: it may be a slow UI update
+            shown = pos
+
+    @contextmanager
+    def slot(self, on_wait=None, timeout: float | None = None):
+        """Borrow a replica. on_wait(position) is called while queued (1 = next) and with 0 once served."""
+        timeout = self.timeout if timeout is None else timeout
+        ticket, t0 = object(), time.monotonic()
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise PoolBusy(f"{len(self._waiting)} requests already waiting.")
+            self._waiting.append(ticket)
+        queued = [False]
+        def _notify(pos):
+            queued[0] = True
+            on_wait(pos)
+        try:
+            model = self._admit(ticket, None if timeout is None else t0 + timeout, _notify if on_wait else None)
+        except BaseException:
+            with self._cond:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                self._cond.notify_all()
+            raise
+        if model is None:
+            try:
+                model = self._loader()
+            except BaseException:
+                with self._cond:
+                    self._loaded -= 1
+                    self._cond.notify_all()
+                raise
+            self.names = self.names or getattr(model, "names", None)
+        self._waits.append(time.monotonic() - t0)
+        if queued[0]:
+            on_wait(0)
+        try:
+            yield model
+        finally:
+            with self._cond:
+                self.served += 1
+                self._free.append(model)
+                self._cond.notify_all()
+
+    def client(self, on_wait=None, timeout: float | None = None) -> "PooledModel":
+        return PooledModel(self, on_wait, timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {"replicas": self.replicas, "loaded": self._loaded, "busy": self._loaded - len(self._free),
+                    "waiting": len(self._waiting), "served": self.served, "rejected": self.rejected,
+                    "threads_per_replica": self.threads,
+                    "wait_p50_ms": round(1e3 * waits[len(waits) // 2], 1) if waits else 0.0,
+                    "wait_p99_ms": round(1e3 * waits[min(len(waits) - 1, int(len(waits) * .99))], 1) if waits else 0.0}
+
+
+class PooledModel:
+    """Stands in for a YOLO instance: every predict() borrows a replica for just that call."""
+
+    def __init__(self, pool: ModelPool, on_wait=None, timeout: float | None = None):
+        self.pool, self.on_wait, self.timeout = pool, on_wait, timeout
+
+    @property
+    def names(self):
+        return self.pool.names
+
+    def predict(self, *args, **kwargs):
+        with self.pool.slot(self.on_wait, self.timeout) as model:
+            return model.predict(*args, **kwargs)
+
+    def predict_raw(self, bgrs: list, **kwargs):
+        """preprocess.predict_raw on a borrowed replica; each replica keeps its own letterbox buffers."""
+        from preprocess import predict_raw
+        with self.pool.slot(self.on_wait, self.timeout) as model:
+            return predict_raw(model, bgrs, **kwargs)
@@ -0,0 +1,189 @@
+"""Process-wide model loading without Streamlit: checkpoint download, backend cache, replica pools
+and background warm-up.
+
+ultralytics (and with it torch / torchvision) is only imported by the warm-up thread or the first load,
+so the UI can render while the model comes up.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from backends import load_backend
+from model_fetch import FetchError, fetch
+from model_pool import ModelPool, plan, set_torch_threads
+
+MODEL_URL     = os.getenv("MODEL_URL", "https://raw.githubusercontent.com/Bellzum/streamlit-main/blob/main/yolo_litterv1.pt")
+LOCAL_MODEL   = os.getenv("LOCAL_MODEL", "best.pt")
+CACHED_PATH   = "/tmp/models/best.pt"
+MODEL_SHA256  = os.getenv("MODEL_SHA256") or None      # pin the checkpoint; a mismatch refuses to load
+DEFAULT_IMGSZ = int(os.getenv("IMGSZ", "640"))
+INFER_BACKEND = os.getenv("INFER_BACKEND", "pytorch")   # pytorch | onnx | openvino | torchscript
+INFER_INT8    = os.getenv("INFER_INT8", "0") == "1"     # onnx only
+EXPORT_DIR    = os.path.join(os.path.dirname(CACHED_PATH), "exports")
+WARMUP_RUNS   = int(os.getenv("WARMUP_RUNS", "2"))
+WARMUP        = os.getenv("WARMUP", "1") == "1"
+# Replica pool: 0 = size from the host's cores; a full queue rejects at once, a long wait gives up after the timeout
+POOL_REPLICAS = int(os.getenv("POOL_REPLICAS", "0"))
+POOL_QUEUE    = int(os.getenv("POOL_QUEUE", "32"))
+POOL_TIMEOUT  = float(os.getenv("POOL_TIMEOUT", "60"))
+REPLICAS, TORCH_THREADS = plan(POOL_REPLICAS)
+
+# Startup milestones (perf_counter seconds); the first occurrence of each name wins
+T0 = time.perf_counter()
+STARTUP: dict[str, float] = {}
+
+
+def mark(name: str) -> float:
+    """Record a startup milestone once; returns seconds since this module was imported."""
+    STARTUP.setdefault(name, time.perf_counter())
+    return STARTUP[name] - T0
+
+def startup_timings() -> dict[str, float]:
+    return {k: round(v - T0, 3) for k, v in sorted(STARTUP.items(), key=lambda kv: kv[1])}
+
+# ======================= Checkpoint =======================
+def ensure_model_path() -> str:
+    if MODEL_URL.strip().startswith("http"):
+        try:
+            # No-op once complete; with several workers only one downloads, the rest wait on the lock
+            return fetch(MODEL_URL.strip(), CACHED_PATH, MODEL_SHA256)
+        except FetchError as e:
+            raise RuntimeError(
+                f"Failed to download model from URL:\n{MODEL_URL.strip()}\n\n{e}\n\n"
+                "If this is a private repo or rate limit issue, make the file public or commit it to this repo."
+            ) from e
+    if not os.path.exists(LOCAL_MODEL):
+        raise FileNotFoundError("Model file not found. Provide MODEL_URL or place best.pt next to this file.")
+    return LOCAL_MODEL
+
+def cache_key_for(path: str) -> str:
+    try: return f"{path}:{os.path.getmtime(path)}:{os.path.getsize(path)}"
+    except Exception: return path
+
+# ======================= Loaded models =======================
+_models: dict[tuple, object] = {}
+_key_locks: dict[tuple, threading.Lock] = {}
+_lock = threading.Lock()
+
+_pools: dict[tuple, ModelPool] = {}
+
+def _model_id(path: str, key: str, backend: str, imgsz: int, int8: bool) -> tuple:
+    return path, key, backend, int(imgsz) if backend != "pytorch" else 0, bool(int8)
+
+def get_model(path: str, key: str, backend: str = "pytorch", imgsz: int = 0, int8: bool = False):
+    """Load once per (checkpoint, backend, imgsz, int8); concurrent callers wait for the same load.
+
+    The instance is not safe for concurrent predict(); serve requests through get_pool().
+    """
+    k = _model_id(path, key, backend, imgsz, int8)
+    with _lock:
+        if k in _models:
+            return _models[k]
+        key_lock = _key_locks.setdefault(k, threading.Lock())
+    with key_lock:
+        if k not in _models:
+            # Exported graphs are static, so each imgsz gets its own artifact under EXPORT_DIR
+            _models[k] = load_backend(path, key, backend, k[3] or DEFAULT_IMGSZ, k[4], EXPORT_DIR)
+        return _models[k]
+
+def get_pool(path: str, key: str, backend: str = "pytorch", imgsz: int = 0, int8: bool = False) -> ModelPool:
+    """Replica pool for one model; replica 0 is the (warmed-up) get_model instance, the rest load in the background."""
+    k = _model_id(path, key, backend, imgsz, int8)
+    with _lock:
+        if k in _pools:
+            return _pools[k]
+    first = get_model(path, key, backend, imgsz, int8)  # raises here, not inside a request, if the backend fails
+    with _lock:
+        if k not in _pools:
+            _pools[k] = ModelPool(lambda: load_backend(path, key, backend, k[3] or DEFAULT_IMGSZ, k[4], EXPORT_DIR),
+                                  REPLICAS, POOL_QUEUE, TORCH_THREADS, first=first, timeout=POOL_TIMEOUT, preload=True)
+        return _pools[k]
+
+def pool_stats() -> dict:
+    with _lock:
+        return {f"{k[2]}{'@' + str(k[3]) if k[3] else ''}{':int8' if k[4] else ''}": p.stats() for k, p in _pools.items()}
+
+# ======================= Warm-up =======================
+class Warmup:
+    """Import, load and run a few dummy passes on a daemon thread; the UI polls `state` without blocking."""
+
+    def __init__(self, imgsz: int = DEFAULT_IMGSZ, runs: int = WARMUP_RUNS,
+                 backend: str = INFER_BACKEND, int8: bool = INFER_INT8):
+        self.imgsz, self.runs, self.backend, self.int8 = int(imgsz), runs, backend, int8
+        self.state = "pending"   # pending -> importing -> loading -> warming -> ready | error
+        self.error: str | None = None
+        self.note: str | None = None
+        self.names: list[str] = []
+        self.timings: dict[str, float] = {}
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def start(self) -> "Warmup":
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float | None = None) -> bool:
+        self._done.wait(timeout)
+        return self.ready
+
+    def _step(self, state: str, t: float) -> float:
+        now = time.perf_counter()
+        self.timings[f"{self.state}_s"] = round(now - t, 3)
+        self.state = state
+        return now
+
+    def _run(self):
+        t = time.perf_counter()
+        try:
+            self.state = "importing"
+            import ultralytics  # noqa: F401  (pulls in torch, torchvision and cv2)
+            set_torch_threads(TORCH_THREADS)
+            t = self._step("loading", t)
+            path = ensure_model_path()
+            try:
+                model = get_model(path, cache_key_for(path), self.backend, self.imgsz, self.int8)
+            except Exception as e:
+                self.note = f"{self.backend} backend unavailable ({e}); using PyTorch."
+                self.backend, self.int8 = "pytorch", False
+                model = get_model(path, cache_key_for(path))
+            names = getattr(model, "names", None)
+            self.names = list(names.values()) if isinstance(names, dict) else list(names or [])
+            t = self._step("warming", t)
+            # Letterbox grey, the same tensor shape real requests hit first
+            dummy = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+            for _ in range(max(1, self.runs)):
+                model.predict(dummy, imgsz=self.imgsz, verbose=False)
+            # The other replicas start loading now instead of inside the first request that needs one
+            get_pool(path, cache_key_for(path), self.backend, self.imgsz, self.int8)
+            self._step("ready", t)
+            mark("model_ready")
+        except Exception as e:
+            self.error = str(e)
+            self.state = "error"
+        finally:
+            self._done.set()
+
+_warmup: Warmup | None = None
+
+def start_warmup(imgsz: int = DEFAULT_IMGSZ, runs: int = WARMUP_RUNS) -> Warmup:
+    """Start the process-wide warm-up once; later calls return the same instance."""
+    global _warmup
+    with _lock:
+        if _warmup is None:
+            _warmup = Warmup(imgsz, runs)
+            if WARMUP:
+                _warmup.start()
+            else:
+                _warmup.state = "ready"
+                _warmup._done.set()
+        return _warmup
@@ -0,0 +1,51 @@
+"""Client-side detection overlay: one downscaled JPEG plus compact JSON boxes drawn as SVG in the browser."""
+import base64
+import json
+
+import numpy as np
+
+from detection import Detections
+from image_io import encode_jpeg
+
+_TEMPLATE = """<!doctype html><html><head><style>
+html,body{{margin:0;padding:0;background:transparent;font-family:sans-serif}}
+.wrap{{position:relative;display:inline-block;max-width:100%}}
+.wrap img{{display:block;max-width:100%;height:auto}}
+.wrap svg{{position:absolute;left:0;top:0;width:100%;height:100%}}
+</style></head><body><div class="wrap">
+<img src="data:image/jpeg;base64,{b64}" width="{w}" height="{h}" alt="Detections">
+<svg viewBox="0 0 {w} {h}" preserveAspectRatio="none"></svg></div>
+<script>
+const D={data};
+const svg=document.querySelector("svg"),ns="http://www.w3.org/2000/svg",fs=Math.max(11,Math.round({w}/60));
+for(const [x1,y1,x2,y2,c,s] of D.b){{
+  const r=document.createElementNS(ns,"rect");
+  r.setAttribute("x",x1);r.setAttribute("y",y1);r.setAttribute("width",x2-x1);r.setAttribute("height",y2-y1);
+  r.setAttribute("fill","none");r.setAttribute("stroke","#4EA01C");r.setAttribute("stroke-width",2);
+  svg.appendChild(r);
+  const label=D.n[c]+" "+s.toFixed(2),ty=y1-fs-4<0?y1+2:y1-fs-4;
+  const bg=document.createElementNS(ns,"rect");
+  bg.setAttribute("x",x1);bg.setAttribute("y",ty);bg.setAttribute("height",fs+4);
+  bg.setAttribute("width",label.length*fs*0.6+6);bg.setAttribute("fill","#4EA01C");
+  const t=document.createElementNS(ns,"text");
+  t.setAttribute("x",x1+3);t.setAttribute("y",ty+fs);t.setAttribute("fill","#fff");t.setAttribute("font-size",fs);
+  t.textContent=label;svg.appendChild(bg);svg.appendChild(t);
+}}
+</script></body></html>"""
+
+
+def boxes_payload(dets: Detections, scale: float) -> dict:
+    """{"n": names, "b": [[x1, y1, x2, y2, class_id, score], ...]} in base-image pixels."""
+    xy = np.rint(dets.xyxy * scale).astype(np.int32).tolist()
+    return {"n": list(dets.names),
+            "b": [[*b, c, round(s, 2)] for b, c, s in zip(xy, dets.class_ids.tolist(), dets.scores.tolist())]}
+
+def overlay_html(bgr: np.ndarray, dets: Detections, quality: int = 80, max_w: int = 800) -> tuple[str, int]:
+    """Self-contained HTML for st.components.v1.html and the pixel height it needs."""
+    H, W = bgr.shape[:2]
+    scale = min(1.0, max_w / W)
+    jpg = encode_jpeg(bgr, quality, max_side=round(max(W, H) * scale) if scale < 1 else None)
+    w, h = round(W * scale), round(H * scale)
+    data = json.dumps(boxes_payload(dets, scale), separators=(",", ":")).replace("</", "<\\/")
+    html = _TEMPLATE.format(b64=base64.b64encode(jpg).decode(), w=w, h=h, data=data)
+    return html, h + 6
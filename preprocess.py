@@ -0,0 +1,246 @@
+"""Letterbox preprocessing into preallocated buffers, feeding the model's backend directly.
+
+model.predict(bgr) letterboxes with a resize plus copyMakeBorder, then permutes, flips, copies and converts
+to float, allocating a new array or tensor at each step. LetterboxEngine keeps one uint8 NHWC canvas and one
+contiguous float32 NCHW tensor per (batch, H, W) (pinned when CUDA is available): each image is resized
+once straight into its slot of the canvas, the grey border is refilled, and the tensor is written in place
+by three channel copies (BGR -> RGB) and a scale. predict_raw runs the backend, NMS and the box mapping
+back to original pixels itself and returns RawPrediction, the same as detection.raw_prediction on Results.
+It reaches into ultralytics internals (predictor.model, non_max_suppression), so it is on by default only
+with the ultralytics version pinned in requirements.txt (ULTRALYTICS_TESTED, checked by test_preprocess.py
+against model.predict); infer_cache.predict_raws falls back to model.predict if those have moved.
+
+    python preprocess.py --sizes 320 640 1280 --batch 1 4    # per-image time / allocations vs ultralytics
+"""
+import argparse
+import os
+import time
+import weakref
+from collections import OrderedDict
+from importlib import metadata
+
+import numpy as np
+
+from detection import RawPrediction
+from timing import record_speed
+
+ULTRALYTICS_TESTED = "8.4.177"  # the version pinned in requirements.txt
+
+
+def _tested_ultralytics() -> bool:
+    try:
+        return metadata.version("ultralytics") == ULTRALYTICS_TESTED
+    except metadata.PackageNotFoundError:
+        return False
+
+_FAST = os.getenv("FAST_PREPROCESS", "auto")  # auto: on with the pinned ultralytics only; 1/0 force it
+FAST_PREPROCESS = _tested_ultralytics() if _FAST == "auto" else _FAST == "1"
+PAD_VALUE   = 114   # ultralytics LetterBox fill
+MAX_BUFFERS = 16    # (batch, H, W) layouts kept; rect canvases make a few per imgsz
+
+
+def letterbox_layout(shape, imgsz: int, stride: int = 32, rect: bool = True):
+    """Canvas (H, W), resized (h, w) and (top, left) padding exactly as ultralytics LetterBox computes them."""
+    h0, w0 = shape[:2]
+    r = min(imgsz / h0, imgsz / w0)
+    w, h = round(w0 * r), round(h0 * r)
+    dw, dh = imgsz - w, imgsz - h
+    if rect:  # minimum rectangle: pad only up to the stride
+        dw, dh = dw % stride, dh % stride
+    return (h + dh, w + dw), (h, w), (round(dh / 2 - 0.1), round(dw / 2 - 0.1))
+
+
+class LetterboxEngine:
+    """Reusable canvases/tensors keyed by (batch, H, W). Not thread-safe: keep one per model replica."""
+
+    def __init__(self, stride: int = 32, max_buffers: int = MAX_BUFFERS, pin: bool | None = None):
+        import torch
+        self.stride, self.max_buffers = stride, max_buffers
+        self.pin = torch.cuda.is_available() if pin is None else pin
+        self._bufs: OrderedDict[tuple, tuple] = OrderedDict()
+        self.allocations = 0
+
+    def _buffers(self, n: int, hw: tuple):
+        import torch
+        key = (n, *hw)
+        bufs = self._bufs.get(key)
+        if bufs is None:
+            canvas = torch.empty((n, *hw, 3), dtype=torch.uint8, pin_memory=self.pin)
+            out = torch.empty((n, 3, *hw), dtype=torch.float32, pin_memory=self.pin)
+            bufs = self._bufs[key] = (canvas, canvas.numpy(), out)
+            self.allocations += 1
+            while len(self._bufs) > self.max_buffers:
+                self._bufs.popitem(last=False)
+        self._bufs.move_to_end(key)
+        return bufs
+
+    def prepare(self, bgrs: list, imgsz: int, rect: bool = True):
+        """(N, 3, H, W) float32 RGB tensor in [0, 1] plus [((h, w), (top, left)), ...] per image.
+
+        Same-shape batches get the stride-rounded rectangle like ultralytics; mixed shapes share a square canvas.
+        The tensor is reused by the next call with the same layout, so consume it before preparing again.
+        """
+        import cv2
+        rect = rect and len({b.shape for b in bgrs}) == 1
+        layouts = [letterbox_layout(b.shape, imgsz, self.stride, rect) for b in bgrs]
+        hw = layouts[0][0] if rect else (imgsz, imgsz)
+        canvas, arr, out = self._buffers(len(bgrs), hw)
+        metas = []
+        for i, (bgr, (_, (h, w), (top, left))) in enumerate(zip(bgrs, layouts)):
+            dst = arr[i]
+            dst[:top] = PAD_VALUE; dst[top + h:] = PAD_VALUE
+            dst[top:top + h, :left] = PAD_VALUE; dst[top:top + h, left + w:] = PAD_VALUE
+            roi = dst[top:top + h, left:left + w]
+            if bgr.shape[:2] == (h, w):
+                roi[...] = bgr
+            else:
+                cv2.resize(bgr, (w, h), dst=roi, interpolation=cv2.INTER_LINEAR)
+            metas.append(((h, w), (top, left)))
+        for c in range(3):  # NHWC BGR uint8 -> NCHW RGB float, no intermediate tensors
+            out[:, c].copy_(canvas[..., 2 - c])
+        out.mul_(1 / 255)
+        return out, metas
+
+    def stats(self) -> dict:
+        return {"buffers": len(self._bufs), "allocations": self.allocations, "pinned": self.pin,
+                "bytes": sum(c.nbytes + o.nbytes for c, _, o in self._bufs.values())}
+
+
+def unletterbox(boxes: np.ndarray, shape, meta) -> np.ndarray:
+    """xyxy boxes on the letterboxed canvas -> original image pixels (in place), as ops.scale_boxes does."""
+    (h, w), (top, left) = meta
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - left) * (shape[1] / w)).clip(0, shape[1])
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - top) * (shape[0] / h)).clip(0, shape[0])
+    return boxes
+
+def _backend(model, imgsz: int):
+    """The predictor's AutoBackend; one throwaway predict creates it on a fresh YOLO."""
+    if getattr(model, "predictor", None) is None:
+        model.predict(np.full((imgsz, imgsz, 3), PAD_VALUE, np.uint8), imgsz=imgsz, verbose=False)
+    return model.predictor.model
+
+_ENGINES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # YOLO instance -> its engine
+
+def engine_for(model, imgsz: int = 640) -> LetterboxEngine:
+    eng = _ENGINES.get(model)
+    if eng is None:
+        backend = _backend(model, imgsz)  # exported models only accept their export size
+        eng = _ENGINES[model] = LetterboxEngine(int(max(getattr(backend, "stride", 32), 32)))
+    return eng
+
+def _nms():
+    try:
+        from ultralytics.utils.nms import non_max_suppression
+    except ImportError:  # ultralytics < 8.3.160
+        from ultralytics.utils.ops import non_max_suppression
+    return non_max_suppression
+
+def _inputs(model, bgrs: list, imgsz: int):
+    eng = engine_for(model, imgsz)
+    backend = model.predictor.model
+    x, metas = eng.prepare(bgrs, imgsz, rect=getattr(backend, "format", "pt") == "pt")
+    x = x.to(backend.device, non_blocking=True)
+    return (x.half() if getattr(backend, "fp16", False) else x), metas
+
+def _infer(model, x, augment: bool):
+    import torch
+    with torch.inference_mode():
+        return model.predictor.model(x, augment=augment)
+
+def forward(model, bgrs: list, imgsz: int = 640, augment: bool = False):
+    """(raw backend output before NMS, letterbox metas) for a batch of BGR images."""
+    x, metas = _inputs(model, bgrs, imgsz)
+    return _infer(model, x, augment), metas
+
+def to_raw(model, preds, metas, shapes, conf: float = 0.25, iou: float = 0.7,
+           max_det: int = 300) -> list[RawPrediction]:
+    """NMS on forward() output and boxes mapped back to each original (H, W) in shapes."""
+    backend = model.predictor.model
+    dets = _nms()(preds, conf_thres=conf, iou_thres=iou, max_det=max_det, end2end=getattr(backend, "end2end", False))
+    names = dict(backend.names) if isinstance(backend.names, dict) else dict(enumerate(backend.names))
+    out = []
+    for shape, meta, d in zip(shapes, metas, dets):
+        d = d.cpu().numpy()
+        out.append(RawPrediction(unletterbox(d[:, :4].astype(np.float32), shape, meta),
+                                 d[:, 4].astype(np.float32), d[:, 5].astype(np.int64), names, tuple(shape[:2])))
+    return out
+
+def predict_raw(model, bgrs: list, imgsz: int = 640, conf: float = 0.25, iou: float = 0.7,
+                augment: bool = False, max_det: int = 300) -> list[RawPrediction]:
+    """model.predict(bgrs, imgsz, conf, iou, augment) without Results objects, through LetterboxEngine.
+
+    `model` is a YOLO instance used by one thread at a time (a model_pool replica or the app's cached model).
+    """
+    t0 = time.perf_counter()
+    x, metas = _inputs(model, bgrs, imgsz)
+    t1 = time.perf_counter()
+    preds = _infer(model, x, augment)
+    t2 = time.perf_counter()
+    out = to_raw(model, preds, metas, [b.shape for b in bgrs], conf, iou, max_det)
+    t3 = time.perf_counter()
+    per = 1e3 / len(bgrs)
+    for _ in bgrs:
+        record_speed({"preprocess": (t1 - t0) * per, "inference": (t2 - t1) * per, "postprocess": (t3 - t2) * per})
+    return out
+
+# ======================= Microbenchmark =======================
+def _alloc_bytes(fn) -> int:
+    """Bytes allocated by one call, NumPy and torch CPU tensors alike (torch.profiler memory events)."""
+    from torch.profiler import ProfilerActivity, profile
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    return sum(e.cpu_memory_usage for e in prof.events() if e.cpu_memory_usage > 0 and not e.cpu_children)
+
+def _time_ms(fn, runs: int) -> float:
+    fn()
+    ts = []
+    for _ in range(runs):
+        t = time.perf_counter(); fn(); ts.append((time.perf_counter() - t) * 1e3)
+    return sorted(ts)[len(ts) // 2]
+
+def compare(model, images: list, sizes, batches, runs: int = 30) -> list[dict]:
+    """Per-image preprocessing time and allocated bytes: ultralytics predictor.preprocess vs LetterboxEngine."""
+    import tracemalloc
+    eng = engine_for(model, sizes[0])
+    predictor = model.predictor
+    rows = []
+    for sz in sizes:
+        for n in batches:
+            batch = [images[i % len(images)] for i in range(n)]
+            predictor.imgsz = (sz, sz)
+            ref = lambda: predictor.preprocess(batch)
+            new = lambda: eng.prepare(batch, sz)
+            for name, fn in (("ultralytics", ref), ("engine", new)):
+                ms = _time_ms(fn, runs)
+                tracemalloc.start()
+                fn()
+                np_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                try:
+                    alloc = _alloc_bytes(fn)
+                except Exception:  # profiler unavailable: NumPy side only
+                    alloc = np_peak
+                rows.append({"imgsz": sz, "batch": n, "path": name, "ms_per_image": ms / n,
+                             "alloc_mb_per_image": max(alloc, np_peak) / n / 1e6})
+    return rows
+
+def main(argv=None):
+    from bench import load_images, load_model
+    from image_io import decode_bgr
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--images", help="Folder of sample jpg/png images (default: synthetic 1600x1200 JPEGs)")
+    ap.add_argument("--limit", type=int, default=4)
+    ap.add_argument("--model", help="Checkpoint (default: random-weight yolov8n; only its stride matters here)")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[320, 640, 1280])
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--runs", type=int, default=30)
+    args = ap.parse_args(argv)
+    images = [decode_bgr(d) for d in load_images(args.images, args.limit)]
+    model, desc = load_model(args.model, not args.model)
+    rows = compare(model, images, args.sizes, args.batch, args.runs)
+    print(f"{desc}\n{'imgsz':>5} {'batch':>5} {'path':<12} {'ms/img':>8} {'alloc MB/img':>13}")
+    for r in rows:
+        print(f"{r['imgsz']:>5} {r['batch']:>5} {r['path']:<12} {r['ms_per_image']:>8.2f} {r['alloc_mb_per_image']:>13.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Threshold presets shared by the "Advanced settings" expander and the HTTP API (api.py)."""
+
+CLASS_NAMES = ["Clear plastic bottle", "Drink can", "Plastic bottle cap"]
+IMGSZ_OPTIONS = [320, 416, 512, 640, 800, 960, 1280]
+
+# bottle_min / can_min / cap_min are per-class confidence floors on top of the base conf
+PRESETS = {
+    "Minimum filters": dict(conf=0.05, iou=0.10, bottle_min=0.00, can_min=0.00, cap_min=0.00, min_area_pct=0.0, tta=False),
+    "Recommended":     dict(conf=0.25, iou=0.45, bottle_min=0.60, can_min=0.55, cap_min=0.65, min_area_pct=0.3, tta=False),
+    "Strict":          dict(conf=0.35, iou=0.50, bottle_min=0.70, can_min=0.70, cap_min=0.75, min_area_pct=0.5, tta=False),
+}
+DEFAULT_PRESET = "Minimum filters"
+# Lowest conf any preset or slider allows: predictions made at this conf can be re-filtered to any setting
+MIN_CONF = PRESETS[DEFAULT_PRESET]["conf"]
+
+
+def per_class_thresholds(bottle_min: float, can_min: float, cap_min: float) -> dict:
+    return {"Clear plastic bottle": bottle_min, "Drink can": can_min, "Plastic bottle cap": cap_min}
@@ -0,0 +1,250 @@
+"""Bulk-scan a directory tree of photos with the app's model, presets and filters, resumably.
+
+    python scan.py /data/survey --out scans/survey --workers 4 --preset Recommended
+    python scan.py /data/survey --out scans/survey            # after an interruption: picks up where it stopped
+
+Each worker process loads the model once (torch threads pinned so workers don't oversubscribe the
+cores) and takes chunks of --batch images, which go through one batched predict. Results are flushed
+every --flush images as numbered part files, detections-NNNNN and images-NNNNN (.parquet when pyarrow
+is installed, else .csv), each written atomically. Only then is the part appended to manifest.jsonl.
+On restart the images listed in the manifest are skipped, and part files the manifest does not list
+(left by a crash between the two writes) are removed. Read everything back with
+pandas.concat(map(pandas.read_parquet, sorted(glob("scans/survey/detections-*.parquet")))).
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from backends import BACKENDS, artifact_path, export_model
+from detection import filter_raw
+from image_io import decode_bgr, image_size
+from infer_cache import cached_predict_many
+from model_pool import available_cores, set_torch_threads
+from model_store import (DEFAULT_IMGSZ, EXPORT_DIR, INFER_BACKEND, INFER_INT8, cache_key_for, ensure_model_path,
+                         get_model)
+from presets import CLASS_NAMES, DEFAULT_PRESET, PRESETS, per_class_thresholds
+
+IMAGE_EXTS  = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+DET_COLUMNS = ["path", "class_id", "class_name", "score", "x1", "y1", "x2", "y2"]
+IMG_COLUMNS = ["path", "width", "height", "detections", *(f"n_{c}" for c in CLASS_NAMES), "error"]
+MANIFEST    = "manifest.jsonl"
+
+
+def list_images(root: str) -> list[str]:
+    """Image paths under root, relative to it, in a stable order."""
+    out = []
+    for d, dirs, files in os.walk(root):
+        dirs.sort()
+        out += [os.path.relpath(os.path.join(d, f), root) for f in sorted(files) if f.lower().endswith(IMAGE_EXTS)]
+    return out
+
+# ======================= Worker =======================
+_worker = {}
+
+def _init_worker(path: str, key: str, backend: str, imgsz: int, int8: bool, threads: int):
+    set_torch_threads(threads)
+    _worker["model"] = get_model(path, key, backend, imgsz, int8)
+
+def _image_row(rel: str, width=0, height=0, counts=None, error="") -> dict:
+    counts = counts or {}
+    return {"path": rel, "width": width, "height": height, "detections": sum(counts.values()),
+            **{f"n_{c}": counts.get(c, 0) for c in CLASS_NAMES}, "error": error}
+
+def scan_chunk(root: str, rels: list[str], p: dict) -> tuple[list[dict], list[dict]]:
+    """(image rows, detection rows) for one chunk; unreadable images get an error row instead of aborting."""
+    images, ok, bgrs, scales = [], [], [], []
+    for rel in rels:
+        try:
+            with open(os.path.join(root, rel), "rb") as f:
+                data = f.read()
+            bgr = decode_bgr(data, p["imgsz"])
+            ok.append(rel); bgrs.append(bgr)
+            scales.append(max(image_size(data)) / max(bgr.shape[:2]))  # JPEGs may be decoded at 1/2..1/8 scale
+        except Exception as e:
+            images.append(_image_row(rel, error=f"{type(e).__name__}: {e}"))
+    dets_rows = []
+    if bgrs:
+        raws = cached_predict_many(None, _worker["model"], "", bgrs, imgsz=p["imgsz"], conf=p["conf"], iou=p["iou"],
+                                   augment=p["tta"])
+        thresholds = per_class_thresholds(p["bottle_min"], p["can_min"], p["cap_min"])
+        for rel, bgr, scale, raw in zip(ok, bgrs, scales, raws):
+            dets = filter_raw(raw, thresholds, p["conf"], p["min_area_pct"], fallback=CLASS_NAMES)
+            h, w = bgr.shape[:2]
+            images.append(_image_row(rel, round(w * scale), round(h * scale), dets.counts))
+            xyxy = (dets.xyxy * scale).round(1).tolist()
+            dets_rows += [{"path": rel, "class_id": c, "class_name": n, "score": round(s, 4),
+                           "x1": b[0], "y1": b[1], "x2": b[2], "y2": b[3]}
+                          for b, c, n, s in zip(xyxy, dets.class_ids.tolist(), dets.class_names, dets.scores.tolist())]
+    return images, dets_rows
+
+# ======================= Output & manifest =======================
+def _part_name(kind: str, part: int, fmt: str) -> str:
+    return f"{kind}-{part:05d}.{fmt}"
+
+def _write_frame(df: pd.DataFrame, path: str, fmt: str):
+    tmp = f"{path}.tmp"
+    if fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+def load_manifest(out: str, config: dict) -> tuple[set, int]:
+    """(finished image paths, next part number); refuses to mix runs with different settings."""
+    path = os.path.join(out, MANIFEST)
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"config": config}) + "\n")
+        return set(), 0
+    done, parts, lines = set(), [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:  # torn last line from a crash mid-append
+                continue
+            lines.append(line if line.endswith("\n") else line + "\n")
+            if "config" in entry:
+                if entry["config"] != config:
+                    diff = {k: (entry["config"].get(k), v) for k, v in config.items() if entry["config"].get(k) != v}
+                    sys.exit(f"{path} was written with other settings {diff}; use a new --out or --restart")
+            else:
+                done.update(entry["files"])
+                parts.append(entry["part"])
+    with open(path, encoding="utf-8") as f:
+        torn = f.read() != "".join(lines)
+    if torn:  # drop the torn tail so the next append starts on a fresh line
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(f"{path}.tmp", path)
+    listed = {_part_name(kind, n, config["format"]) for n in parts for kind in ("images", "detections")}
+    for name in os.listdir(out):
+        if name.startswith(("images-", "detections-")) and name not in listed:
+            os.remove(os.path.join(out, name))  # written, but the crash came before its manifest entry
+    return done, max(parts, default=-1) + 1
+
+def flush_part(out: str, part: int, fmt: str, images: list[dict], dets: list[dict]):
+    _write_frame(pd.DataFrame(images, columns=IMG_COLUMNS), os.path.join(out, _part_name("images", part, fmt)), fmt)
+    _write_frame(pd.DataFrame(dets, columns=DET_COLUMNS), os.path.join(out, _part_name("detections", part, fmt)), fmt)
+    entry = {"part": part, "images": len(images), "detections": len(dets),
+             "errors": sum(1 for r in images if r["error"]), "time": time.time(), "files": [r["path"] for r in images]}
+    with open(os.path.join(out, MANIFEST), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _resolve_format(fmt: str) -> str:
+    if fmt != "auto":
+        return fmt
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "csv"
+
+# ======================= Driver =======================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("root", help="Directory tree to scan")
+    ap.add_argument("--out", required=True, help="Output directory (parts + manifest.jsonl)")
+    ap.add_argument("--model", help="Checkpoint (default: the app's MODEL_URL / LOCAL_MODEL)")
+    ap.add_argument("--workers", type=int, default=0, help="Processes (default: cores // 2)")
+    ap.add_argument("--threads", type=int, default=0, help="Torch threads per worker (default: cores // workers)")
+    ap.add_argument("--batch", type=int, default=8, help="Images per predict call")
+    ap.add_argument("--flush", type=int, default=1000, help="Images per output part")
+    ap.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto")
+    ap.add_argument("--preset", choices=list(PRESETS), default=DEFAULT_PRESET)
+    ap.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    ap.add_argument("--iou", type=float, help="NMS IoU (default: the preset's)")
+    ap.add_argument("--backend", choices=BACKENDS, default=INFER_BACKEND)
+    ap.add_argument("--int8", action=argparse.BooleanOptionalAction, default=INFER_INT8,
+                    help="INT8 weights where the backend supports them (default: INFER_INT8)")
+    ap.add_argument("--report", type=float, default=10.0, help="Seconds between progress lines")
+    ap.add_argument("--restart", action="store_true", help="Discard an existing manifest and start over")
+    args = ap.parse_args(argv)
+
+    cores = available_cores()
+    workers = args.workers or max(1, cores // 2)
+    threads = args.threads or max(1, cores // workers)
+    fmt = _resolve_format(args.format)
+    path = args.model or ensure_model_path()
+    key = cache_key_for(path)
+    params = {**PRESETS[args.preset], "imgsz": args.imgsz}
+    if args.iou is not None:
+        params["iou"] = args.iou
+    config = {"root": os.path.abspath(args.root), "model": key, "backend": args.backend, "int8": args.int8,
+              "preset": args.preset, "params": params, "format": fmt}
+
+    os.makedirs(args.out, exist_ok=True)
+    if args.restart:
+        for name in os.listdir(args.out):
+            if name == MANIFEST or name.startswith(("images-", "detections-")):
+                os.remove(os.path.join(args.out, name))
+    done, part = load_manifest(args.out, config)
+    files = list_images(args.root)
+    todo = [f for f in files if f not in done]
+    print(f"{len(files)} images under {args.root}; {len(files) - len(todo)} already scanned, {len(todo)} to go "
+          f"({workers} workers x {threads} threads, batch {args.batch}, {fmt})")
+    if not todo:
+        return
+    if args.backend != "pytorch":  # export once here instead of racing in every worker
+        export_model(path, artifact_path(EXPORT_DIR, key, args.backend, args.imgsz, args.int8), args.backend,
+                     args.imgsz, args.int8)
+
+    chunks = iter([todo[i:i + args.batch] for i in range(0, len(todo), args.batch)])
+    buf_images, buf_dets = [], []
+    n_images = n_dets = n_errors = 0
+    t0 = last_report = time.perf_counter()
+
+    def flush():
+        nonlocal part, buf_images, buf_dets
+        if buf_images:
+            flush_part(args.out, part, fmt, buf_images, buf_dets)
+            part += 1
+            buf_images, buf_dets = [], []
+
+    ex = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"), initializer=_init_worker,
+                             initargs=(path, key, args.backend, args.imgsz, args.int8, threads))
+    pending = set()
+    try:
+        while True:
+            # Keep each worker one chunk ahead, never the whole archive, in flight
+            for rels in chunks:
+                pending.add(ex.submit(scan_chunk, args.root, rels, params))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                images, dets = fut.result()
+                buf_images += images; buf_dets += dets
+                n_images += len(images); n_dets += len(dets); n_errors += sum(1 for r in images if r["error"])
+            if len(buf_images) >= args.flush:
+                flush()
+            now = time.perf_counter()
+            if now - last_report >= args.report:
+                last_report = now
+                rate = n_images / (now - t0)
+                eta = (len(todo) - n_images) / rate if rate else float("inf")
+                print(f"{n_images}/{len(todo)} images · {rate:.1f} img/s · {n_dets} detections · {n_errors} errors "
+                      f"· ETA {eta / 60:.1f} min", flush=True)
+    except KeyboardInterrupt:
+        print("interrupted; saving finished images (rerun the same command to resume)")
+        for fut in pending:
+            fut.cancel()
+    finally:
+        flush()
+        ex.shutdown(wait=False, cancel_futures=True)
+    elapsed = time.perf_counter() - t0
+    print(f"scanned {n_images} images in {elapsed:.1f} s ({n_images / max(elapsed, 1e-9):.1f} img/s): "
+          f"{n_dets} detections, {n_errors} errors -> {args.out}")
+
+if __name__ == "__main__":
+    main()
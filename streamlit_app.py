@@ -1,12 +1,35 @@
 import os
 import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-from PIL import Image
 import streamlit as st
-from ultralytics import YOLO
+import streamlit.components.v1 as components
+
+from backends import BACKENDS, INT8_BACKENDS
+from cascade import AUTO_BUDGET_MS, AUTO_SIZES, cascade_predict
+from cities import DEFAULT_CITY, city_guide, class_mismatch, load_index
+from detection import draw_boxes, filter_raw
+from detlog import DETLOG, get_log, summary as detlog_summary
+from image_io import decode_bgr, encode_jpeg
+from guidance import compile_card, render_card
+from overlay import overlay_html
+from presets import CLASS_NAMES, DEFAULT_PRESET, IMGSZ_OPTIONS, PRESETS, per_class_thresholds
+from infer_cache import InferenceCache, cached_compute, cached_predict, cached_predict_many
+from model_pool import PoolBusy
+from model_store import (CACHED_PATH, DEFAULT_IMGSZ, INFER_BACKEND, INFER_INT8, cache_key_for, ensure_model_path,
+                         get_pool, mark, pool_stats, start_warmup, startup_timings)
+from tiling import MERGE_METHODS, sliced_predict
+from timing import STATS, begin_trace, span, start_exporter
+from tracking import Tracker
+from video import batched, ffmpeg_available, iter_frames, probe, sampling
 
 st.set_page_config(page_title="When AI Sees Litter", page_icon="♻️", layout="wide")
+# ultralytics/torch import, model load and warm-up run on a background thread from the first page view
+warmup = start_warmup(DEFAULT_IMGSZ)
+start_exporter()  # METRICS_PORT / METRICS_JSON, see timing.py
 
 # ======================= THEME (Light agriculture vibe) =======================
 def apply_agri_theme():
@@ -62,6 +85,15 @@ def apply_agri_theme():
       .eco-link{ border-radius:999px; padding:8px 12px; border:1px solid var(--agri-border);
                  background:#fff; text-decoration:none !important; color: var(--agri-primary-dark) !important; font-weight:700; }
       .eco-link:hover{ background: var(--agri-pill); }
+      .eco-icons{ display:flex; gap:8px; margin:4px 0 8px 0; }
+      .eco-icons img{ width:48px; height:auto; }
+      .eco-body{ display:flex; gap:16px; align-items:center; }
+      .eco-media{ flex:1; min-width:0; }
+      .eco-media img{ display:block; width:100%; height:auto; border-radius:12px; margin:4px 0; }
+      .eco-media.grid{ display:flex; flex-wrap:wrap; gap:8px; }
+      .eco-media.grid img{ width:160px; }
+      .eco-text{ flex:2; min-width:0; }
+      @media (max-width: 640px){ .eco-body{ flex-direction:column; } }
 
       .howto li{ margin:2px 0; }
 
@@ -84,34 +116,37 @@ def apply_agri_theme():
 apply_agri_theme()
 
 # ======================= Config & Model =======================
-MODEL_URL     = os.getenv("MODEL_URL", "https://raw.githubusercontent.com/Bellzum/streamlit-main/blob/main/yolo_litterv1.pt")
-LOCAL_MODEL   = os.getenv("LOCAL_MODEL", "best.pt")
-CACHED_PATH   = "/tmp/models/best.pt"
-DEFAULT_IMGSZ = int(os.getenv("IMGSZ", "640"))
-
-CLASS_NAMES   = ["Clear plastic bottle", "Drink can", "Plastic bottle cap"]
-IMGSZ_OPTIONS = [320, 416, 512, 640, 800, 960, 1280]
-
-# ======================= Official Shibuya references =======================
-SHIBUYA_GUIDE_URL = "https://www.city.shibuya.tokyo.jp/contents/living-in-shibuya/en/daily/garbage.html"
-SHIBUYA_POSTER_EN = "https://files.city.shibuya.tokyo.jp/assets/12995aba8b194961be709ba879857f70/bfda2f5d763343b5a0b454087299d57f/2024wakedashiEnglish.pdf#page=2"
-SHIBUYA_PLASTICS_NOTICE = "https://files.city.shibuya.tokyo.jp/assets/12995aba8b194961be709ba879857f70/0cdf099fdfe8456fbac12bb5ad7927e4/assets_kusei_ShibuyaCityNews2206_e.pdf#page=1"
-
-# PET step photos (Fukuoka City — illustrates same steps)
-FUKUOKA_PET_STEPS = [
-    "https://kateigomi-bunbetsu.city.fukuoka.lg.jp/files/Rules/images/bottles/ph04.png",
-    "https://kateigomi-bunbetsu.city.fukuoka.lg.jp/files/Rules/images/bottles/ph05.png",
-    "https://kateigomi-bunbetsu.city.fukuoka.lg.jp/files/Rules/images/bottles/ph06.png",
-    "https://kateigomi-bunbetsu.city.fukuoka.lg.jp/files/Rules/images/bottles/ph07.png",
-]
-
-# Recycling marks (Wikipedia Commons PNG thumbnails)
-ICON_PET   = "https://upload.wikimedia.org/wikipedia/commons/thumb/8/87/Recycling_pet.svg/120px-Recycling_pet.svg.png"
-ICON_AL    = "https://upload.wikimedia.org/wikipedia/commons/thumb/1/1a/Recycling_alumi.svg/120px-Recycling_alumi.svg.png"
-ICON_STEEL = "https://upload.wikimedia.org/wikipedia/commons/thumb/4/45/Recycling_steel.svg/120px-Recycling_steel.svg.png"
-ICON_PLA   = "https://upload.wikimedia.org/wikipedia/commons/thumb/8/8b/Recycling_pla.svg/120px-Recycling_pla.svg.png"
+# MODEL_URL / LOCAL_MODEL / IMGSZ / INFER_BACKEND / INFER_INT8 are read in model_store.py
+AUTO_IMGSZ    = os.getenv("AUTO_IMGSZ", "0") == "1"   # 1: preselect "Auto" (small first, larger only when unsure) over IMGSZ
+
+# Raw prediction cache (memory LRU + optional .npz tier next to the cached model)
+PRED_CACHE_ITEMS = int(os.getenv("PRED_CACHE_ITEMS", "256"))
+PRED_CACHE_MB    = int(os.getenv("PRED_CACHE_MB", "64"))
+PRED_CACHE_DIR   = os.getenv("PRED_CACHE_DIR", os.path.join(os.path.dirname(CACHED_PATH), "preds"))
+PRED_CACHE_DISK  = os.getenv("PRED_CACHE_DISK", "1") == "1"
+TILE_OPTIONS  = [320, 480, 640, 800, 960, 1280]
+BATCH_SIZE_OPTIONS = [1, 2, 4, 8, 16]
+DEFAULT_BATCH = int(os.getenv("BATCH_SIZE", "8"))
+GALLERY_PAGE_SIZE = 12
+THUMB_MAX_W = 640
+
+# Result rendering: "overlay" sends one downscaled JPEG + JSON boxes; "server" sends full-size drawn images
+RENDER_MODES   = ["Overlay (light)", "Server-drawn image"]
+RENDER_MODE    = RENDER_MODES[1] if os.getenv("RENDER_MODE", "overlay") == "server" else RENDER_MODES[0]
+RENDER_WIDTHS  = [480, 640, 800, 1024, 1280]
+RENDER_QUALITY = int(os.getenv("RENDER_QUALITY", "80"))
+RENDER_MAX_W   = int(os.getenv("RENDER_MAX_W", "800"))
+
+# Video: frames are sampled inside ffmpeg and never buffered beyond one batch
+VIDEO_TYPES       = ["mp4", "mov", "m4v", "avi", "mkv", "webm"]
+DEFAULT_VIDEO_FPS = float(os.getenv("VIDEO_FPS", "2"))
+VIDEO_MAX_SIDE    = int(os.getenv("VIDEO_MAX_SIDE", "1280"))
 
 # SDG icon images (official UN files)
+SDG_11 = "https://sdgs.un.org/sites/default/files/goals/E_SDG_Icons-11.jpg"
+SDG_12 = "https://sdgs.un.org/sites/default/files/goals/E_SDG_Icons-12.jpg"
+SDG_13 = "https://sdgs.un.org/sites/default/files/goals/E_SDG_Icons-13.jpg"
+SDG_14 = "https://sdgs.un.org/sites/default/files/goals/E_SDG_Icons-14.jpg"
 
 # Carbon-credit helpful links
 LINK_UN_CNP  = "https://unfccc.int/climate-action/united-nations-carbon-offset-platform"
@@ -121,190 +156,163 @@ LINK_GS      = "https://www.goldstandard.org/"
 LINK_VERRA   = "https://verra.org/programs/verified-carbon-standard/"
 LINK_JCREDIT = "https://japancredit.go.jp/english/"
 
-# Hanwa can-to-can flow images
-HANWA_CAN2CAN = "https://www.hanwa.co.jp/images/csr/business/img_5_01.png"
-
-
-# ======================= Guidance content (Shibuya) =======================
-GUIDE_SHIBUYA = {
-    "Clear plastic bottle": {
-        "title": "Shibuya disposal: PET bottle (resource)",
-        "emoji": "🧴",
-        "materials": "Bottle body is PET (polyethylene terephthalate). Caps and labels are PP/PE.",
-        "why_separate": [
-            "Caps and labels (PP/PE) contaminate the PET stream if left on.",
-            "Shibuya asks you to remove caps and labels and sort them with Plastics."
-        ],
-        "steps": [
-            "Remove the cap and label.",
-            "Rinse the bottle.",
-            "Crush it flat.",
-            "Put PET bottles in a transparent bag for PET.",
-            "Put caps and labels with Plastics."
-        ],
-        "recycles_to": ["New PET bottles", "Fibers for clothing and bags", "Sheets/films"],
-        "facts": [
-            {
-                "text": "Japan’s reported plastic 'recycling' rate includes thermal recovery; clean PET enables high-value bottle-to-bottle.",
-                "url": "https://japan-forward.com/japans-plastic-recycling-the-unseen-reality/"
-            },
-            {
-                "text": "Recycled PET in Japan becomes new bottles, sheets and fibers for clothing/bags.",
-                "url": "https://www.petbottle-rec.gr.jp/english/actual.html"
-            }
-        ],
-        "images": FUKUOKA_PET_STEPS,
-        "icons": [ICON_PET],
-        "link": SHIBUYA_GUIDE_URL,
-        "poster": SHIBUYA_POSTER_EN,
-    },
-    "Drink can": {
-        "title": "Shibuya disposal: Aluminum or steel can (resource)",
-        "emoji": "🥫",
-        "materials": "Mostly aluminum; some cans are steel.",
-        "why_separate": [
-            "Clean metal cans keep a high-value recycling stream.",
-            "Aluminum recycling saves major energy vs producing new metal."
-        ],
-        "steps": [
-            "Rinse the can.",
-            "Optional: Lightly crush/squeeze to save space (only if your building/bin instructions allow).",
-            "Put cans in a transparent bag for cans."
-        ],
-        "recycles_to": [
-            "New beverage cans (can-to-can)",
-            "Automotive & construction parts (aluminum)",
-            "Remelt scrap ingots"
-        ],
-        "facts": [
-            {
-                "text": "Coca-Cola Bottlers Japan promotes CAN-to-CAN, including products using recycled aluminum bodies.",
-                "url": "https://en.ccbji.co.jp/news/detail.php?id=1347"
-            },
-            {
-                "text": "Hanwa: used aluminum cans are cleaned, melted and supplied as remelt scrap ingots to aluminum mills — then used again as cans.",
-                "url": HANWA_CAN2CAN
-            }
-        ],
-        "images": [HANWA_CAN2CAN],
-        "icons": [ICON_AL, ICON_STEEL],
-        "link": SHIBUYA_GUIDE_URL,
-        "poster": SHIBUYA_POSTER_EN,
-    },
-    "Plastic bottle cap": {
-        "title": "Shibuya disposal: Plastic bottle cap (plastic item)",
-        "emoji": "🔘",
-        "materials": "PP or PE (polypropylene or polyethylene) closures.",
-        "why_separate": [
-            "Caps are not PET. Separating avoids contaminating bottle-to-bottle recycling.",
-            "In Shibuya, caps & labels go with Plastic items (プラ), not with PET bottles."
-        ],
-        "steps": ["Remove from the bottle.", "Rinse if sticky.", "Put caps with Plastic items in a clear/semi-clear bag."],
-        "recycles_to": ["New caps (pilots)", "Plastic containers/packaging", "Pallets & molded goods"],
-        "facts": [
-            {
-                "text": "Separating PP/PE caps and labels keeps the PET stream clean for high-value recycling.",
-                "url": "https://japan-forward.com/japans-plastic-recycling-the-unseen-reality/"
-            }
-        ],
-        "images": [],
-        "icons": [ICON_PLA],
-        "link": SHIBUYA_GUIDE_URL,
-        "poster": SHIBUYA_PLASTICS_NOTICE,
-    },
-}
-
-# Add more cities later: {"city_id": GUIDE_DICT}
-GUIDE_BY_CITY = {
-    "shibuya": GUIDE_SHIBUYA
-}
 
 # ======================= Helpers =======================
-def _download_file(url: str, dest: str):
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
-    try:
-        import requests
-        with requests.get(url, stream=True, timeout=60) as r:
-            r.raise_for_status()
-            with open(dest, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk: f.write(chunk)
-        return
-    except Exception as e_req:
-        try:
-            import urllib.request
-            with urllib.request.urlopen(url, timeout=60) as resp, open(dest, "wb") as f:
-                shutil.copyfileobj(resp, f)
-        except Exception as e_url:
-            st.error(
-                f"Failed to download model from URL:\n{url}\n\n"
-                f"requests error: {e_req}\nurllib error: {e_url}\n\n"
-                "If this is a private repo or rate limit issue, make the file public or commit it to this repo."
-            )
-            st.stop()
-
 def _ensure_model_path() -> str:
-    if MODEL_URL.strip().startswith("http"):
-        if not os.path.exists(CACHED_PATH):
-            _download_file(MODEL_URL.strip(), CACHED_PATH)
-        return CACHED_PATH
-    if not os.path.exists(LOCAL_MODEL):
-        st.error("Model file not found. Provide MODEL_URL or place best.pt next to this file.")
+    try:
+        return ensure_model_path()
+    except (RuntimeError, FileNotFoundError) as e:
+        st.error(str(e))
         st.stop()
-    return LOCAL_MODEL
 
-def _cache_key_for(path: str) -> str:
-    try: return f"{path}:{os.path.getmtime(path)}:{os.path.getsize(path)}"
-    except Exception: return path
+def _backend_choice() -> tuple[str, bool]:
+    backend = st.session_state.get("backend", INFER_BACKEND)
+    if backend not in BACKENDS:
+        backend = "pytorch"
+    return backend, bool(st.session_state.get("int8", INFER_INT8)) and backend in INT8_BACKENDS
 
-@st.cache_resource(show_spinner=True)
-def _load_model_cached(path: str, key: str):
-    return YOLO(path)
+def _queue_notice(ph):
+    def on_wait(pos: int):
+        if pos:
+            ph.info(f"⏳ Busy right now: you are #{pos} in the queue.")
+        else:
+            ph.empty()
+    return on_wait
 
-def load_model():
+def _pool(imgsz: int):
     path = _ensure_model_path()
-    return _load_model_cached(path, _cache_key_for(path))
-
-def pil_to_bgr(pil_img: Image.Image) -> np.ndarray:
-    arr = np.array(pil_img.convert("RGB"))
-    return arr[:, :, ::-1]
-
-def draw_boxes(bgr, dets):
-    import cv2
-    out = bgr.copy()
-    H, W = out.shape[:2]
-    color = (28,160,78)  # theme green (BGR)
-    for d in dets:
-        x1, y1, x2, y2 = map(int, d["xyxy"])
-        cv2.rectangle(out, (x1, y1), (x2, y2), color, 2)
-        label = f'{d["class_name"]} {d["score"]:.2f}'
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        fs, thick = 0.5, 1
-        (tw, th), _ = cv2.getTextSize(label, font, fs, thick)
-        y_text = y1 - 4
-        if y_text - th - 4 < 0:
-            y_text = min(y1 + th + 6, H - 2)
-        x_text = max(0, min(x1, W - tw - 6))
-        x_bg1, y_bg1 = x_text, max(0, y_text - th - 4)
-        x_bg2, y_bg2 = min(x_text + tw + 6, W - 1), min(y_text + 2, H - 1)
-        cv2.rectangle(out, (x_bg1, y_bg1), (x_bg2, y_bg2), color, -1)
-        cv2.putText(out, label, (x_text + 3, y_text - 2), font, fs, (255, 255, 255), 1, cv2.LINE_AA)
-    return Image.fromarray(out[:, :, ::-1])
-
-def _get_names_map(pred, model):
-    # Use checkpoint names if present, else fallback; replace with a forced map if needed later
-    names_map = None
-    if hasattr(pred, "names") and isinstance(pred.names, dict):
-        names_map = pred.names
-    elif hasattr(model, "names") and isinstance(model.names, dict):
-        names_map = model.names
-    elif hasattr(model, "names") and isinstance(model.names, list):
-        names_map = {i: n for i, n in enumerate(model.names)}
-    return names_map
+    backend, int8 = _backend_choice()
+    if backend == "pytorch":
+        return get_pool(path, cache_key_for(path))
+    try:
+        with st.spinner(f"Loading {backend} model…"):
+            return get_pool(path, cache_key_for(path), backend, int(imgsz), int8)
+    except Exception as e:
+        st.warning(f"{backend} backend unavailable ({e}); using PyTorch.")
+        return get_pool(path, cache_key_for(path))
+
+def load_model(imgsz: int = DEFAULT_IMGSZ):
+    """Session handle on the shared replica pool; each predict() queues FIFO and may raise PoolBusy."""
+    with span("load_model"):
+        if not warmup.done:
+            with st.spinner("Model is still warming up…"):
+                warmup.wait()
+        return _pool(imgsz).client(on_wait=_queue_notice(st.empty()))
+
+def _log_scan(source: str, dets=None, counts: dict | None = None):
+    """Queue one scan for the local detection log; never blocks the response."""
+    dlog = get_log()
+    if dlog is None:
+        return
+    if dets is not None:
+        dlog.record(city_id, source, dets.class_names, dets.scores.tolist())
+    else:
+        dlog.record_counts(city_id, source, counts)
+
+def _busy(e: PoolBusy):
+    st.warning(f"Lots of people are scanning right now ({e}) Please try again in a moment.")
+
+def _model_key() -> str:
+    backend, int8 = _backend_choice()
+    return f"{cache_key_for(_ensure_model_path())}:{backend}{':int8' if int8 else ''}"
+
+@st.cache_resource(show_spinner=False)
+def _pred_cache() -> InferenceCache:
+    return InferenceCache(max_items=PRED_CACHE_ITEMS, max_bytes=PRED_CACHE_MB << 20,
+                          disk_dir=PRED_CACHE_DIR if PRED_CACHE_DISK else None)
 
 def _closest_size(target: int, options: list[int]) -> int:
     return min(options, key=lambda x: abs(x - target))
 
+# ======================= Batch helpers =======================
+def _decode_many(files, workers: int, target: int | None = None) -> list[np.ndarray]:
+    # cv2.imdecode releases the GIL, so a thread pool scales here
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        return list(ex.map(lambda f: decode_bgr(f, target), files))
+
+def run_batch(model, files, batch_size: int, predict_kwargs: dict, per_class_min: dict,
+              conf: float, min_area_pct: float, progress=None, burst: bool = False) -> dict:
+    """Decode files concurrently and run them through model.predict in chunks of batch_size.
+
+    With burst=True the photos are treated as consecutive frames and items seen in
+    overlapping shots are counted once.
+    """
+    workers = min(batch_size, os.cpu_count() or 1)
+    items, totals, peak = [], {}, {}
+    # Every filtered detection already cleared the active thresholds, so each may start a track
+    tracker = Tracker(max_age=2, min_hits=1, high_thresh=0.0) if burst else None
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        # Decode the next chunk while the current one is on the model
+        chunks = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+        target = predict_kwargs.get("imgsz")
+        pending = prefetch.submit(_decode_many, chunks[0], workers, target) if chunks else None
+        for ci, chunk in enumerate(chunks):
+            bgrs = pending.result()
+            pending = prefetch.submit(_decode_many, chunks[ci + 1], workers, target) if ci + 1 < len(chunks) else None
+            raws = cached_predict_many(_pred_cache(), model, _model_key(), bgrs, **predict_kwargs)
+            for f, bgr, raw in zip(chunk, bgrs, raws):
+                dets = filter_raw(raw, per_class_min, conf, min_area_pct, fallback=CLASS_NAMES)
+                counts = dets.counts
+                if tracker is not None:
+                    tracker.update(dets)
+                vis = draw_boxes(bgr, dets, inplace=True) if len(dets) else bgr
+                items.append({"name": getattr(f, "name", f"image_{len(items)}"), "dets": dets,
+                              "counts": counts, "thumb": encode_jpeg(vis, 80, THUMB_MAX_W)})
+                for k, v in counts.items():
+                    totals[k] = totals.get(k, 0) + v
+                    peak[k] = max(peak.get(k, 0), v)
+            del bgrs, raws
+            if progress is not None:
+                progress(len(items) / len(files))
+    elapsed = time.perf_counter() - t0
+    if tracker is not None:  # never fewer than one photo showed, as in run_video
+        unique = tracker.unique_counts
+        totals = {k: max(unique.get(k, 0), v) for k, v in peak.items()}
+    return {"items": items, "totals": totals, "elapsed": elapsed,
+            "ips": (len(items) / elapsed) if elapsed > 0 else 0.0}
+
+# ======================= Video helpers =======================
+def _spool_upload(up, suffix: str) -> str:
+    # ffmpeg wants a seekable path; copy the upload to disk in chunks rather than into memory
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        up.seek(0)
+        shutil.copyfileobj(up, f, length=1 << 20)
+        return f.name
+
+def run_video(model, path: str, info: dict, batch_size: int, stride: int, max_fps: float,
+              predict_kwargs: dict, per_class_min: dict, conf: float, min_area_pct: float, on_batch=None) -> dict:
+    """Stream sampled frames through model.predict in batches; on_batch(state) gets progressive results."""
+    rate = sampling(info, stride, max_fps)
+    expected = max(1, int(info["duration"] * rate)) if info["duration"] else None
+    totals, peak = {}, {}
+    # Tracks survive ~2 s of sampled video without a match; needs 2 hits to count as a unique item
+    tracker = Tracker(max_age=max(1, int(2 * rate)), min_hits=2)
+    n, t0 = 0, time.perf_counter()
+    state = {"frames": 0, "expected": expected, "totals": totals, "peak": peak, "unique": {}, "elapsed": 0.0,
+             "video_s": 0.0, "last": None}
+    last = None
+    frames = iter_frames(path, info, stride=stride, max_fps=max_fps, max_side=VIDEO_MAX_SIDE)
+    for chunk in batched(frames, batch_size):
+        raws = cached_predict_many(None, model, "", [fr for _, _, fr in chunk], **predict_kwargs)
+        for (_, ts, fr), raw in zip(chunk, raws):
+            dets = filter_raw(raw, per_class_min, conf, min_area_pct, fallback=CLASS_NAMES)
+            tracker.update(dets)
+            for k, v in dets.counts.items():
+                totals[k] = totals.get(k, 0) + v
+                peak[k] = max(peak.get(k, 0), v)
+            last = (ts, fr, dets)
+        n += len(chunk)
+        elapsed = time.perf_counter() - t0
+        state = {"frames": n, "expected": expected, "totals": totals, "peak": peak,
+                 "unique": tracker.unique_counts, "elapsed": elapsed,
+                 "video_s": last[0] if last else 0.0, "last": last}
+        if on_batch is not None:
+            on_batch(state)
+        del chunk, raws
+    state["elapsed"] = time.perf_counter() - t0
+    return state
+
 # ======================= Header + City selector =======================
 logo_col, title_col = st.columns([3, 5], vertical_alignment="center")
 with logo_col:
@@ -315,104 +323,59 @@ with title_col:
 
 
 # ======================= Hero =======================
-st.markdown("""
+# Filled below once the city selector has a value
+hero_ph = st.empty()
+HERO_HTML = """
 <div class="hero">
   <h1>Scan litter. Get local sorting guidance.</h1>
   <p><span class="pill">Quick Detect</span> works on PET bottles, drink cans, and plastic bottle caps. — <b>{city}</b></p>
 </div>
-""".format(city=city_label), unsafe_allow_html=True)
+"""
 
 # ======================= Guidance renderer =======================
-def _guide_link(url: str, label: str):
-    st.markdown(f'<a class="eco-link" href="{url}" target="_blank" rel="noopener">{label}</a>', unsafe_allow_html=True)
-
-def _guidance_text(info: dict):
-    if info.get("materials"):
-        st.markdown(f'<div class="eco-meta"><strong>Material:</strong> {info["materials"]}</div>', unsafe_allow_html=True)
-    if info.get("why_separate"):
-        st.markdown('<div class="eco-section-title">Why separate?</div>', unsafe_allow_html=True)
-        st.markdown('<ul class="eco-list">', unsafe_allow_html=True)
-        for reason in info["why_separate"]:
-            st.markdown(f'<li>{reason}</li>', unsafe_allow_html=True)
-        st.markdown('</ul>', unsafe_allow_html=True)
-
-    st.markdown('<div class="eco-section-title">How to put out</div>', unsafe_allow_html=True)
-    st.markdown('<ul class="eco-list">', unsafe_allow_html=True)
-    for step in info["steps"]:
-        st.markdown(f'<li>{step}</li>', unsafe_allow_html=True)
-    st.markdown('</ul>', unsafe_allow_html=True)
-
-    if info.get("recycles_to"):
-        st.markdown('<div class="eco-section-title">Commonly recycled into</div>', unsafe_allow_html=True)
-        st.markdown('<div class="chip-row">', unsafe_allow_html=True)
-        for item in info["recycles_to"]:
-            st.markdown(f'<div class="chip">{item}</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    facts = info.get("facts", [])
-    if facts:
-        st.markdown('<div class="eco-section-title">Did you know?</div>', unsafe_allow_html=True)
-        st.markdown('<ul class="eco-list">', unsafe_allow_html=True)
-        for fact in facts:
-            st.markdown(f'<li>{fact["text"]}</li>', unsafe_allow_html=True)
-        st.markdown('</ul>', unsafe_allow_html=True)
-        st.markdown('<div class="eco-links">', unsafe_allow_html=True)
-        for fact in facts:
-            _guide_link(fact["url"], "Learn more")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-def show_guidance_card(label: str, count: int = 0):
-    info = GUIDE.get(label)
-    if not info:
+CARD_BUDGET_MS = float(os.getenv("CARD_BUDGET_MS", "5"))
+
+@st.cache_data(show_spinner=False)
+def _card_html(city_id: str, label: str) -> str:
+    return compile_card(city_guide(city_id)[label])
+
+def show_guidance_card(label: str, count: int = 0) -> float:
+    """One st.markdown call per card; returns render time in ms."""
+    if label not in GUIDE:
+        return 0.0
+    t0 = time.perf_counter()
+    st.markdown(render_card(_card_html(city_id, label), count), unsafe_allow_html=True)
+    return (time.perf_counter() - t0) * 1000
+
+def show_guidance_cards(counts: dict, empty_note: bool = False):
+    guide_labels = [lbl for lbl in sorted(counts) if lbl in GUIDE]
+    if not guide_labels:
+        if empty_note:
+            st.caption("No local guidance to show for these detections.")
         return
-    st.markdown('<div class="eco-card">', unsafe_allow_html=True)
-    st.markdown(f"""
-      <div class="eco-head">
-        <div class="eco-emoji">{info['emoji']}</div>
-        <div class="eco-title">{info['title']}</div>
-        <div class="eco-badge">Detected: {count}</div>
-      </div>
-    """, unsafe_allow_html=True)
-
-    if info.get("icons"):
-        st.image(info["icons"], width=48, caption=[""]*len(info["icons"]))
-
-    imgs = info.get("images") or []
-    if imgs:
-        left, right = st.columns([1, 2], vertical_alignment="center")
-        with left:
-            if len(imgs) == 1:
-                st.image(imgs[0], use_container_width=True)
-            elif len(imgs) <= 3:
-                for im in imgs:
-                    st.image(im, use_container_width=True)
-            else:
-                st.image(imgs, width=160, caption=[""]*len(imgs))
-        with right:
-            _guidance_text(info)
-    else:
-        _guidance_text(info)
-
-    st.markdown('<div class="eco-links">', unsafe_allow_html=True)
-    if info.get("poster"): _guide_link(info["poster"], "Open local poster")
-    _guide_link(info["link"], "Official local guidance (site)")
-    st.markdown('</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
+    st.subheader(f"Disposal instructions — {city_label}")
+    timings = {lbl: show_guidance_card(lbl, counts.get(lbl, 0)) for lbl in guide_labels}
+    slow = {k: v for k, v in timings.items() if v > CARD_BUDGET_MS}
+    with st.expander("Card render timing (debug)", expanded=bool(slow)):
+        st.dataframe(pd.DataFrame({"card": list(timings), "ms": [round(v, 2) for v in timings.values()]}))
+        if slow:
+            st.warning(f"{len(slow)} card(s) over the {CARD_BUDGET_MS:g} ms budget.")
 
 # ======================= QUICK DETECT (TOP) =======================
 st.markdown('<div class="section">', unsafe_allow_html=True)
 st.markdown("#### How to use")
-# City selection (mock for now)
+# City selection: the index is tiny; a city's full guidance loads on first selection (LRU in cities.py)
+CITIES = load_index()
 c1, c2 = st.columns([2, 6], vertical_alignment="center")
 with c1:
-    city_label = st.selectbox("City / Ward", ["Shibuya (Tokyo)"], index=0)
+    city_ids = list(CITIES)
+    city_id = st.selectbox("City / Ward", city_ids, index=city_ids.index(DEFAULT_CITY) if DEFAULT_CITY in CITIES else 0,
+                           format_func=lambda c: CITIES[c]["name"])
 with c2:
     st.markdown("<div class='citybadge'>More cities coming soon</div>", unsafe_allow_html=True)
-
-# Resolve city id and guide map
-CITY_MAP = {"Shibuya (Tokyo)": "shibuya"}
-city_id = CITY_MAP[city_label]
-GUIDE = GUIDE_BY_CITY.get(city_id, {})
+city_label = CITIES[city_id]["name"]
+GUIDE = city_guide(city_id)
+hero_ph.markdown(HERO_HTML.format(city=city_label), unsafe_allow_html=True)
 st.markdown("""
 <ol class="howto">
   <li><b>Upload image</b> (or open your <b>Camera</b>).</li>
@@ -422,27 +385,58 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Defaults (minimum filters)
-_MIN_CONF = 0.05; _MIN_IOU = 0.10; _MIN_IMGSZ = _closest_size(DEFAULT_IMGSZ, IMGSZ_OPTIONS)
-_MIN_BOTTLE = 0.00; _MIN_CAN = 0.00; _MIN_CAP = 0.00; _MIN_AREA_PCT = 0.0; _MIN_TTA = False
+_P = PRESETS[DEFAULT_PRESET]
+_MIN_CONF = _P["conf"]; _MIN_IOU = _P["iou"]; _MIN_IMGSZ = _closest_size(DEFAULT_IMGSZ, IMGSZ_OPTIONS)
+_MIN_BOTTLE = _P["bottle_min"]; _MIN_CAN = _P["can_min"]; _MIN_CAP = _P["cap_min"]
+_MIN_AREA_PCT = _P["min_area_pct"]; _MIN_TTA = _P["tta"]
+sliced = False; tile = 640; overlap = 0.2; full_pass = True; merge_method = "nms"
+auto_size = AUTO_IMGSZ; auto_budget = AUTO_BUDGET_MS
+render_mode = RENDER_MODE; render_quality = RENDER_QUALITY; render_max_w = _closest_size(RENDER_MAX_W, RENDER_WIDTHS)
 
 with st.expander("Advanced settings (optional)"):
-    preset = st.radio("Preset", ["Minimum filters", "Recommended", "Strict"], index=0, horizontal=True)
-    conf = _MIN_CONF; iou = _MIN_IOU; imgsz = _MIN_IMGSZ
-    bottle_min = _MIN_BOTTLE; can_min = _MIN_CAN; cap_min = _MIN_CAP
-    min_area_pct = _MIN_AREA_PCT; tta = _MIN_TTA
-    if preset == "Recommended":
-        conf = 0.25; iou = 0.45; bottle_min = 0.60; can_min = 0.55; cap_min = 0.65; min_area_pct = 0.3; tta = False
-    elif preset == "Strict":
-        conf = 0.35; iou = 0.50; bottle_min = 0.70; can_min = 0.70; cap_min = 0.75; min_area_pct = 0.5; tta = False
+    preset = st.radio("Preset", list(PRESETS), index=list(PRESETS).index(DEFAULT_PRESET), horizontal=True)
+    imgsz = _MIN_IMGSZ
+    p = PRESETS[preset]
+    conf = p["conf"]; iou = p["iou"]; bottle_min = p["bottle_min"]; can_min = p["can_min"]; cap_min = p["cap_min"]
+    min_area_pct = p["min_area_pct"]; tta = p["tta"]
     conf = st.slider("Base confidence", 0.05, 0.95, conf, 0.01, help="Model confidence threshold.")
     iou  = st.slider("IoU", 0.10, 0.90, iou, 0.01)
-    imgsz = st.select_slider("Inference image size", options=IMGSZ_OPTIONS, value=_closest_size(int(imgsz), IMGSZ_OPTIONS))
+    size_choice = st.select_slider("Inference image size", options=["Auto", *IMGSZ_OPTIONS],
+                                   value="Auto" if auto_size else _closest_size(int(imgsz), IMGSZ_OPTIONS),
+                                   help=f"Auto runs single images at {AUTO_SIZES[0]} px and moves up through "
+                                        f"{', '.join(map(str, AUTO_SIZES[1:]))} only for unsure or tiny detections. "
+                                        "Batch, video and sliced runs use the default size.")
+    auto_size = size_choice == "Auto"
+    if auto_size:
+        auto_budget = st.slider("Auto: latency budget (ms)", 200, 5000, int(AUTO_BUDGET_MS), 100,
+                                help="A larger size only runs if its estimated time still fits.")
+    else:
+        imgsz = size_choice
     c1, c2, c3, c4 = st.columns(4)
     bottle_min = c1.slider("Min conf: Bottle", 0.0, 1.0, bottle_min, 0.01)
     can_min    = c2.slider("Min conf: Can",    0.0, 1.0, can_min, 0.01)
     cap_min    = c3.slider("Min conf: Cap",    0.0, 1.0, cap_min, 0.01)
     min_area_pct = c4.slider("Min box area (%)", 0.0, 5.0, min_area_pct, 0.1, help="Ignore tiny boxes by percent of image area.")
     tta = st.toggle("Test time augmentation", value=tta, help="Slower. Sometimes reduces false positives.")
+    sliced = st.toggle("Sliced inference (small objects)", value=False,
+                       help="Runs the model on overlapping tiles (plus an optional full-image pass) and merges the boxes. "
+                            "Helps with small caps in large photos.")
+    if sliced:
+        s1, s2, s3, s4 = st.columns(4)
+        tile = s1.select_slider("Tile size (px)", options=TILE_OPTIONS, value=640)
+        overlap = s2.slider("Tile overlap", 0.0, 0.5, 0.2, 0.05)
+        full_pass = s3.toggle("Full-image pass too", value=True)
+        merge_method = s4.radio("Merge", MERGE_METHODS, horizontal=True, format_func=str.upper)
+    r1, r2, r3 = st.columns(3)
+    render_mode = r1.radio("Result rendering", RENDER_MODES, index=RENDER_MODES.index(render_mode),
+                           help="Overlay sends one small preview and draws boxes in the browser; best on mobile data.")
+    render_quality = r2.slider("Preview JPEG quality", 40, 95, render_quality, 5)
+    render_max_w = r3.select_slider("Preview max width", options=RENDER_WIDTHS, value=render_max_w)
+    b1, b2 = st.columns(2)
+    b1.selectbox("Inference backend", BACKENDS, index=BACKENDS.index(INFER_BACKEND) if INFER_BACKEND in BACKENDS else 0,
+                 key="backend", help="Non-PyTorch backends export the model once per image size and cache it.")
+    b2.toggle("INT8 (dynamic quantization)", value=INFER_INT8, key="int8",
+              disabled=st.session_state.get("backend") not in INT8_BACKENDS, help="ONNX only.")
 
 # If Advanced is closed, still use minimums
 if "conf" not in locals():
@@ -451,91 +445,294 @@ if "conf" not in locals():
     min_area_pct = _MIN_AREA_PCT; tta = _MIN_TTA
 
 # Input controls (default = Upload image)
-src = st.radio("Input source", ["Upload image", "Camera"], index=0, horizontal=True)
+src = st.radio("Input source", ["Upload image", "Camera", "Batch upload", "Video"], index=0, horizontal=True)
 image = None
+image_id = None
+batch_files = []
+video = None
 if src == "Upload image":
     up = st.file_uploader("Choose an image", type=["jpg", "jpeg", "png"])
-    if up: image = Image.open(up).convert("RGB")
+    if up: image = up; image_id = getattr(up, "file_id", up.name)
+elif src == "Batch upload":
+    batch_files = st.file_uploader("Choose images", type=["jpg", "jpeg", "png"], accept_multiple_files=True) or []
+    batch_size = st.select_slider("Batch size", options=BATCH_SIZE_OPTIONS,
+                                  value=_closest_size(DEFAULT_BATCH, BATCH_SIZE_OPTIONS),
+                                  help="Images per forward pass. Larger batches are faster on CPU but use more memory.")
+    burst = st.toggle("Photos are a burst", value=False,
+                      help="Overlapping shots of the same spot, in upload order. Items seen in several photos are counted once.")
+elif src == "Video":
+    video = st.file_uploader("Choose a video", type=VIDEO_TYPES)
+    v1, v2, v3 = st.columns(3)
+    stride = v1.number_input("Frame stride", 1, 120, 1, help="Use every Nth frame.")
+    max_fps = v2.slider("Max frames / sec", 0.5, 10.0, DEFAULT_VIDEO_FPS, 0.5,
+                        help="Upper bound on sampled frames per second of video.")
+    batch_size = v3.select_slider("Batch size", options=BATCH_SIZE_OPTIONS,
+                                  value=_closest_size(DEFAULT_BATCH, BATCH_SIZE_OPTIONS))
 else:
     shot = st.camera_input("Open your camera", key="cam1")
-    if shot: image = Image.open(shot).convert("RGB")
-
-# Model loader (optional)
-if st.button("Load model"):
-    m = load_model()
-    names_from_model = getattr(m, "names", None)
-    if isinstance(names_from_model, dict):
-        st.info(f"Checkpoint labels: {list(names_from_model.values())}")
-    elif isinstance(names_from_model, list):
-        st.info(f"Checkpoint labels: {names_from_model}")
-    else:
-        st.info(f"Using fallback CLASS_NAMES: {CLASS_NAMES}")
-    st.success("Model ready.")
+    if shot: image = shot; image_id = getattr(shot, "file_id", shot.name)
 
-# Show chosen image and run detection
-if image is not None:
-    st.image(image, caption="Input", use_container_width=True)
+# Model readiness (replaces the old "Load model" button); polls only until the warm-up finishes
+def _model_status():
+    if not warmup.done:
+        st.caption(f"⏳ Model warming up in the background ({warmup.state}). You can pick an image meanwhile.")
+        return
+    if st.session_state.get("model_polling"):
+        st.session_state["model_polling"] = False
+        st.rerun()  # full rerun once so the fragment stops polling
+    if warmup.error:
+        st.caption(f"⚠️ Background warm-up failed ({warmup.error}); the model will load on first detection.")
+        return
+    labels = warmup.names or CLASS_NAMES
+    st.caption(f"✅ Model ready ({warmup.backend}, {sum(warmup.timings.values()):.1f} s warm-up) · labels: {', '.join(labels)}")
+    if warmup.note:
+        st.caption(warmup.note)
+    unknown, missing = class_mismatch(city_id, labels)
+    if unknown or missing:
+        st.caption(f"⚠️ {city_label} guidance: " + "; ".join(filter(None, [
+            unknown and f"labels the model does not predict: {', '.join(unknown)}",
+            missing and f"no card for: {', '.join(missing)}"])))
+    with st.expander("Model status (debug)", expanded=False):
+        st.json({"since_first_view_s": startup_timings(), "warmup_s": warmup.timings, "pools": pool_stats()})
+
+st.session_state["model_polling"] = not warmup.done
+st.fragment(run_every=1.0 if st.session_state["model_polling"] else None)(_model_status)()
+mark("first_paint")
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _preview_jpeg(image_id: str, _image, quality: int, max_w: int) -> bytes:
+    return encode_jpeg(decode_bgr(_image, max_w), quality, max_w)
+
+def _render_result(bgr, dets) -> int:
+    """Show the annotated result and return the image bytes sent to the browser."""
+    if render_mode == RENDER_MODES[0]:
+        with span("draw"):
+            html, height = overlay_html(bgr, dets, render_quality, render_max_w)
+        components.html(html, height=height)
+        return len(html)
+    # Same encoding st.image would apply to the array, done once so it can be measured
+    with span("draw"):
+        jpg = encode_jpeg(draw_boxes(bgr, dets), 75)
+    st.image(jpg, use_container_width=True)
+    return len(jpg)
+
+def _timing_panel(trace):
+    with st.expander("Timing (debug)", expanded=False):
+        if len(trace):
+            st.caption("This run (predict.* are timed by preprocess.predict_raw around its own letterbox/backend/NMS "
+                       "steps, or come from ultralytics' speed dict when FAST_PREPROCESS is off; absent on a cache hit)")
+            st.dataframe(pd.DataFrame(trace.rows()), hide_index=True)
+        snap = STATS.snapshot()
+        if snap:
+            st.caption(f"Process-wide, last {STATS.window} samples per stage")
+            st.dataframe(pd.DataFrame.from_dict(snap, orient="index"))
+
+def _show_detections(bgr, raw, input_bytes: int = 0, trace=None, log_source: str | None = None):
+    mark("first_detection")
+    per_class_min = per_class_thresholds(bottle_min, can_min, cap_min)
+    with span("filter"):
+        dets = filter_raw(raw, per_class_min, conf, min_area_pct, fallback=CLASS_NAMES)
+    if log_source:
+        _log_scan(log_source, dets)
+    counts = dets.counts
+
+    sent = input_bytes
+    # The overlay doubles as the input preview, so it is shown even with nothing to draw
+    if len(dets) or render_mode == RENDER_MODES[0]:
+        st.subheader("Detections")
+        sent += _render_result(bgr, dets)
+    st.caption(f"Image data sent: {sent / 1024:.0f} KB ({render_mode.lower()})")
+    if not len(raw) or not len(dets):
+        st.info("No detections" if not len(raw) else
+                "All detections were filtered by thresholds. Try lowering per-class thresholds or min box area.")
+        if trace is not None:
+            _timing_panel(trace)
+        return
 
-    if st.button("Run detection"):
-        model = load_model()
-        bgr = pil_to_bgr(image)
-        results = model.predict(bgr, conf=conf, iou=iou, imgsz=imgsz, verbose=False, augment=tta)
-        pred = results[0]
+    # Debug (collapsed)
+    with st.expander("Raw detections (debug)", expanded=False):
+        st.dataframe(pd.DataFrame(dets.to_columns()))
+    timing_ph = st.container()  # filled after the cards so their render time is included
+    if counts:
+        with st.expander("Counts (debug)", expanded=False):
+            st.bar_chart(pd.Series(counts).sort_values(ascending=False))
+
+    # Guidance cards (city-aware)
+    with span("cards"):
+        show_guidance_cards(counts, empty_note=True)
+    if trace is not None:
+        with timing_ph:
+            _timing_panel(trace)
 
-        if pred.boxes is None or len(pred.boxes) == 0:
-            st.info("No detections")
+# Show chosen image and run detection
+trace = begin_trace()
+if image is not None:
+    preview_ph = st.empty()
+
+    live = st.toggle("Live threshold tuning", value=True,
+                     help="Run the model once at the lowest confidence, then re-apply thresholds instantly as sliders move. "
+                          "Only image size, IoU or TTA changes re-run the model.")
+    # In live mode conf / per-class / area are pure post-filters; only these args need a forward pass
+    infer_args = dict(conf=_MIN_CONF if live else conf, iou=iou, imgsz=imgsz, augment=tta)
+    slice_args = dict(tile=tile, overlap=overlap, full_pass=full_pass, method=merge_method) if sliced else None
+    auto = auto_size and not sliced
+    if auto:
+        infer_args["imgsz"] = ("auto", auto_budget)
+    if not live:
+        st.session_state.pop("live", None)
+    state = st.session_state.get("live")
+    same_image = state is not None and state["image_id"] == image_id
+
+    run = st.button("Run detection")
+    # Sliced inference needs every pixel; otherwise decode JPEGs at reduced scale down to ~imgsz
+    target = None if sliced else (max(AUTO_SIZES) if auto else imgsz)
+    result = None
+    size_note = None
+    if run or (same_image and state["args"] != (infer_args, slice_args)):
+        if same_image and state["target"] == target:
+            bgr = state["bgr"]
         else:
-            boxes  = pred.boxes.xyxy.cpu().numpy()
-            scores = pred.boxes.conf.cpu().numpy()
-            clsi   = pred.boxes.cls.cpu().numpy().astype(int)
-            names_map = _get_names_map(pred, model)
-
-            per_class_min = {"Clear plastic bottle": bottle_min, "Drink can": can_min, "Plastic bottle cap": cap_min}
-            H, W = bgr.shape[:2]
-            min_area = (min_area_pct / 100.0) * (H * W)
-
-            dets, counts = [], {}
-            for i in range(len(boxes)):
-                x1, y1, x2, y2 = boxes[i].tolist()
-                w = max(0.0, x2 - x1); h = max(0.0, y2 - y1)
-                area = w * h
-
-                c = int(clsi[i])
-                if isinstance(names_map, dict):
-                    name = names_map.get(c, str(c))
+            with span("decode"):
+                bgr = decode_bgr(image, target)
+        model = None if auto else load_model(imgsz)
+        try:
+            with span("predict"):
+                if auto:
+                    res = cascade_predict(
+                        lambda s: cached_predict(_pred_cache(), load_model(s), _model_key(), bgr, **{**infer_args, "imgsz": s}),
+                        conf, min_area_pct, budget_ms=auto_budget)
+                    raw, size_note = res.raw, f"Auto size: {res.imgsz} px in {res.total_ms:.0f} ms · {res.summary()}"
+                elif slice_args:
+                    raw = cached_compute(_pred_cache(), _model_key(), bgr,
+                                         lambda: sliced_predict(model, bgr, batch_size=DEFAULT_BATCH, **slice_args, **infer_args),
+                                         sliced=True, **slice_args, **infer_args)
                 else:
-                    name = CLASS_NAMES[c] if 0 <= c < len(CLASS_NAMES) else str(c)
-                s = float(scores[i])
-
-                if s < per_class_min.get(name, conf):   continue
-                if area < min_area:                      continue
-
-                dets.append({"xyxy": [x1, y1, x2, y2], "class_id": c, "class_name": name, "score": s})
-                counts[name] = counts.get(name, 0) + 1
-
-            if not dets:
-                st.info("All detections were filtered by thresholds. Try lowering per-class thresholds or min box area.")
+                    raw = cached_predict(_pred_cache(), model, _model_key(), bgr, **infer_args)
+        except PoolBusy as e:
+            _busy(e)
+        else:
+            if live:
+                st.session_state["live"] = {"image_id": image_id, "args": (infer_args, slice_args), "target": target,
+                                            "bgr": bgr, "raw": raw, "size_note": size_note}
+            result = (bgr, raw)
+    elif same_image:
+        result = (state["bgr"], state["raw"])
+        size_note = state.get("size_note")
+
+    input_bytes = 0
+    if render_mode == RENDER_MODES[0]:
+        if result is None:
+            preview_ph.image(_preview_jpeg(image_id, image, render_quality, render_max_w), caption="Input")
+    else:
+        preview_ph.image(image, caption="Input", use_container_width=True)
+        input_bytes = image.size
+    if result is not None:
+        if size_note:
+            st.caption(size_note)
+        # Logged once per "Run detection" click, not on every live-tuning rerun
+        _show_detections(*result, input_bytes=input_bytes, trace=trace,
+                         log_source=("camera" if src == "Camera" else "upload") if run else None)
+
+# Batch mode: results live in session state so paging doesn't re-run the model
+if src == "Batch upload" and batch_files:
+    st.caption(f"{len(batch_files)} image(s) selected")
+    if st.button("Run batch detection"):
+        model = load_model(imgsz)
+        per_class_min = per_class_thresholds(bottle_min, can_min, cap_min)
+        bar = st.progress(0.0, text="Detecting…")
+        try:
+            st.session_state["batch"] = run_batch(
+                model, batch_files, batch_size,
+                dict(conf=conf, iou=iou, imgsz=imgsz, augment=tta),
+                per_class_min, conf, min_area_pct,
+                progress=lambda p: bar.progress(p, text=f"Detecting… {p:.0%}"),
+                burst=burst,
+            )
+            st.session_state["batch_page"] = 1
+            mark("first_detection")
+            if burst:  # overlapping shots: log the tracked unique counts once
+                _log_scan("burst", counts=st.session_state["batch"]["totals"])
             else:
-                vis_img = draw_boxes(bgr, dets)
-                st.subheader("Detections")
-                st.image(vis_img, use_container_width=True)
-
-                # Debug (collapsed)
-                with st.expander("Raw detections (debug)", expanded=False):
-                    st.dataframe(pd.DataFrame(dets))
-                if counts:
-                    with st.expander("Counts (debug)", expanded=False):
-                        st.bar_chart(pd.Series(counts).sort_values(ascending=False))
-
-                # Guidance cards (city-aware)
-                detected_labels = sorted({d["class_name"] for d in dets})
-                guide_labels = [lbl for lbl in detected_labels if lbl in GUIDE]
-                if guide_labels:
-                    st.subheader(f"Disposal instructions — {city_label}")
-                    for lbl in guide_labels:
-                        show_guidance_card(lbl, counts.get(lbl, 0))
-                else:
-                    st.caption("No local guidance to show for these detections.")
+                for it in st.session_state["batch"]["items"]:
+                    _log_scan("batch", it["dets"])
+        except PoolBusy as e:
+            _busy(e)
+        bar.empty()
+
+    batch = st.session_state.get("batch")
+    if batch:
+        items, totals = batch["items"], batch["totals"]
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Images", len(items))
+        m2.metric("Detections", sum(totals.values()))
+        m3.metric("Images / sec", f"{batch['ips']:.2f}")
+        if totals:
+            st.bar_chart(pd.Series(totals).sort_values(ascending=False))
+
+        n_pages = max(1, -(-len(items) // GALLERY_PAGE_SIZE))
+        page = st.number_input("Page", 1, n_pages, key="batch_page")
+        start = (page - 1) * GALLERY_PAGE_SIZE
+        cols = st.columns(3)
+        for j, it in enumerate(items[start:start + GALLERY_PAGE_SIZE]):
+            summary = ", ".join(f"{k}: {v}" for k, v in sorted(it["counts"].items())) or "no detections"
+            cols[j % 3].image(it["thumb"], caption=f'{it["name"]} — {summary}', use_container_width=True)
+
+        with st.expander("Per-image counts (debug)", expanded=False):
+            st.dataframe(pd.DataFrame([{"image": it["name"], **it["counts"]} for it in items]).fillna(0))
+
+        show_guidance_cards(totals)
+# Video mode: counts and the latest annotated frame update after every batch
+if src == "Video" and video is not None:
+    video_key = (video.name, video.size)  # a result is only shown under the upload it came from
+    if not ffmpeg_available():
+        st.error("ffmpeg/ffprobe not found. Install ffmpeg (see packages.txt) to scan videos.")
+    elif st.button("Run video detection"):
+        st.session_state.pop("video_result", None)  # a failed or busy rescan must not leave the old result up
+        model = load_model(imgsz)
+        per_class_min = per_class_thresholds(bottle_min, can_min, cap_min)
+        path = _spool_upload(video, os.path.splitext(video.name)[1] or ".mp4")
+        try:
+            info = probe(path)
+            st.caption(f'{info["width"]}×{info["height"]} · {info["fps"]:.1f} fps · {info["duration"]:.1f} s')
+            bar = st.progress(0.0, text="Scanning video…")
+            m1, m2, m3 = st.columns(3)
+            m1_ph, m2_ph, m3_ph = m1.empty(), m2.empty(), m3.empty()
+            chart_ph, frame_ph = st.empty(), st.empty()
+
+            def _on_batch(state):
+                if state["expected"]:
+                    bar.progress(min(1.0, state["frames"] / state["expected"]), text=f'Scanning video… {state["video_s"]:.1f} s')
+                m1_ph.metric("Frames scanned", state["frames"])
+                m2_ph.metric("Frames / sec", f'{state["frames"] / max(state["elapsed"], 1e-6):.2f}')
+                m3_ph.metric("Video s / wall s", f'{state["video_s"] / max(state["elapsed"], 1e-6):.2f}')
+                if state["totals"]:
+                    chart_ph.bar_chart(pd.DataFrame({"Unique (tracked)": state["unique"],
+                                                     "Most in one frame": state["peak"]}).fillna(0))
+                ts, fr, dets = state["last"]
+                frame_ph.image(draw_boxes(fr, dets, inplace=True), channels="BGR", caption=f"t = {ts:.1f} s",
+                               use_container_width=True)
+
+            result = run_video(model, path, info, batch_size, int(stride), max_fps,
+                               dict(conf=conf, iou=iou, imgsz=imgsz, augment=tta),
+                               per_class_min, conf, min_area_pct, on_batch=_on_batch)
+            bar.empty()
+            mark("first_detection")
+            st.session_state["video_result"] = {"key": video_key,
+                                                **{k: result[k] for k in ("frames", "totals", "peak", "unique", "elapsed")}}
+            _log_scan("video", counts={k: max(result["unique"].get(k, 0), v) for k, v in result["peak"].items()})
+        except PoolBusy as e:
+            _busy(e)
+        except Exception as e:
+            st.error(f"Could not read video: {e}")
+        finally:
+            os.remove(path)
+
+    vres = st.session_state.get("video_result")
+    if vres and vres["key"] == video_key and vres["peak"]:
+        # Unique tracked count, but never below what was visible in a single frame
+        found = {k: max(vres["unique"].get(k, 0), v) for k, v in vres["peak"].items()}
+        st.caption("Unique items: " + ", ".join(f"{k}: {v}" for k, v in sorted(found.items())))
+        show_guidance_cards(found)
 st.markdown('</div>', unsafe_allow_html=True)  # end section
 
 # ======================= Impact & SDGs =======================
@@ -561,6 +758,33 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# Ward-level totals from the local detection log; reads only the rollup tables, so it stays fast at any size
+@st.fragment
+def _scan_stats():
+    st.markdown("**Items sorted with this app**")
+    c1, c2 = st.columns([3, 2])
+    scope = c1.radio("Scope", [city_label, "All cities"], horizontal=True, key="stats_scope")
+    days = c2.select_slider("Period (days)", [7, 30, 90, 365], value=30, key="stats_days")
+    stats = detlog_summary(None if scope == "All cities" else city_id, days)
+    if not stats["totals"]:
+        st.caption("Nothing logged yet. Run a detection to start the tally.")
+        return
+    m1, m2 = st.columns(2)
+    m1.metric("Items detected (all time)", sum(stats["totals"].values()))
+    m2.metric(f"Scans (last {days} days)", sum(n for _, n in stats["daily_scans"]))
+    if stats["daily"]:
+        daily = pd.DataFrame(stats["daily"], columns=["day", "class", "items"])
+        st.bar_chart(daily.pivot(index="day", columns="class", values="items").fillna(0))
+    if stats["cities"]:
+        st.dataframe(pd.DataFrame([{"city": CITIES.get(c, {}).get("name", c), "items": n} for c, n, _ in stats["cities"]]),
+                     hide_index=True)
+    w = get_log().stats()
+    st.caption(f"Query {stats['query_ms']:.1f} ms · {w['written']} scans logged by this process, {w['pending']} pending, "
+               f"{w['dropped']} dropped" + (f" · last write error: {w['error']}" if w["error"] else ""))
+
+if DETLOG:
+    _scan_stats()
+
 st.markdown("**Our SDGs focus:**")
 sdg_html = f"""
 <div class="sdg-row">
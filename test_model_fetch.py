@@ -0,0 +1,119 @@
+"""model_fetch against a local http.server that honours Range/If-Range and can cut a response short.
+
+    python -m unittest test_model_fetch      # or: python -m pytest test_model_fetch.py
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import model_fetch
+from model_fetch import FetchError, fetch, is_complete
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        srv = self.server
+        body, etag = srv.body, f'"{hashlib.md5(srv.body).hexdigest()}"'
+        srv.requests.append({k: self.headers.get(k) for k in ("Range", "If-Range")})
+        start, status = 0, 200
+        rng = self.headers.get("Range")
+        if rng and self.headers.get("If-Range") in (None, etag):
+            start, status = int(rng.split("=")[1].rstrip("-")), 206
+        if start >= len(body) and status == 206:
+            self.send_response(416)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - start))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        data = body[start:]
+        if srv.cut:  # drop the connection partway, as a flaky network would
+            srv.cut -= 1
+            data = data[:len(data) // 2]
+        self.wfile.write(data)
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.body, self.server.cut, self.server.requests = os.urandom(3 * model_fetch.CHUNK + 123), 0, []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/best.pt"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, "best.pt")
+        self._sleep, model_fetch.time.sleep = model_fetch.time.sleep, lambda s: None
+
+    def tearDown(self):
+        model_fetch.time.sleep = self._sleep
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_resumes_interrupted_download(self):
+        self.server.cut = 1
+        sha = hashlib.sha256(self.server.body).hexdigest()
+        self.assertEqual(fetch(self.url, self.dest, sha256=sha, timeout=5), self.dest)
+        self.assertEqual(self._read(self.dest), self.server.body)
+        self.assertTrue(is_complete(self.dest, sha))
+        first, second = self.server.requests
+        self.assertIsNone(first["Range"])
+        start = int(second["Range"].split("=")[1].rstrip("-"))  # whatever reached the part file
+        self.assertTrue(0 < start <= len(self.server.body) // 2, second["Range"])
+        self.assertEqual(second["If-Range"], f'"{hashlib.md5(self.server.body).hexdigest()}"')
+        self.assertFalse(os.path.exists(f"{self.dest}.part"))
+        self.assertFalse(os.path.exists(f"{self.dest}.part.validator"))
+
+    def test_restarts_when_file_changed(self):
+        self.server.cut = 1
+        with self.assertRaises(FetchError):
+            fetch(self.url, self.dest, timeout=5, retries=1)
+        self.assertTrue(os.path.exists(f"{self.dest}.part"))
+        self.server.body = os.urandom(2 * model_fetch.CHUNK + 7)  # new upload: If-Range fails, server sends 200
+        fetch(self.url, self.dest, sha256=hashlib.sha256(self.server.body).hexdigest(), timeout=5)
+        self.assertEqual(self._read(self.dest), self.server.body)
+        self.assertIsNotNone(self.server.requests[-1]["If-Range"])
+
+    def test_part_without_validator_is_not_resumed(self):
+        with open(f"{self.dest}.part", "wb") as f:
+            f.write(b"stale bytes from an unknown version")
+        fetch(self.url, self.dest, timeout=5)
+        self.assertEqual(self._read(self.dest), self.server.body)
+        self.assertIsNone(self.server.requests[0]["Range"])
+
+    def test_checksum_mismatch(self):
+        with self.assertRaisesRegex(FetchError, "SHA-256 mismatch"):
+            fetch(self.url, self.dest, sha256="0" * 64, timeout=5)
+        for suffix in ("", ".part", ".part.validator", ".ok"):
+            self.assertFalse(os.path.exists(self.dest + suffix), suffix)
+
+    def test_no_sleep_after_last_attempt(self):
+        self.server.cut = 99
+        slept = []
+        model_fetch.time.sleep = slept.append
+        t = time.perf_counter()
+        with self.assertRaisesRegex(FetchError, "after 3 attempts"):
+            fetch(self.url, self.dest, timeout=5, retries=3)
+        self.assertEqual(slept, [1, 2])
+        self.assertLess(time.perf_counter() - t, 5)
+        self.assertEqual(len(self.server.requests), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
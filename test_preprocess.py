@@ -0,0 +1,73 @@
+"""preprocess.predict_raw (LetterboxEngine + backend + NMS) against model.predict on the pinned ultralytics.
+
+    python -m unittest test_preprocess      # or: python -m pytest test_preprocess.py
+"""
+import os
+import re
+import unittest
+
+import numpy as np
+
+import preprocess
+
+try:
+    import torch
+    from ultralytics import YOLO
+except ImportError:
+    YOLO = None
+
+
+class PinTest(unittest.TestCase):
+    def test_requirements_pin_matches(self):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "requirements.txt")) as f:
+            pin = re.search(r"^ultralytics==(\S+)$", f.read(), re.M)
+        self.assertIsNotNone(pin, "requirements.txt must pin ultralytics")
+        self.assertEqual(pin.group(1), preprocess.ULTRALYTICS_TESTED)
+
+
+@unittest.skipIf(YOLO is None, "ultralytics not installed")
+class ParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import cv2
+        torch.manual_seed(0)
+        cls.model = YOLO("yolov8n.yaml")  # random weights: scores ~1e-4, so conf=0 keeps max_det boxes
+        rng = np.random.default_rng(0)
+        cls.images = [cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (0, 0), 3)
+                      for h, w in ((480, 640), (1200, 900), (333, 517))]
+
+    def reference(self, bgrs, **kw):
+        from detection import raw_prediction
+        return [raw_prediction(r, self.model, b.shape) for b, r in zip(bgrs, self.model.predict(bgrs, verbose=False, **kw))]
+
+    def assertSame(self, ref, new):
+        self.assertEqual(len(ref), len(new))
+        self.assertEqual(ref.shape, new.shape)
+        np.testing.assert_array_equal(ref.class_ids, new.class_ids)
+        np.testing.assert_allclose(ref.scores, new.scores, atol=1e-6)
+        np.testing.assert_allclose(ref.boxes, new.boxes, atol=1e-3)
+
+    def test_letterbox_tensor(self):
+        eng = preprocess.engine_for(self.model)  # also sets up model.predictor
+        predictor = self.model.predictor
+        for sz in (320, 640):
+            predictor.imgsz = (sz, sz)
+            ref = predictor.preprocess([self.images[1]]).float().cpu()
+            new, _ = eng.prepare([self.images[1]], sz)
+            self.assertEqual(ref.shape, new.shape)
+            self.assertLess((ref - new).abs().max().item(), 1e-6)
+
+    def test_single_images(self):
+        for sz in (320, 640):
+            for bgr in self.images:
+                kw = dict(imgsz=sz, conf=0.0, iou=0.7)
+                self.assertSame(self.reference([bgr], **kw)[0], preprocess.predict_raw(self.model, [bgr], **kw)[0])
+
+    def test_mixed_batch_and_tta(self):
+        kw = dict(imgsz=640, conf=0.0, iou=0.5, augment=True)
+        for ref, new in zip(self.reference(self.images, **kw), preprocess.predict_raw(self.model, self.images, **kw)):
+            self.assertSame(ref, new)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Sliced (tiled) inference for small objects in high-resolution photos, merged back with NMS or WBF."""
+import numpy as np
+
+from detection import RawPrediction, get_names_map, iou_matrix, raw_from_pred
+
+MERGE_METHODS = ["nms", "wbf"]
+
+
+def tile_grid(H: int, W: int, tile: int, overlap: float) -> np.ndarray:
+    """(K, 4) xyxy tiles covering the image; the last row/column is snapped to the border."""
+    step = max(1, int(tile * (1.0 - overlap)))
+
+    def _starts(n):
+        if n <= tile:
+            return [0]
+        s = list(range(0, n - tile, step))
+        return s + [n - tile]
+    ys, xs = _starts(H), _starts(W)
+    grid = np.array([(x, y, min(x + tile, W), min(y + tile, H)) for y in ys for x in xs], dtype=np.int64)
+    return grid
+
+def _overlap_matrix(a: np.ndarray, b: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "iou":
+        return iou_matrix(a, b)
+    # Intersection over the smaller box: a box cut at a tile edge still matches its full version
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(np.clip(a[:, 2:] - a[:, :2], 0, None), axis=1)
+    area_b = np.prod(np.clip(b[:, 2:] - b[:, :2], 0, None), axis=1)
+    return inter / np.maximum(np.minimum(area_a[:, None], area_b[None, :]), 1e-9)
+
+def _clusters(boxes, scores, class_ids, thresh: float, metric: str) -> list[np.ndarray]:
+    """Greedy score-ordered clustering within each class; first index of each cluster is its best box."""
+    out = []
+    for c in np.unique(class_ids):
+        idx = np.flatnonzero(class_ids == c)
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+        ov = _overlap_matrix(boxes[idx], boxes[idx], metric)
+        alive = np.ones(len(idx), bool)
+        for i in range(len(idx)):
+            if not alive[i]:
+                continue
+            members = np.flatnonzero(alive & (ov[i] >= thresh))
+            members = members[members >= i]
+            alive[members] = False
+            out.append(idx[np.concatenate([[i], members[members != i]])])
+    return out
+
+def merge(boxes, scores, class_ids, method: str = "nms", thresh: float = 0.5, metric: str = "ios"):
+    """Class-aware NMS (keep the best box) or weighted box fusion (score-weighted mean of each cluster)."""
+    if len(scores) == 0:
+        return boxes, scores, class_ids
+    groups = _clusters(boxes, scores, class_ids, thresh, metric)
+    if method == "nms":
+        keep = np.array([g[0] for g in groups], np.int64)
+        return boxes[keep], scores[keep], class_ids[keep]
+    fused = np.stack([(boxes[g] * scores[g, None]).sum(0) / scores[g].sum() for g in groups]).astype(np.float32)
+    return fused, np.array([scores[g].max() for g in groups], np.float32), class_ids[[g[0] for g in groups]]
+
+def sliced_predict(model, bgr: np.ndarray, tile: int = 640, overlap: float = 0.2, full_pass: bool = True,
+                   batch_size: int = 8, method: str = "nms", merge_thresh: float = 0.5,
+                   imgsz: int = 640, **predict_kwargs) -> RawPrediction:
+    """Run tiles (batched, each resized to imgsz) plus an optional full-image pass, then merge.
+
+    Tiles larger than imgsz trade detail for fewer forward passes; smaller ones upsample.
+    """
+    H, W = bgr.shape[:2]
+    grid = tile_grid(H, W, tile, overlap)
+    all_b, all_s, all_c = [], [], []
+    names_map = None
+    if full_pass or len(grid) == 1:
+        pred = model.predict(bgr, imgsz=imgsz, verbose=False, **predict_kwargs)[0]
+        b, s, c = raw_from_pred(pred)
+        all_b.append(b); all_s.append(s); all_c.append(c)
+        names_map = get_names_map(pred, model)
+    if len(grid) > 1:
+        for i in range(0, len(grid), batch_size):
+            chunk = grid[i:i + batch_size]
+            crops = [np.ascontiguousarray(bgr[y0:y1, x0:x1]) for x0, y0, x1, y1 in chunk.tolist()]
+            for (x0, y0, _, _), pred in zip(chunk.tolist(), model.predict(crops, imgsz=imgsz, verbose=False, **predict_kwargs)):
+                b, s, c = raw_from_pred(pred)
+                all_b.append(b + np.array([x0, y0, x0, y0], np.float32)); all_s.append(s); all_c.append(c)
+                names_map = names_map or get_names_map(pred, model)
+    boxes = np.concatenate(all_b) if all_b else np.zeros((0, 4), np.float32)
+    scores = np.concatenate(all_s) if all_s else np.zeros(0, np.float32)
+    class_ids = np.concatenate(all_c) if all_c else np.zeros(0, np.int64)
+    boxes, scores, class_ids = merge(boxes, scores, class_ids, method, merge_thresh)
+    return RawPrediction(boxes, scores, class_ids, dict(names_map) if names_map else None, (H, W))
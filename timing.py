@@ -0,0 +1,198 @@
+"""Per-stage timing spans for the hot path, aggregated into rolling histograms.
+
+Every span goes to the process-wide STATS (the last TIMING_WINDOW samples per stage for p50/p95, plus
+cumulative Prometheus buckets) and to the current thread's Trace when one is open, which is what the
+app's "Timing (debug)" panel shows. start_exporter() serves /metrics (Prometheus text) and /metrics.json
+on METRICS_PORT and/or rewrites METRICS_JSON every METRICS_INTERVAL seconds.
+"""
+import json
+import os
+import threading
+import time
+import warnings
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIMING_WINDOW    = int(os.getenv("TIMING_WINDOW", "1024"))
+METRICS_PORT     = int(os.getenv("METRICS_PORT", "0"))        # 0 = no endpoint
+METRICS_JSON     = os.getenv("METRICS_JSON", "")              # "" = no periodic file
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "60"))
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _pct(sorted_vals: list[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * q))] if sorted_vals else 0.0
+
+
+class StageStats:
+    """Thread-safe per-stage latency histograms: a rolling window for quantiles, cumulative buckets for Prometheus."""
+
+    def __init__(self, window: int = TIMING_WINDOW, buckets=BUCKETS_MS):
+        self.window, self.buckets = window, tuple(buckets)
+        self._recent: dict[str, deque] = {}
+        self._counts: dict[str, list[int]] = {}
+        self._sums: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, ms: float):
+        with self._lock:
+            if stage not in self._recent:
+                self._recent[stage] = deque(maxlen=self.window)
+                self._counts[stage] = [0] * (len(self.buckets) + 1)
+                self._sums[stage] = 0.0
+            self._recent[stage].append(ms)
+            self._sums[stage] += ms
+            counts = self._counts[stage]
+            for i, le in enumerate(self.buckets):
+                if ms <= le:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+
+    def snapshot(self) -> dict:
+        """{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}; quantiles cover the rolling window."""
+        with self._lock:
+            recent = {k: sorted(v) for k, v in self._recent.items()}
+            totals = {k: (sum(c), self._sums[k]) for k, c in self._counts.items()}
+        out = {}
+        for stage, vals in sorted(recent.items()):
+            n, total = totals[stage]
+            out[stage] = {"count": n, "mean_ms": round(total / n, 3), "p50_ms": round(_pct(vals, .50), 3),
+                          "p95_ms": round(_pct(vals, .95), 3), "p99_ms": round(_pct(vals, .99), 3),
+                          "max_ms": round(vals[-1], 3)}
+        return out
+
+    def prometheus(self, prefix: str = "litter") -> str:
+        """Prometheus text format: a cumulative histogram in seconds plus rolling-window quantile gauges."""
+        with self._lock:
+            counts = {k: list(v) for k, v in self._counts.items()}
+            sums = dict(self._sums)
+        snap = self.snapshot()
+        name = f"{prefix}_stage_seconds"
+        lines = [f"# HELP {name} Hot-path stage latency.", f"# TYPE {name} histogram"]
+        for stage in sorted(counts):
+            acc = 0
+            for le, c in zip((*self.buckets, None), counts[stage]):
+                acc += c
+                bound = "+Inf" if le is None else f"{le / 1e3:g}"
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {acc}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {sums[stage] / 1e3:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {acc}')
+        recent = f"{prefix}_stage_recent_seconds"
+        lines += [f"# HELP {recent} Stage latency quantiles over the last {self.window} samples.",
+                  f"# TYPE {recent} gauge"]
+        for stage, s in snap.items():
+            for q, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                lines.append(f'{recent}{{stage="{stage}",quantile="{q}"}} {s[key] / 1e3:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear(); self._counts.clear(); self._sums.clear()
+
+
+STATS = StageStats()
+
+
+class Trace:
+    """Spans recorded on one thread between begin_trace() and the next begin_trace()."""
+
+    def __init__(self):
+        self.spans: list[tuple[float, str, float]] = []   # (start, stage, ms)
+
+    def add(self, stage: str, ms: float, start: float):
+        self.spans.append((start, stage, ms))
+
+    def rows(self) -> list[dict]:
+        """Spans in start order, so an outer span precedes the ones nested in it."""
+        t0 = min((s for s, _, _ in self.spans), default=0.0)
+        return [{"stage": stage, "start_ms": round((s - t0) * 1e3, 1), "ms": round(ms, 2)}
+                for s, stage, ms in sorted(self.spans)]
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+
+_local = threading.local()
+
+def begin_trace() -> Trace:
+    _local.trace = Trace()
+    return _local.trace
+
+def record(stage: str, ms: float, start: float | None = None):
+    STATS.record(stage, ms)
+    tr = getattr(_local, "trace", None)
+    if tr is not None:
+        tr.add(stage, ms, time.perf_counter() - ms / 1e3 if start is None else start)
+
+@contextmanager
+def span(stage: str):
+    """Time the block as `stage`; nothing is recorded when it raises."""
+    t = time.perf_counter()
+    yield
+    record(stage, (time.perf_counter() - t) * 1e3, t)
+
+def record_speed(speed: dict | None, prefix: str = "predict"):
+    """ultralytics Results.speed ({"preprocess", "inference", "postprocess"}, ms per image) as sub-stages."""
+    end = time.perf_counter()
+    steps = [(k, float(v)) for k, v in (speed or {}).items() if v is not None]
+    start = end - sum(ms for _, ms in steps) / 1e3
+    for k, ms in steps:
+        record(f"{prefix}.{k}", ms, start)
+        start += ms / 1e3
+
+# ======================= Export =======================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, ctype = STATS.prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, ctype = json.dumps(STATS.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+def write_json(path: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"time": time.time(), "window": STATS.window, "stages": STATS.snapshot()}, f, indent=1)
+    os.replace(tmp, path)
+
+def _json_loop(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            write_json(path)
+        except OSError as e:
+            warnings.warn(f"timing: could not write {path}: {e}", RuntimeWarning)
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+def start_exporter(port: int = METRICS_PORT, json_path: str = METRICS_JSON, interval: float = METRICS_INTERVAL):
+    """Once per process: the /metrics endpoint (port > 0) and the periodic JSON file (json_path set)."""
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        except OSError as e:  # e.g. a second app process on the same host
+            warnings.warn(f"timing: metrics endpoint not started on :{port} ({e})", RuntimeWarning)
+    if json_path:
+        threading.Thread(target=_json_loop, args=(json_path, interval), name="metrics-json", daemon=True).start()
@@ -0,0 +1,125 @@
+"""SORT/ByteTrack-style multi-object tracker on NumPy arrays for counting unique items across frames."""
+import numpy as np
+
+from detection import Detections, iou_matrix
+
+
+def greedy_match(score: np.ndarray, thresh: float) -> tuple[np.ndarray, np.ndarray]:
+    """Match rows to columns by repeatedly taking all mutual-best pairs above thresh.
+
+    Each round is vectorized and removes at least the global maximum, so a few rounds
+    settle even with hundreds of tracks.
+    """
+    s = np.where(score >= thresh, score, 0.0)
+    rows, cols = [], []
+    r_idx = np.arange(s.shape[0])
+    while s.size and s.max() > 0:
+        best_c = s.argmax(1)
+        best_r = s.argmax(0)
+        mutual = (best_r[best_c] == r_idx) & (s[r_idx, best_c] > 0)
+        mr, mc = r_idx[mutual], best_c[mutual]
+        rows.append(mr); cols.append(mc)
+        s[mr, :] = 0; s[:, mc] = 0
+    if not rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+class Tracker:
+    """Constant-velocity box tracker with ByteTrack's two-stage (high then low score) association.
+
+    Tracks are class-locked and stored column-wise; a track is counted once, when it
+    reaches min_hits matched frames.
+    """
+
+    def __init__(self, iou_thresh: float = 0.3, high_thresh: float = 0.5, max_age: int = 30,
+                 min_hits: int = 3, smoothing: float = 0.4):
+        self.iou_thresh, self.high_thresh = iou_thresh, high_thresh
+        self.max_age, self.min_hits, self.smoothing = max_age, min_hits, smoothing
+        self.names: tuple = ()
+        self._next_id = 1
+        self.ids = np.zeros(0, np.int64)
+        self.cls = np.zeros(0, np.int64)
+        self.last = np.zeros((0, 4), np.float32)   # last observed box
+        self.vel = np.zeros((0, 4), np.float32)    # per-frame box velocity
+        self.hits = np.zeros(0, np.int64)
+        self.since = np.zeros(0, np.int64)         # frames since last match
+        self._unique = np.zeros(0, np.int64)       # confirmed tracks per class id
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def unique_counts(self) -> dict:
+        return {self._name(c): int(n) for c, n in enumerate(self._unique.tolist()) if n}
+
+    def _name(self, c: int) -> str:
+        return self.names[c] if c < len(self.names) else str(c)
+
+    def predicted(self) -> np.ndarray:
+        return self.last + self.vel * self.since[:, None]
+
+    def _associate(self, trk: np.ndarray, det_idx: np.ndarray, boxes, classes):
+        if len(trk) == 0 or len(det_idx) == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        iou = iou_matrix(self.predicted()[trk], boxes[det_idx])
+        iou[self.cls[trk][:, None] != classes[det_idx][None, :]] = 0.0
+        r, c = greedy_match(iou, self.iou_thresh)
+        return trk[r], det_idx[c]
+
+    def update(self, dets: Detections) -> np.ndarray:
+        """Advance one frame; returns the track id for each detection (-1 if left unassigned)."""
+        if len(dets.names) > len(self.names):
+            self.names = dets.names
+        boxes, scores, classes = dets.xyxy, dets.scores, dets.class_ids
+        out = np.full(len(dets), -1, np.int64)
+        self.since += 1
+
+        high = np.flatnonzero(scores >= self.high_thresh)
+        low = np.flatnonzero(scores < self.high_thresh)
+        all_trk = np.arange(len(self.ids))
+        t1, d1 = self._associate(all_trk, high, boxes, classes)
+        rest = np.setdiff1d(all_trk, t1, assume_unique=True)
+        t2, d2 = self._associate(rest, low, boxes, classes)
+        t_m, d_m = np.concatenate([t1, t2]), np.concatenate([d1, d2])
+
+        if len(t_m):
+            new = boxes[d_m]
+            step = (new - self.last[t_m]) / self.since[t_m][:, None]
+            a = self.smoothing
+            self.vel[t_m] = np.where((self.hits[t_m] == 1)[:, None], step, a * step + (1 - a) * self.vel[t_m])
+            self.last[t_m] = new
+            self.since[t_m] = 0
+            self.hits[t_m] += 1
+            out[d_m] = self.ids[t_m]
+            self._confirm(t_m[self.hits[t_m] == self.min_hits])
+
+        # Unmatched confident detections start new tracks
+        born = np.setdiff1d(high, d1, assume_unique=True)
+        if len(born):
+            new_ids = np.arange(self._next_id, self._next_id + len(born))
+            self._next_id += len(born)
+            start = len(self.ids)
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.cls = np.concatenate([self.cls, classes[born]])
+            self.last = np.concatenate([self.last, boxes[born].astype(np.float32)])
+            self.vel = np.concatenate([self.vel, np.zeros((len(born), 4), np.float32)])
+            self.hits = np.concatenate([self.hits, np.ones(len(born), np.int64)])
+            self.since = np.concatenate([self.since, np.zeros(len(born), np.int64)])
+            out[born] = new_ids
+            if self.min_hits <= 1:
+                self._confirm(np.arange(start, len(self.ids)))
+
+        keep = self.since <= self.max_age
+        if not keep.all():
+            for name in ("ids", "cls", "last", "vel", "hits", "since"):
+                setattr(self, name, getattr(self, name)[keep])
+        return out
+
+    def _confirm(self, trk: np.ndarray):
+        if not len(trk):
+            return
+        need = int(self.cls[trk].max()) + 1
+        if need > len(self._unique):
+            self._unique = np.concatenate([self._unique, np.zeros(need - len(self._unique), np.int64)])
+        np.add.at(self._unique, self.cls[trk], 1)
@@ -0,0 +1,128 @@
+"""Streaming video decode through the ffmpeg CLI (installed via packages.txt)."""
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+
+FFMPEG  = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE = os.getenv("FFPROBE_BIN", "ffprobe")
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG) is not None and shutil.which(FFPROBE) is not None
+
+@lru_cache(maxsize=1)
+def ffmpeg_version() -> tuple[int, ...] | None:
+    """(major, minor) from `ffmpeg -version`; None for git snapshots ("N-...") or when it can't be run."""
+    try:
+        out = subprocess.run([FFMPEG, "-version"], capture_output=True, timeout=10).stdout.decode(errors="replace")
+    except (OSError, subprocess.SubprocessError):
+        return None
+    m = re.search(r"version n?(\d+)\.(\d+)", out)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+def _vfr_args() -> list[str]:
+    """-fps_mode only exists from ffmpeg 5.1; older builds (e.g. Debian 11's 4.3) need -vsync."""
+    v = ffmpeg_version()
+    return ["-vsync", "vfr"] if v is not None and v < (5, 1) else ["-fps_mode", "vfr"]
+
+def probe(path: str) -> dict:
+    """Width/height (after rotation), fps, duration and frame count of the first video stream."""
+    out = subprocess.run(
+        [FFPROBE, "-v", "error", "-select_streams", "v:0", "-print_format", "json",
+         "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration:stream_tags=rotate"
+         ":stream_side_data=rotation:format=duration", path],
+        capture_output=True, check=True, timeout=30,
+    )
+    meta = json.loads(out.stdout or b"{}")
+    if not meta.get("streams"):
+        raise ValueError(f"No video stream in {path}")
+    s = meta["streams"][0]
+    w, h = int(s["width"]), int(s["height"])
+
+    rot = int(float(s.get("tags", {}).get("rotate", 0) or 0))
+    for sd in s.get("side_data_list", []) or []:
+        if "rotation" in sd:
+            rot = int(float(sd["rotation"]))
+    if abs(rot) % 180 == 90:  # ffmpeg autorotates, so frames come out transposed
+        w, h = h, w
+
+    def _rate(r):
+        try:
+            num, den = (float(x) for x in str(r).split("/"))
+            return num / den if den else 0.0
+        except ValueError:
+            return 0.0
+    fps = _rate(s.get("avg_frame_rate")) or _rate(s.get("r_frame_rate")) or 30.0
+    duration = float(s.get("duration") or meta.get("format", {}).get("duration") or 0.0)
+    n = int(s.get("nb_frames") or 0) or int(round(duration * fps))
+    return {"width": w, "height": h, "fps": fps, "duration": duration, "frames": n}
+
+def output_size(w: int, h: int, max_side: int | None) -> tuple[int, int]:
+    if not max_side or max(w, h) <= max_side:
+        return w, h
+    s = max_side / max(w, h)
+    # yuv → bgr scaling wants even dimensions
+    return max(2, int(round(w * s / 2)) * 2), max(2, int(round(h * s / 2)) * 2)
+
+def sampling(info: dict, stride: int = 1, max_fps: float | None = None) -> float:
+    """Effective output frame rate after stride and FPS cap."""
+    out = info["fps"] / max(1, stride)
+    return min(out, max_fps) if max_fps else out
+
+def iter_frames(path: str, info: dict | None = None, stride: int = 1, max_fps: float | None = None,
+                max_side: int | None = 1280):
+    """Yield (index, timestamp_s, bgr) one frame at a time; only one frame is ever buffered here.
+
+    Sampling and scaling happen inside ffmpeg so skipped frames are never piped through Python.
+    """
+    info = info or probe(path)
+    W, H = output_size(info["width"], info["height"], max_side)
+    stride = max(1, int(stride))
+    rate = sampling(info, stride, max_fps)
+
+    filters = []
+    if max_fps and info["fps"] / stride > max_fps:
+        filters.append(f"fps={max_fps}")
+    elif stride > 1:
+        filters.append(f"select=not(mod(n\\,{stride}))")
+    if (W, H) != (info["width"], info["height"]):
+        filters.append(f"scale={W}:{H}")
+
+    cmd = [FFMPEG, "-v", "error", "-nostdin", "-i", path]
+    if filters:
+        cmd += ["-vf", ",".join(filters)]
+    cmd += [*_vfr_args(), "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+
+    frame_bytes = W * H * 3
+    i = 0
+    with tempfile.TemporaryFile() as err:  # a file, not a pipe: a chatty ffmpeg can't block on a full stderr
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err, bufsize=frame_bytes)
+        try:
+            while True:
+                buf = bytearray(frame_bytes)  # writable, so callers can draw on the frame in place
+                if proc.stdout.readinto(buf) < frame_bytes:
+                    break
+                yield i, i / rate if rate else 0.0, np.frombuffer(buf, np.uint8).reshape(H, W, 3)
+                i += 1
+            proc.wait(timeout=30)  # stdout hit EOF: let ffmpeg exit by itself so its status is real
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+        if proc.returncode and not i:
+            err.seek(0)
+            msg = err.read().decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg exited with {proc.returncode} before any frame: {msg[-500:] or 'no output'}")
+
+def batched(it, n: int):
+    it = iter(it)
+    while chunk := list(islice(it, n)):
+        yield chunk